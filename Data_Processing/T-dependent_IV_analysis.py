@@ -3,24 +3,31 @@ import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from run_catalog import RunCatalog
+from stabilized_iv import load_it_data, stabilized_iv
+from arrhenius_fit import arrhenius_fit_log, fit_arrhenius
+from temp_calibration import TemperatureCalibration
 
 # %%
-temp_calib = pd.read_csv(r'C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\Data_Processing\temp_calib.csv')
+temp_calibration = TemperatureCalibration.from_csv(r'C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\Data_Processing\temp_calib.csv')
 
-def calibrate_temp(temp_1: float):
+def calibrate_temp(temp_1):
     """
-    Convert temperature from 1 to 2 using the calibration data.
+    Convert temperature from 1 to 2 using the calibration data, scalar or array.
     """
-    calibrated_temp = temp_calib['temp_2'][temp_calib['temp_1'] == temp_1].values[0]
-    return calibrated_temp
+    return temp_calibration(temp_1)
 
 
 data_path = r"C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\TEST_DATA\RampAllTemp"
+catalog = RunCatalog()
+catalog.scan(data_path)
 # %%
 all_dfs = []
 for temperature in range(10, 71, 10):
 
-    csv_files = [f for f in os.listdir(data_path) if f.startswith(f"{temperature}C") and f.endswith(".csv")]
+    # Temperature first files ({T}C_{V}V_*.csv) from the catalog instead of listing the data drive
+    cataloged = catalog.query(temperature=temperature, ext=".csv", where="directory = ?", parameters=(os.path.abspath(data_path),))
+    csv_files = [f for f in cataloged["name"] if f.startswith(f"{temperature}C")]
     # Rearrange the file with -1000V in the filename to be last in the list
     csv_files.sort(key=lambda x: '-1000.0V' in x)
     # print(csv_files)
@@ -34,12 +41,11 @@ for temperature in range(10, 71, 10):
             df = pd.read_csv(os.path.join(data_path, file))
             df["Voltage_str"] = voltage
             df["Temperature"] = temperature
-            calibrated_temp = calibrate_temp(temperature)
-            df["Temperature_calibrated"] = calibrated_temp
             dfs.append(df)
 
     # Concatenate all dataframes and reset index
     combined_df = pd.concat(dfs, ignore_index=True)
+    calibrated_temp = calibrate_temp(temperature)
     all_dfs.append(combined_df)
 
     # Plot time vs Current of combined_df
@@ -59,6 +65,8 @@ for temperature in range(10, 71, 10):
     plt.show()
 
 combined_all_dfs = pd.concat(all_dfs, ignore_index=True)
+# Calibrate the whole Temperature column in one vectorized call
+combined_all_dfs["Temperature_calibrated"] = temp_calibration(combined_all_dfs["Temperature"])
 
 combined_all_dfs.to_csv('combined_all_dfs.csv', index=True)
 
@@ -84,32 +92,10 @@ def log_current(current: list):
 
 # %% Aggregate stabilized IV data
 
-big_df = pd.read_csv(r'C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\Data_Processing\combined_all_dfs.csv')
-df_stable = big_df[big_df['Time (s)'] > 3.0]
-df_stable['inverted_current'] = df_stable['Current (A)']*-1
-df_stable['abs_voltage'] = df_stable['Voltage (V)'].abs()
-
-# Plot the voltage vs current of df_subset
-temperature_list = big_df['Temperature_calibrated'].unique()
-voltage_list = big_df['Voltage_str'].unique()
-voltage_list = [float(voltage) for voltage in voltage_list]
-abs_voltage_list = [abs(voltage) for voltage in voltage_list]
-
-new_df = pd.DataFrame()
-
-for temperature in temperature_list:
-    average_current_list = []
-    for voltage in voltage_list:
-        df_subset = big_df[(big_df['Temperature_calibrated'] == temperature)\
-            & (big_df['Voltage_str'] == voltage)\
-                & (big_df['Time (s)'] > 3.0)]
-        average_current = df_subset['Current (A)'].mean()
-        average_current_list.append(average_current)
-
-    inverted_current_list = invert_current(average_current_list)
-    # log_current_list = log_current(inverted_current_list)
-    new_df = pd.concat([new_df, pd.DataFrame({'Temperature_calibrated': temperature, 'abs_voltage': abs_voltage_list, 'average_current': average_current_list, 'inverted_current': inverted_current_list})], ignore_index=True)
-            
+big_df = load_it_data(r'C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\Data_Processing\combined_all_dfs.csv')
+
+# One groupby pass over all (temperature, voltage) combinations, samples after 3 s
+new_df = stabilized_iv(big_df, settle_time=3.0)
 new_df.to_csv('Stabilized_IV_data.csv', index=False)
 
 
@@ -162,8 +148,6 @@ plt.show()
 
 
 # %%
-from scipy.optimize import curve_fit
-
 new_df = pd.read_csv(r'C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\Data_Processing\Stabilized_IV_data.csv')
 
 def arrhenius_fit(temperature: np.array, Ea: float, offset: float):
@@ -176,51 +160,28 @@ def arrhenius_fit(temperature: np.array, Ea: float, offset: float):
     current_array = np.exp(Ea/(k*temperature)) + offset
     return current_array
 
-def arrhenius_fit_log(inverted_temperature: np.array, Ea: float, offset: float):
-    """
-    Fit the current vs temperature data to the Arrhenius equation.
-    """
-    # Convert temperature to Kelvin
-    k = 8.617333262145e-5 # eV/K
-    log_current = -(Ea/k)*(inverted_temperature) + offset
-    return log_current
-
-def r_square(y_data: np.array, y_fit: np.array):
-    """
-    Calculate the R-square value.
-    """
-    ss_res = np.sum((y_data - y_fit) ** 2)
-    ss_tot = np.sum((y_data - np.mean(y_data)) ** 2)
-    return 1 - (ss_res / ss_tot)
-
-voltage_array = np.array(new_df['abs_voltage'].unique())
 calibrated_temperature_array = np.array(new_df['Temperature_calibrated'].unique())
 print(f"Calibrated temperature array: {calibrated_temperature_array}")
 
-# activation_energies = pd.DataFrame(columns=['Voltage', 'Ea_fit', 'offset_fit', 'r_square'])
-activation_energies = pd.DataFrame()
-colors = plt.cm.tab10(np.linspace(0, 1, len(voltage_array)))
+# All voltages (per sensor, if there are several) in one closed form least squares pass, set n_bootstrap for confidence intervals
+activation_energies = fit_arrhenius(new_df, min_temperature=20, n_bootstrap=0)
+colors = plt.cm.tab10(np.linspace(0, 1, len(activation_energies)))
 
 plt.figure(figsize=(10, 6))
-for i, voltage in enumerate(voltage_array):
+for i, row in activation_energies.iterrows():
+    voltage, Ea, offset = row['Voltage'], row['Ea_fit'], row['offset_fit']
+    label = f"{row['Sensor ID']} {voltage}V" if 'Sensor ID' in row else f"{voltage}V"
+    print(f"Ea for {label}: {Ea:.3f} eV, offset: {offset:.2f}, R-square: {row['r_square']:.3f}")
     df_subset = new_df[(new_df['abs_voltage'] == voltage)\
         & (new_df['Temperature_calibrated'] > 20)\
             ]
+    if 'Sensor ID' in row:
+        df_subset = df_subset[df_subset['Sensor ID'] == row['Sensor ID']]
     temperature_array = np.array(df_subset['Temperature_calibrated']) + 273.15 # Convert to Kelvin
     inverted_temperature = 1.0/temperature_array
-    current_array = np.array(df_subset['inverted_current'])
-    log_current_array = np.log(current_array)
-    
-    # Fit the data to the Arrhenius equation
-    popt, pcov = curve_fit(arrhenius_fit_log, inverted_temperature, log_current_array, p0=[1.0, 15])
-    Ea = np.round(popt[0], 3)
-    offset = np.round(popt[1], 2)
-    r_square_value = r_square(log_current_array, arrhenius_fit_log(inverted_temperature, Ea, offset))
-    print(f"Ea for {voltage}V: {Ea:.3f} eV, offset: {offset:.2f}, R-square: {r_square_value:.3f}")
-    data_row = pd.DataFrame({'Voltage': [voltage], 'Ea_fit': [Ea], 'offset_fit': [offset], 'r_square': [r_square_value]})
-    activation_energies = pd.concat([activation_energies, data_row], ignore_index=True, axis=0)
-
-    plt.plot(inverted_temperature, log_current_array, marker='.',  label=f"{voltage}V",
+    log_current_array = np.log(np.array(df_subset['inverted_current']))
+
+    plt.plot(inverted_temperature, log_current_array, marker='.',  label=label,
              color=colors[i]
              )
     plt.plot(inverted_temperature, arrhenius_fit_log(inverted_temperature, Ea, offset), linestyle='--', 
@@ -0,0 +1,161 @@
+"""
+Batch Arrhenius fits of stabilized IV data.
+
+ln(I) = -(Ea / k) / T + offset is linear in 1/T, so instead of one curve_fit per voltage every
+group (voltage, and sensor when present) is fit at once with closed form weighted least squares:
+the weighted sums of all groups are accumulated with np.bincount over the stacked samples.
+Bootstrap confidence intervals resample every group with replacement and fit all resamples
+the same way, a chunk of resamples per bincount pass.
+
+Without bootstrap the output has the columns of Activation_energy_by_voltage_above_20C.csv of
+T-dependent_IV_analysis: Ea and offset rounded to 3 and 2 decimals and R-square of the
+rounded fit. It was checked to be identical to the per voltage procedure with np.polyfit in
+place of curve_fit; curve_fit converges iteratively and can differ in the last rounded digit.
+Data of several sensors is fit per sensor, a "Sensor ID" column is part of the default keys.
+
+    new_df = pd.read_csv("Stabilized_IV_data.csv")
+    activation_energies = fit_arrhenius(new_df, min_temperature=20, n_bootstrap=2000)
+"""
+import numpy as np
+import pandas as pd
+
+BOLTZMANN_EV = 8.617333262145e-5  # eV/K
+
+
+def arrhenius_fit_log(inverted_temperature, Ea, offset):
+    """
+    ln(current) of the Arrhenius equation.
+
+    Args:
+        inverted_temperature (numpy.ndarray): 1/T in 1/K.
+        Ea (float): Activation energy in eV.
+        offset (float): ln(current) offset.
+
+    Returns:
+        numpy.ndarray: ln(current).
+    """
+    return -(Ea / BOLTZMANN_EV) * (inverted_temperature) + offset
+
+
+def r_square(y_data, y_fit):
+    """
+    Calculate the R-square value.
+    """
+    ss_res = np.sum((y_data - y_fit) ** 2)
+    ss_tot = np.sum((y_data - np.mean(y_data)) ** 2)
+    return 1 - (ss_res / ss_tot)
+
+
+def weighted_linear_fit(x, y, groups, n_groups, weights=None):
+    """
+    Closed form weighted least squares y = slope * x + intercept for every group.
+
+    Args:
+        x (numpy.ndarray): Abscissa of all samples.
+        y (numpy.ndarray): Ordinate of all samples.
+        groups (numpy.ndarray): Group index (0 .. n_groups - 1) of every sample.
+        n_groups (int): Number of groups.
+        weights (numpy.ndarray): Sample weights, None for ordinary least squares.
+
+    Returns:
+        tuple: (slope, intercept) arrays of length n_groups, NaN for groups without two distinct x.
+    """
+    weights = np.ones_like(x) if weights is None else weights
+    sum_w = np.bincount(groups, weights, n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.bincount(groups, weights * x, n_groups) / sum_w
+        y_mean = np.bincount(groups, weights * y, n_groups) / sum_w
+        # centered sums, 1/T spans only a few percent of its value
+        dx = x - x_mean[groups]
+        s_xx = np.bincount(groups, weights * dx * dx, n_groups)
+        s_xy = np.bincount(groups, weights * dx * (y - y_mean[groups]), n_groups)
+        slope = s_xy / s_xx
+        slope[s_xx <= 0] = np.nan
+    return slope, y_mean - slope * x_mean
+
+
+def fit_arrhenius(df, group_keys=("Sensor ID", "abs_voltage"), temperature_column="Temperature_calibrated",
+                  current_column="inverted_current", min_temperature=None, weight_column=None,
+                  n_bootstrap=0, confidence=0.95, seed=None, chunk_size=256):
+    """
+    Activation energy of every group of stabilized IV data.
+
+    Args:
+        df (pandas.DataFrame): Stabilized IV data, e.g. Stabilized_IV_data.csv.
+        group_keys (tuple): Columns defining a fit. Keys missing in df are ignored, so data without a
+            "Sensor ID" column is fit per voltage.
+        temperature_column (str): Temperature in C.
+        current_column (str): Positive current in A.
+        min_temperature (float): Only temperatures above this are fit.
+        weight_column (str): Sample weights, e.g. 1 / var(ln I). None for unweighted fits as curve_fit.
+        n_bootstrap (int): Bootstrap resamples for the confidence intervals, 0 disables them.
+        confidence (float): Confidence level of the percentile intervals.
+        seed (int): Random seed of the resampling.
+        chunk_size (int): Resamples fit per pass, bounds memory.
+
+    Returns:
+        pandas.DataFrame: One row per group in order of appearance: the keys (abs_voltage named Voltage),
+            Ea_fit, offset_fit, r_square and with bootstrap Ea_ci_low/high, offset_ci_low/high.
+    """
+    keys = [key for key in group_keys if key in df]
+    if min_temperature is not None:
+        df = df[df[temperature_column] > min_temperature]
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(df[keys]), sort=False)
+    n_groups = len(uniques)
+
+    # same expressions as the per voltage fit, so the rounded results are identical
+    inverted_temperature = 1.0 / (np.array(df[temperature_column]) + 273.15)
+    log_current = np.log(np.array(df[current_column]))
+    weights = None if weight_column is None else np.array(df[weight_column], dtype=np.float64)
+
+    slope, intercept = weighted_linear_fit(inverted_temperature, log_current, codes, n_groups, weights)
+    Ea = np.round(-slope * BOLTZMANN_EV, 3)
+    offset = np.round(intercept, 2)
+    r_squares = [r_square(log_current[codes == i], arrhenius_fit_log(inverted_temperature[codes == i], Ea[i], offset[i]))
+                 for i in range(n_groups)]
+
+    result = pd.DataFrame(list(uniques), columns=keys).rename(columns={"abs_voltage": "Voltage"})
+    result["Ea_fit"] = Ea
+    result["offset_fit"] = offset
+    result["r_square"] = r_squares
+
+    if n_bootstrap:
+        Ea_samples, offset_samples = _bootstrap(inverted_temperature, log_current, codes, n_groups, weights,
+                                                n_bootstrap, seed, chunk_size)
+        tails = 100 * np.array([(1 - confidence) / 2, (1 + confidence) / 2])
+        with np.errstate(invalid="ignore"):
+            result["Ea_ci_low"], result["Ea_ci_high"] = np.nanpercentile(Ea_samples, tails, axis=0)
+            result["offset_ci_low"], result["offset_ci_high"] = np.nanpercentile(offset_samples, tails, axis=0)
+    return result
+
+
+def _bootstrap(x, y, groups, n_groups, weights, n_bootstrap, seed, chunk_size):
+    """Ea and offset of n_bootstrap resamples (rows) of every group (columns)."""
+    rng = np.random.default_rng(seed)
+    # samples sorted by group, so a group is the range start[g] .. start[g] + size[g]
+    order = np.argsort(groups, kind="stable")
+    sizes = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    sample_groups = groups[order]
+    x, y = x[order], y[order]
+    weights = None if weights is None else weights[order]
+
+    Ea = np.empty((n_bootstrap, n_groups))
+    offset = np.empty((n_bootstrap, n_groups))
+    for first in range(0, n_bootstrap, chunk_size):
+        n = min(chunk_size, n_bootstrap - first)
+        # every resample draws size[g] samples from group g, all resamples of the chunk in one fit
+        picks = starts[sample_groups] + (rng.random((n, len(x))) * sizes[sample_groups]).astype(np.intp)
+        resample_groups = (np.arange(n)[:, None] * n_groups + sample_groups).ravel()
+        slope, intercept = weighted_linear_fit(x[picks].ravel(), y[picks].ravel(), resample_groups, n * n_groups,
+                                               None if weights is None else weights[picks].ravel())
+        Ea[first:first + n] = (-slope * BOLTZMANN_EV).reshape(n, n_groups)
+        offset[first:first + n] = intercept.reshape(n, n_groups)
+    return Ea, offset
+
+
+if __name__ == "__main__":
+    new_df = pd.read_csv(r'C:\Users\10552\OneDrive - Redlen Technologies\Code\Pockels-Gen2-Control\Data_Processing\Stabilized_IV_data.csv')
+    activation_energies = fit_arrhenius(new_df, min_temperature=20)
+    activation_energies.to_csv('Activation_energy_by_voltage_above_20C.csv', index=False)
+    print(fit_arrhenius(new_df, min_temperature=20, n_bootstrap=2000, seed=0))
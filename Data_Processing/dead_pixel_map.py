@@ -0,0 +1,318 @@
+"""
+Dead pixel maps: built once per camera and ROI from calibration frames, applied to every frame.
+
+Pixel defects belong to the sensor, so instead of thresholding every image the map is
+built from the temporal statistics of a calibration stack and cached on disk, keyed by
+camera serial and ROI. Applying it is a precomputed gather/scatter: for every dead pixel
+the flat indices and weights of its valid 3x3 neighbors are stored, so correcting a frame
+or a whole (N, H, W) stack is one fancy-indexing pass over the dead pixels only.
+
+    cache = DeadPixelMapCache()
+    dead_map = cache.get_or_build("4711", roi_from_crop(crop_range_x, crop_range_y), lambda: calibration_stack)
+    frames = dead_map.apply(frames)
+"""
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# Override with the DEAD_PIXEL_MAP_CACHE environment variable
+DEFAULT_CACHE_DIR = Path(os.environ.get("DEAD_PIXEL_MAP_CACHE", Path.home() / ".pockels" / "dead_pixel_maps"))
+
+_NEIGHBORS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+
+def roi_from_crop(crop_range_x, crop_range_y):
+    """
+    ROI tuple (x, y, width, height) from png_analysis style crop ranges.
+
+    Args:
+        crop_range_x (tuple): (start, stop) columns.
+        crop_range_y (tuple): (start, stop) rows.
+
+    Returns:
+        tuple: (x, y, width, height).
+    """
+    return (crop_range_x[0], crop_range_y[0], crop_range_x[1] - crop_range_x[0], crop_range_y[1] - crop_range_y[0])
+
+
+def temporal_statistics(frames, chunk_size=64):
+    """
+    Per pixel mean and standard deviation over a stack, accumulated in float64 chunks.
+
+    Args:
+        frames (numpy.ndarray): Stack (N, H, W), e.g. a memmap.
+        chunk_size (int): Frames per step.
+
+    Returns:
+        tuple: (mean, std) arrays of shape (H, W).
+    """
+    total = np.zeros(frames.shape[1:], dtype=np.float64)
+    total_sq = np.zeros(frames.shape[1:], dtype=np.float64)
+    for start in range(0, len(frames), chunk_size):
+        chunk = np.asarray(frames[start:start + chunk_size], dtype=np.float64)
+        total += chunk.sum(axis=0)
+        total_sq += np.square(chunk).sum(axis=0)
+    mean = total / len(frames)
+    variance = np.maximum(total_sq / len(frames) - mean ** 2, 0.0)
+    return mean, np.sqrt(variance)
+
+
+def _outliers(values, sigma):
+    """Values further than sigma robust standard deviations (1.4826 MAD) above the median."""
+    median = np.median(values)
+    mad = 1.4826 * np.median(np.abs(values - median))
+    if mad == 0:
+        return np.zeros(values.shape, dtype=bool)
+    return values > median + sigma * mad
+
+
+def build_dead_pixel_mask(frames, threshold=100, sigma=8.0, stuck=True):
+    """
+    Dead pixel mask from the temporal statistics of calibration frames.
+
+    A pixel is dead when its mean is below threshold (as find_dead_pixels in png_analysis),
+    when it never changes while the stack does (stuck), when its mean is a hot outlier or
+    when its temporal noise is an outlier.
+
+    Args:
+        frames (numpy.ndarray): Calibration stack (N, H, W), at least 2 frames for the temporal criteria.
+        threshold (float): Low mean threshold.
+        sigma (float): Outlier distance in robust standard deviations for hot and noisy pixels.
+        stuck (bool): Flag pixels with zero temporal variance.
+
+    Returns:
+        numpy.ndarray: Boolean mask (H, W).
+    """
+    if not hasattr(frames, "shape"):
+        frames = np.asarray(frames)
+    if frames.ndim == 2:
+        frames = frames[None]
+    mean, std = temporal_statistics(frames)
+
+    mask = mean < threshold
+    mask |= _outliers(mean, sigma)
+    if len(frames) > 1:
+        mask |= _outliers(std, sigma)
+        if stuck and np.any(std > 0):
+            mask |= std == 0
+    return mask
+
+
+class DeadPixelMap:
+    """
+    Dead pixel mask plus the precomputed gather/scatter indices to correct frames.
+    Every dead pixel becomes the mean of its valid (not dead) 3x3 neighbors; dead pixels
+    without a valid neighbor are left as they are.
+    """
+
+    def __init__(self, mask, serial=None, roi=None, info=None):
+        """
+        Args:
+            mask (numpy.ndarray): Boolean dead pixel mask (H, W).
+            serial (str): Camera serial number the map belongs to.
+            roi (tuple): (x, y, width, height) of the frames on the sensor.
+            info (dict): Free form build information (date, thresholds, frame count).
+        """
+        self.mask = np.asarray(mask, dtype=bool)
+        self.serial = None if serial is None else str(serial)
+        self.roi = None if roi is None else tuple(int(v) for v in roi)
+        self.info = dict(info or {})
+        self._build_indices()
+
+    def _build_indices(self):
+        height, width = self.mask.shape
+        rows, cols = np.nonzero(self.mask)
+
+        # (dead pixels, 8) neighbor flat indices and validity weights
+        neighbor_rows = rows[:, None] + np.array([dy for dy, _ in _NEIGHBORS])
+        neighbor_cols = cols[:, None] + np.array([dx for _, dx in _NEIGHBORS])
+        inside = (neighbor_rows >= 0) & (neighbor_rows < height) & (neighbor_cols >= 0) & (neighbor_cols < width)
+        neighbor_rows = np.clip(neighbor_rows, 0, height - 1)
+        neighbor_cols = np.clip(neighbor_cols, 0, width - 1)
+        valid = inside & ~self.mask[neighbor_rows, neighbor_cols]
+
+        counts = valid.sum(axis=1)
+        keep = counts > 0
+        self.dead_index = (rows * width + cols)[keep]
+        self.neighbor_index = (neighbor_rows * width + neighbor_cols)[keep]
+        self.neighbor_weight = valid[keep] / counts[keep, None]
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    @property
+    def count(self):
+        """Number of dead pixels"""
+        return int(np.count_nonzero(self.mask))
+
+    def apply(self, frames, out=None):
+        """
+        Replace the dead pixels of a frame (H, W) or stack (N, H, W).
+
+        Args:
+            frames (numpy.ndarray): Frame or stack with the map's frame shape.
+            out (numpy.ndarray): Output array, may be frames itself for in-place correction. Defaults to a copy.
+
+        Returns:
+            numpy.ndarray: The corrected frames, dtype of frames.
+        """
+        frames = np.asarray(frames)
+        if frames.shape[-2:] != self.mask.shape:
+            raise ValueError(f"Frame shape {frames.shape[-2:]} does not match the dead pixel map {self.mask.shape}")
+        if out is None:
+            out = frames.copy()
+        elif out is not frames:
+            out[...] = frames
+
+        flat = out.reshape(-1, self.mask.size)
+        gathered = flat[:, self.neighbor_index]                      # (N, dead, 8)
+        values = np.einsum('ndk,dk->nd', gathered, self.neighbor_weight)
+        if np.issubdtype(out.dtype, np.integer):
+            values = np.round(values)
+        flat[:, self.dead_index] = values
+        if not np.shares_memory(flat, out):
+            # reshape copied a non-contiguous out
+            out[...] = flat.reshape(out.shape)
+        return out
+
+    def save(self, path):
+        """
+        Store the map as .npz.
+
+        Args:
+            path (str or Path): Output file.
+        """
+        np.savez_compressed(path, mask=self.mask, serial=np.array(self.serial or ""),
+                            roi=np.array(self.roi if self.roi is not None else [], dtype=np.int64),
+                            info=np.array(json.dumps(self.info)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a map stored with save.
+
+        Args:
+            path (str or Path): The .npz file.
+
+        Returns:
+            DeadPixelMap: The map.
+        """
+        with np.load(path) as data:
+            roi = tuple(data["roi"]) if data["roi"].size else None
+            return cls(data["mask"], str(data["serial"]) or None, roi, json.loads(str(data["info"])))
+
+
+class DeadPixelMapCache:
+    """
+    Dead pixel maps on disk, one .npz file per camera serial and ROI.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        """
+        Args:
+            directory (str or Path): Cache directory.
+        """
+        self.directory = Path(directory)
+
+    def path(self, serial, roi):
+        """Cache file of a camera serial and ROI (x, y, width, height)."""
+        roi_key = "full" if roi is None else "_".join(str(int(v)) for v in roi)
+        return self.directory / f"{serial}_{roi_key}.npz"
+
+    def get(self, serial, roi):
+        """
+        The stored map, None if there is none.
+        """
+        path = self.path(serial, roi)
+        return DeadPixelMap.load(path) if path.exists() else None
+
+    def put(self, dead_map):
+        """
+        Store a map under its serial and ROI.
+
+        Returns:
+            Path: The cache file.
+        """
+        if dead_map.serial is None:
+            raise ValueError("A cached dead pixel map needs a camera serial")
+        path = self.path(dead_map.serial, dead_map.roi)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # save next to the cache file and swap, a concurrent reader never sees a partial file
+        temp_path = path.with_suffix(".tmp.npz")
+        dead_map.save(temp_path)
+        os.replace(temp_path, path)
+        return path
+
+    def remove(self, serial, roi):
+        """
+        Drop a stored map, e.g. after the sensor degraded; the next get_or_build rebuilds it.
+        """
+        self.path(serial, roi).unlink(missing_ok=True)
+
+    def get_or_build(self, serial, roi, calibration_frames, **build_options):
+        """
+        The stored map, or a new map built from calibration frames and stored.
+
+        Args:
+            serial (str): Camera serial number.
+            roi (tuple): (x, y, width, height) of the frames on the sensor, None for full frames.
+            calibration_frames (numpy.ndarray or callable): Stack (N, H, W) or a function returning it,
+                only called when the map has to be built.
+            **build_options: Passed to build_dead_pixel_mask.
+
+        Returns:
+            DeadPixelMap: The map.
+        """
+        dead_map = self.get(serial, roi)
+        if dead_map is not None:
+            return dead_map
+
+        frames = calibration_frames() if callable(calibration_frames) else calibration_frames
+        mask = build_dead_pixel_mask(frames, **build_options)
+        info = dict(build_options, frames=len(frames) if np.ndim(frames) == 3 else 1,
+                    created=datetime.now().isoformat(timespec="seconds"))
+        dead_map = DeadPixelMap(mask, serial, roi, info)
+        self.put(dead_map)
+        return dead_map
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    # Synthetic check: 100 calibration frames with low, stuck, hot and noisy pixels
+    rng = np.random.default_rng(0)
+    height, width = 130, 630
+    base = np.add.outer(np.linspace(1500, 2000, height), np.linspace(0, 500, width))
+    calibration = rng.normal(base, 8.0, (100, height, width))
+    truth = np.zeros((height, width), dtype=bool)
+    for kind in range(4):
+        rows, cols = rng.integers(0, height, 100), rng.integers(0, width, 100)
+        truth[rows, cols] = True
+        if kind == 0:
+            calibration[:, rows, cols] = rng.uniform(0, 90, (100, 100))
+        elif kind == 1:
+            calibration[:, rows, cols] = 2000.0
+        elif kind == 2:
+            calibration[:, rows, cols] = 16000.0
+        else:
+            calibration[:, rows, cols] += rng.normal(0, 400, (100, 100))
+    calibration = np.clip(calibration, 0, 16383).astype(np.uint16)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DeadPixelMapCache(tmp)
+        start = time.perf_counter()
+        dead_map = cache.get_or_build("SIM-0001", (5, 190, width, height), calibration)
+        print(f"Built map with {dead_map.count} dead pixels ({np.count_nonzero(truth)} planted, "
+              f"{np.count_nonzero(dead_map.mask & truth)} found) in {time.perf_counter() - start:.3f} s")
+        assert cache.get("SIM-0001", (5, 190, width, height)).count == dead_map.count
+
+        stack = calibration[:50]
+        start = time.perf_counter()
+        corrected = dead_map.apply(stack)
+        print(f"Corrected {len(stack)} frames in {time.perf_counter() - start:.4f} s")
+        assert np.all(np.abs(corrected[:, truth].astype(float) - base[truth]) < 50)
@@ -1,9 +1,18 @@
 import os
+import sys
 import numpy as np
 from PIL import Image
 import matplotlib.pyplot as plt
 import plotly.express as px
 
+# repository root, so the imports below work from any working directory
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calibration_cache import CalibrationCache
+from Data_Processing.dead_pixel_map import DeadPixelMap, roi_from_crop
+from Data_Processing.pockels_reconstruction import calibration_from_set, prepare_calibration, reconstruct_stack
+from Data_Processing.png_stack_loader import load_png_stack
+
 def png_to_array(image_path):
     """
     Convert a PNG image to a numpy array.
@@ -87,89 +96,118 @@ def crop_image(img_array, crop_range_x, crop_range_y):
     """
     return img_array[crop_range_y[0]:crop_range_y[1], crop_range_x[0]:crop_range_x[1]]
 
+def dead_pixel_mask(img_array, threshold=100):
+    """
+    Boolean mask of the dead (low) pixels of a frame or a stack of frames.
+
+    Args:
+        img_array (numpy.ndarray): Frame (H, W) or stack (N, H, W).
+        threshold (float): Pixels below this value are dead.
+
+    Returns:
+        numpy.ndarray: Boolean mask with the shape of img_array.
+    """
+    return np.asarray(img_array) < threshold
+
+def _neighbor_sum(values):
+    """Sum over the 3x3 neighborhood of every pixel, excluding the pixel itself, zero outside the image."""
+    height, width = values.shape[-2:]
+    padded = np.pad(values, [(0, 0)] * (values.ndim - 2) + [(1, 1), (1, 1)])
+    total = np.zeros(values.shape, dtype=np.float64)
+    for dy in range(3):
+        for dx in range(3):
+            if dy != 1 or dx != 1:
+                total += padded[..., dy:dy + height, dx:dx + width]
+    return total
+
 def impute_dead_pixels(img_array, dead_pixels):
     """
-    Impute dead pixels in an image array.
+    Impute dead pixels in an image array (in place) with the mean of their valid 3x3 neighbors.
+
+    Dead neighbors do not contribute (normalized masked convolution: valid neighbor sum /
+    valid neighbor count); a dead pixel without valid neighbors keeps its value.
+
+    Args:
+        img_array (numpy.ndarray): Frame (H, W) or stack (N, H, W).
+        dead_pixels (numpy.ndarray or list): Boolean mask from dead_pixel_mask, either of img_array's
+            shape or (H, W) for all frames of a stack, or a list of (x, y) tuples from find_dead_pixels.
+
+    Returns:
+        numpy.ndarray: img_array with the dead pixels replaced.
     """
-    for pixel in dead_pixels:
-        x, y = pixel
-        # Get values of surrounding pixels in a 3x3 grid, excluding the center pixel
-        surrounding_values = []
-        for i in [-1, 0, 1]:
-            for j in [-1, 0, 1]:
-                # Skip the center pixel
-                if i == 0 and j == 0:
-                    continue
-                # Check bounds to avoid index errors
-                if 0 <= y+i < img_array.shape[0] and 0 <= x+j < img_array.shape[1]:
-                    surrounding_values.append(img_array[y+i, x+j])
-        # Calculate mean of surrounding pixels and assign to dead pixel
-        if surrounding_values:
-            img_array[y, x] = np.mean(surrounding_values)
+    if isinstance(dead_pixels, np.ndarray) and dead_pixels.dtype == bool:
+        mask = dead_pixels
+    else:
+        mask = np.zeros(img_array.shape[-2:], dtype=bool)
+        if len(dead_pixels):
+            x, y = np.asarray(dead_pixels).T
+            mask[y, x] = True
+    mask = np.broadcast_to(mask, img_array.shape)
+
+    valid = ~mask
+    counts = _neighbor_sum(valid)
+    sums = _neighbor_sum(np.where(valid, img_array, 0))
+    fill = mask & (counts > 0)
+    img_array[fill] = sums[fill] / counts[fill]
     return img_array
 
 def find_dead_pixels(img_array, threshold=100):
     """
     Find dead pixels in an image array.
+    Returns (x, y) tuples, use dead_pixel_mask for the vectorized mask.
     """
-    dead_pixels = np.where(img_array < threshold)
+    dead_pixels = np.nonzero(dead_pixel_mask(img_array, threshold))
     # Convert array indices to list of (x,y) tuples
     dead_pixel_coords = list(zip(dead_pixels[1], dead_pixels[0]))
     # return dead_pixel_coords
     return dead_pixel_coords
 
 
-
 if __name__ == "__main__":
     image_dir = r"C:\Code\Pockels-Gen2-Control\CAMERA_IMAGES\pockels_run"
-    crop_range_y = (190, 320)
-    crop_range_x = (5, 635)
+    sensor_id, temperature = "pockels_run", 25  # calibration cache key, as passed to It_control startup
+
+    # Calibration frames, denominator and dead pixel mask as stored by It_control, cropped to the set's ROI
+    calibration_set = CalibrationCache().load(sensor_id, temperature)
+    if calibration_set is not None:
+        x, y, width, height = calibration_set.roi
+        crop_range_x, crop_range_y = (x, x + width), (y, y + height)
+        calib_parallel_on, calib_parallel_off, calib_cross_on = (
+            np.asarray(calibration_set.parallel_on), calibration_set.parallel_off, calibration_set.cross_on)
+        dead_map = DeadPixelMap(calibration_set.dead_mask, serial=sensor_id, roi=calibration_set.roi)
+    else:
+        # Runs captured before the cache existed or by main_pockels_routine only have the PNGs
+        crop_range_y = (190, 320)
+        crop_range_x = (5, 635)
+        calib_parallel_on, calib_parallel_off, calib_cross_on = load_png_stack(
+            [os.path.join(image_dir, name) for name in ("calib_parallel_on.png", "calib_parallel_off.png", "calib_cross_on.png")],
+            crop_range_x=crop_range_x, crop_range_y=crop_range_y)[0]
+        dead_map = DeadPixelMap(dead_pixel_mask(calib_parallel_on), serial=sensor_id,
+                                roi=roi_from_crop(crop_range_x, crop_range_y))
+    print("Number of dead pixels: ", dead_map.count)
 
-    calib_parallel_on = crop_image(png_to_array(os.path.join(image_dir, "calib_parallel_on.png")), 
-                                   crop_range_x, crop_range_y)
     vmin = np.percentile(calib_parallel_on, 10)
     vmax = np.percentile(calib_parallel_on, 90)
-    print("Number of dead pixels: ", len(find_dead_pixels(calib_parallel_on)))
-    print(f"Dead pixels: {find_dead_pixels(calib_parallel_on)}")
     plot_image_colormap(calib_parallel_on, title="Calibrated Parallel On", color_range=(vmin, vmax))
 
-    calib_parallel_on = impute_dead_pixels(calib_parallel_on, find_dead_pixels(calib_parallel_on))
-    print("Number of dead pixels: ", len(find_dead_pixels(calib_parallel_on)))
-    print(f"Dead pixels: {find_dead_pixels(calib_parallel_on)}")
+    calib_parallel_on = dead_map.apply(calib_parallel_on)
     plot_image_colormap(calib_parallel_on, title="Calibrated Parallel On", color_range=(vmin, vmax))
 
-    calib_parallel_off = crop_image(png_to_array(os.path.join(image_dir, "calib_parallel_off.png")), 
-                                   crop_range_x, crop_range_y)
-    print(f"Dead pixels: {find_dead_pixels(calib_parallel_off)}")
+    calib_parallel_off = dead_map.apply(calib_parallel_off)
     plot_image_colormap(calib_parallel_off, title="Calibrated Parallel Off")
 
-
-    calib_cross_on = crop_image(png_to_array(os.path.join(image_dir, "calib_cross_on.png")), 
-                                   crop_range_x, crop_range_y)
-    print(f"Dead pixels: {find_dead_pixels(calib_cross_on)}")
+    calib_cross_on = dead_map.apply(calib_cross_on)
     plot_image_colormap(calib_cross_on, title="Calibrated Cross On")
 
     # # Find and process HV files
-    # hv_files = [f for f in os.listdir(image_dir) if f.startswith('hv_')]
+    # hv_stack, hv_metadata = load_png_stack(image_dir, pattern="hv_*.png", crop_range_x=crop_range_x, crop_range_y=crop_range_y)
+    # hv_files = list(hv_metadata["file"])
     # print(f"\nFound {len(hv_files)} HV files:")
-    # for hv_file in sorted(hv_files[0:2]):
-    #     print(f"Processing {hv_file}")
-    #     hv_array = png_to_array(os.path.join(image_dir, hv_file))
-    #     plot_image_colormap(hv_array, title=f"High Voltage Bias - {hv_file}", color_range=(vmin, vmax))
-
-    #     numerator = hv_array - calib_cross_on
-    #     denominator = calib_parallel_on - calib_parallel_off
-    #     plot_image_colormap(numerator, title=f"Numerator - {hv_file}")
-    #     plot_image_colormap(denominator, title=f"Denominator - {hv_file}")
-    #     T_array = numerator / denominator
-    #     # Clip transmission values to valid arcsin range
-    #     T_array[T_array > 1.0] = 0.99
-    #     T_array[T_array < -1.0] = -0.99
+    # if calibration_set is not None:
+    #     calibration = calibration_from_set(calibration_set, dead_map=dead_map)
+    # else:
+    #     calibration = prepare_calibration(calib_parallel_on, calib_parallel_off, calib_cross_on)
+    # result = reconstruct_stack(hv_stack, calibration, dead_map=dead_map)
+    # for hv_file, T_array, E_field in zip(hv_files[0:2], result.transmission, result.field):
     #     plot_image_colormap(T_array, title=f"Transmission - {hv_file}")
-
-
-    #     E_field = np.arcsin(T_array)
     #     plot_image_colormap(E_field, title=f"Electric Field - {hv_file}")
-
-
-
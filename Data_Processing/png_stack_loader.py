@@ -0,0 +1,183 @@
+"""
+Parallel loading of the PNG frames of a Pockels run into one (N, H, W) stack.
+
+PNGs are decoded on a thread pool (PIL releases the GIL while decoding) straight into a
+preallocated stack. Every decoded frame is cached as an .npy sidecar in a .png_cache
+folder next to the PNGs, validated by the PNG's size and mtime, so reloading a run only
+memory maps the sidecars. Metadata parsed from the file names of It_control
+({sensor_id}_{temperature}C_{voltage}V_{timestamp}.png, {sensor_id}_{temperature}C_calib_*.png)
+is returned as a DataFrame with one row per frame.
+
+    frames, metadata = load_png_stack(r"C:\\...\\CAMERA_IMAGES", pattern="*V_*.png")
+    frames_25C = frames[metadata["temperature"] == 25]
+"""
+import glob
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+CACHE_FOLDER = ".png_cache"
+INDEX_FILE = "index.json"
+
+_NAME_PATTERN = re.compile(
+    r"^(?P<sensor_id>.+?)_(?P<temperature>-?\d+(?:\.\d+)?)C_"
+    r"(?:(?P<voltage>\d+(?:\.\d+)?)V_(?P<timestamp>.+)|(?P<calibration>calib_.+))$"
+)
+
+
+def parse_png_name(file_name):
+    """
+    Metadata from an It_control image file name.
+
+    Args:
+        file_name (str): File name or path.
+
+    Returns:
+        dict: file, sensor_id, temperature, voltage, timestamp and calibration; None for missing parts.
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    info = {"file": os.path.basename(file_name), "sensor_id": None, "temperature": np.nan, "voltage": np.nan,
+            "timestamp": None, "calibration": None}
+    match = _NAME_PATTERN.match(stem)
+    if match is not None:
+        info.update({key: value for key, value in match.groupdict().items() if value is not None})
+        info["temperature"] = float(info["temperature"])
+        info["voltage"] = float(info["voltage"])
+    return info
+
+
+def _sidecar_path(png_path):
+    directory, name = os.path.split(png_path)
+    return os.path.join(directory, CACHE_FOLDER, name + ".npy")
+
+
+def _stamp(png_path):
+    stat = os.stat(png_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load_index(directory):
+    try:
+        with open(os.path.join(directory, CACHE_FOLDER, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(directory, index):
+    cache_dir = os.path.join(directory, CACHE_FOLDER)
+    temp_path = os.path.join(cache_dir, INDEX_FILE + ".tmp")
+    with open(temp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(temp_path, os.path.join(cache_dir, INDEX_FILE))
+
+
+def _cached_frame(png_path, index):
+    """Memory mapped sidecar of png_path, None if there is none or the PNG changed."""
+    if index.get(os.path.basename(png_path)) != _stamp(png_path):
+        return None
+    try:
+        return np.load(_sidecar_path(png_path), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def _decode(png_path, use_cache):
+    frame = np.array(Image.open(png_path))
+    if use_cache:
+        sidecar = _sidecar_path(png_path)
+        os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+        np.save(sidecar, frame)
+    return frame
+
+
+def find_pngs(source, pattern="*.png"):
+    """
+    Sorted PNG paths of a run directory or glob.
+
+    Args:
+        source (str): Directory or glob pattern, e.g. r"C:\\...\\CAMERA_IMAGES\\S1_25C_*V_*.png".
+        pattern (str): File pattern when source is a directory.
+
+    Returns:
+        list: Paths.
+    """
+    if os.path.isdir(source):
+        source = os.path.join(source, pattern)
+    return sorted(glob.glob(source))
+
+
+def load_png_stack(source, pattern="*.png", crop_range_x=None, crop_range_y=None, workers=None, use_cache=True):
+    """
+    Load the PNGs of a run into one stack.
+
+    Args:
+        source (str or list): Run directory, glob pattern or list of PNG paths.
+        pattern (str): File pattern when source is a directory.
+        crop_range_x (tuple): (start, stop) columns to keep, as crop_image in png_analysis.
+        crop_range_y (tuple): (start, stop) rows to keep.
+        workers (int): Decoding threads, defaults to ThreadPoolExecutor's default.
+        use_cache (bool): Read and write the .npy sidecars.
+
+    Returns:
+        tuple: (frames, metadata), frames (N, H, W) (or (N, H, W, C) for color PNGs) in file order,
+            metadata a DataFrame from parse_png_name plus the "path" of each frame.
+    """
+    paths = list(source) if isinstance(source, (list, tuple)) else find_pngs(source, pattern)
+    metadata = pd.DataFrame([dict(parse_png_name(path), path=path) for path in paths])
+    if not paths:
+        return np.empty((0, 0, 0)), metadata
+
+    rows = slice(*crop_range_y) if crop_range_y is not None else slice(None)
+    cols = slice(*crop_range_x) if crop_range_x is not None else slice(None)
+    directories = sorted({os.path.dirname(path) for path in paths})
+    indexes = {directory: _load_index(directory) if use_cache else {} for directory in directories}
+
+    def frame_at(path):
+        frame = _cached_frame(path, indexes[os.path.dirname(path)]) if use_cache else None
+        if frame is None:
+            frame = _decode(path, use_cache)
+            return frame, True
+        return frame, False
+
+    # the first frame defines shape and dtype of the stack
+    first, decoded_first = frame_at(paths[0])
+    first = first[rows, cols]
+    frames = np.empty((len(paths),) + first.shape, dtype=first.dtype)
+    frames[0] = first
+    decoded = [decoded_first] + [False] * (len(paths) - 1)
+
+    def load(i):
+        frame, decoded[i] = frame_at(paths[i])
+        frame = frame[rows, cols]
+        if frame.shape != first.shape:
+            raise ValueError(f"{paths[i]} has shape {frame.shape}, expected {first.shape}")
+        frames[i] = frame
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list() re-raises decoding errors
+        list(executor.map(load, range(1, len(paths))))
+
+    if use_cache and any(decoded):
+        for path, was_decoded in zip(paths, decoded):
+            if was_decoded:
+                indexes[os.path.dirname(path)][os.path.basename(path)] = _stamp(path)
+        for directory in directories:
+            _save_index(directory, indexes[directory])
+    return frames, metadata
+
+
+if __name__ == "__main__":
+    import time
+
+    image_dir = r"C:\Code\Pockels-Gen2-Control\CAMERA_IMAGES\pockels_run"
+    for attempt in ("decode", "cached"):
+        start = time.perf_counter()
+        frames, metadata = load_png_stack(image_dir, crop_range_x=(5, 635), crop_range_y=(190, 320))
+        print(f"{attempt}: {len(frames)} frames {frames.shape[1:]} in {time.perf_counter() - start:.2f} s")
+    print(metadata)
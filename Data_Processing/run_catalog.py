@@ -0,0 +1,380 @@
+"""
+SQLite catalog of the measurement files under one or more data roots.
+
+File names carry sensor ID, temperature, voltage and X-ray current in a handful of
+conventions ({sensor_id}_{T}C_{timestamp}.csv, {T}C_{V}V_*.csv, {sensor_id}_{T}C_{V}V_{timestamp}.png,
+bias_{hv}V_xray_{mA}mA, Drop1000V_T{T}C, calib_*); outputs of the analysis scripts (Stabilized_IV_data.csv,
+...) are cataloged as kind "analysis" without conditions. The CSVs of ramp_capture_GUI.save_to_csv
+start with "# key: value" headers, among them the list of test voltages. scan() parses all of it
+once into indexed columns and a voltages table; later scans only list directories whose mtime
+changed and only parse files whose size or mtime changed, so a rescan of an unchanged network
+drive is one stat per directory. Queries then come back from
+the local database:
+
+    with RunCatalog() as catalog:
+        catalog.scan(r"C:\\...\\TEST_DATA")
+        traces = catalog.query(sensor_id="D420144", temperature=25, voltage=-1000, ext=".csv")
+"""
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+DEFAULT_DB = Path.home() / ".pockels" / "run_catalog.sqlite"
+
+# Files that are cataloged, everything else is ignored
+EXTENSIONS = (".csv", ".txt", ".png", ".xvi", ".npy", ".xcs")
+HEADER_EXTENSIONS = (".csv", ".txt")
+MAX_HEADER_LINES = 100
+
+# File name tokens naming the kind of measurement
+KINDS = ("calib", "bias", "cross", "shutoff", "hv")
+# Outputs of the analysis scripts, kind "analysis"; their names describe the analysis, not a run
+ANALYSIS_PREFIXES = ("Activation_energy", "Stabilized_IV_data", "combined_all_dfs", "I-T_")
+
+_TEMPERATURE = re.compile(r"^T?(-?\d+(?:\.\d+)?)C$")
+_VOLTAGE = re.compile(r"^(-?\d+(?:\.\d+)?)V$")
+_XRAY_CURRENT = re.compile(r"^(\d+(?:\.\d+)?)mA$")
+_SENSOR_ID = re.compile(r"^[A-Za-z]+\d{3,}[A-Za-z0-9-]*$")
+# a voltage glued to a word (Drop1000V) is not a sensor ID
+_VOLTAGE_SUFFIX = re.compile(r"\d(?:\.\d+)?V$")
+_TIMESTAMP = re.compile(r"^\d[\d.\-:T_]{5,}$")
+# date and time split by "_" (2025-04-08_14-40) are joined back into one timestamp token
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TIME = re.compile(r"^\d{2}[-:]\d{2}(?:[-:]\d{2})?$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ext TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    kind TEXT,
+    sensor_id TEXT,
+    temperature REAL,
+    voltage REAL,
+    xray_current REAL,
+    timestamp TEXT,
+    tags TEXT,
+    headers TEXT
+);
+CREATE TABLE IF NOT EXISTS voltages (
+    path TEXT NOT NULL,
+    voltage REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+CREATE INDEX IF NOT EXISTS files_conditions ON files (sensor_id, temperature, voltage);
+CREATE INDEX IF NOT EXISTS files_temperature ON files (temperature, voltage);
+CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+CREATE INDEX IF NOT EXISTS voltages_voltage ON voltages (voltage, path);
+CREATE INDEX IF NOT EXISTS voltages_path ON voltages (path);
+"""
+
+# Stored in PRAGMA user_version; bump when parse_file_name changes so old catalogs are parsed again
+PARSER_VERSION = 4
+
+_FILE_COLUMNS = ("path", "directory", "name", "ext", "size", "mtime_ns", "kind", "sensor_id", "temperature",
+                 "voltage", "xray_current", "timestamp", "tags", "headers")
+
+
+def _name_tokens(name):
+    """"_" separated tokens of a file name without extension, a date followed by a time as one token"""
+    tokens = []
+    for token in os.path.splitext(name)[0].split("_"):
+        if tokens and _TIME.match(token) and _DATE.match(tokens[-1]):
+            tokens[-1] += "_" + token
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def parse_file_name(name):
+    """
+    Conditions encoded in a measurement file name, token by token ("_" separated).
+
+    Args:
+        name (str): File name, e.g. "D420144_25C_1000.0V_2024-05-01-10-00-00.png", "dev_90C_2025-04-08_14-40.csv",
+            "Drop1000V_T25C.xvi" or "bias_500V_xray_10mA.png".
+
+    Returns:
+        dict: kind, sensor_id, temperature, voltage, xray_current, timestamp and tags (unparsed tokens), None if absent.
+    """
+    info = dict(kind=None, sensor_id=None, temperature=None, voltage=None, xray_current=None, timestamp=None)
+    if name.startswith(ANALYSIS_PREFIXES):
+        info.update(kind="analysis", tags=os.path.splitext(name)[0])
+        return info
+    tags = []
+    for position, token in enumerate(_name_tokens(name)):
+        if token.lower() in KINDS and info["kind"] is None:
+            info["kind"] = token.lower()
+        elif _TEMPERATURE.match(token) and info["temperature"] is None:
+            info["temperature"] = float(_TEMPERATURE.match(token).group(1))
+        elif _VOLTAGE.match(token) and info["voltage"] is None:
+            info["voltage"] = float(token[:-1])
+        elif _XRAY_CURRENT.match(token) and info["xray_current"] is None:
+            info["xray_current"] = float(token[:-2])
+        elif position == 0 and _SENSOR_ID.match(token) and not _VOLTAGE_SUFFIX.search(token):
+            info["sensor_id"] = token
+        elif _TIMESTAMP.match(token) and info["timestamp"] is None:
+            info["timestamp"] = token
+        elif token:
+            tags.append(token)
+    info["tags"] = "_".join(tags) or None
+    return info
+
+
+def read_headers(path):
+    """
+    "# key: value" header lines of a CSV written by save_to_csv.
+
+    Args:
+        path (str): File path.
+
+    Returns:
+        dict: Header values as strings, empty if there are none.
+    """
+    headers = {}
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for _, line in zip(range(MAX_HEADER_LINES), f):
+                line = line.strip().strip('"')
+                if not line.startswith("#"):
+                    break
+                key, _, value = line[1:].partition(":")
+                if value:
+                    headers[key.strip()] = value.strip()
+    except OSError:
+        pass
+    return headers
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_voltages(headers):
+    """Voltages of the "Test Voltages" header, e.g. "[-100, -200, -300]", empty if absent or unreadable"""
+    try:
+        voltages = json.loads(headers.get("Test Voltages", "[]"))
+    except ValueError:
+        return []
+    if not isinstance(voltages, list):
+        voltages = [voltages]
+    return [voltage for voltage in map(_float, voltages) if voltage is not None]
+
+
+def _file_record(entry, directory):
+    name = entry.name
+    stat = entry.stat()
+    ext = os.path.splitext(name)[1].lower()
+    info = parse_file_name(name)
+    headers = read_headers(entry.path) if ext in HEADER_EXTENSIONS and info["kind"] != "analysis" else {}
+    # headers fill what the file name does not say
+    if info["sensor_id"] is None and headers.get("Sensor ID"):
+        info["sensor_id"] = headers["Sensor ID"]
+    if info["temperature"] is None:
+        info["temperature"] = _float(headers.get("Temperature"))
+    voltages = set(_header_voltages(headers))
+    if info["voltage"] is not None:
+        voltages.add(info["voltage"])
+    record = (entry.path, directory, name, ext, stat.st_size, stat.st_mtime_ns, info["kind"], info["sensor_id"],
+              info["temperature"], info["voltage"], info["xray_current"], info["timestamp"], info["tags"],
+              json.dumps(headers) if headers else None)
+    return record, [(entry.path, voltage) for voltage in sorted(voltages)]
+
+
+class RunCatalog:
+    """
+    Incrementally updated SQLite catalog of measurement files.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB):
+        """
+        Args:
+            db_path (str or Path): SQLite database, created if needed. ":memory:" for a throwaway catalog.
+        """
+        if str(db_path) != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(db_path))
+        self.connection.executescript(_SCHEMA)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != PARSER_VERSION:
+            # rows parsed by another version of parse_file_name, the next scan lists everything again
+            with self.connection:
+                self.connection.execute("DELETE FROM files")
+                self.connection.execute("DELETE FROM voltages")
+                self.connection.execute("DELETE FROM directories")
+                self.connection.execute(f"PRAGMA user_version = {PARSER_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def scan(self, roots, full=False):
+        """
+        Bring the catalog up to date with the data roots.
+
+        Unchanged directories (same mtime) are not listed again, their known subdirectories are
+        still checked. In changed directories only new or modified files are parsed. A file edited
+        in place does not change its directory's mtime, use full=True to check every file.
+
+        Args:
+            roots (str or list): Data root directories.
+            full (bool): List every directory regardless of its mtime.
+
+        Returns:
+            dict: Number of directories listed and files added/updated/removed.
+        """
+        if isinstance(roots, (str, os.PathLike)):
+            roots = [roots]
+        stats = dict(directories=0, added=0, updated=0, removed=0)
+        with self.connection:
+            for root in roots:
+                self._scan_directory(os.path.abspath(root), None, full, stats)
+        return stats
+
+    def _scan_directory(self, path, parent, full, stats):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget_directory(path, stats)
+            return
+        row = self.connection.execute("SELECT mtime_ns FROM directories WHERE path = ?", (path,)).fetchone()
+
+        if row is not None and row[0] == mtime_ns and not full:
+            subdirectories = [sub for (sub,) in self.connection.execute(
+                "SELECT path FROM directories WHERE parent = ?", (path,))]
+        else:
+            stats["directories"] += 1
+            subdirectories = self._list_directory(path, stats)
+            self.connection.execute("INSERT OR REPLACE INTO directories (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                                    (path, parent, mtime_ns))
+        for subdirectory in subdirectories:
+            self._scan_directory(subdirectory, path, full, stats)
+
+    def _list_directory(self, path, stats):
+        known = {file_path: (size, mtime_ns) for file_path, size, mtime_ns in self.connection.execute(
+            "SELECT path, size, mtime_ns FROM files WHERE directory = ?", (path,))}
+        subdirectories = []
+        records = []
+        voltages = []
+        seen = set()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.name.startswith("."):
+                        subdirectories.append(entry.path)
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in EXTENSIONS:
+                    continue
+                seen.add(entry.path)
+                stat = entry.stat()
+                if known.get(entry.path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                stats["updated" if entry.path in known else "added"] += 1
+                record, file_voltages = _file_record(entry, path)
+                records.append(record)
+                voltages += file_voltages
+
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO files ({', '.join(_FILE_COLUMNS)}) VALUES ({', '.join('?' * len(_FILE_COLUMNS))})",
+            records)
+        self.connection.executemany("DELETE FROM voltages WHERE path = ?", [record[:1] for record in records])
+        self.connection.executemany("INSERT INTO voltages (path, voltage) VALUES (?, ?)", voltages)
+        removed = [(file_path,) for file_path in known if file_path not in seen]
+        self.connection.executemany("DELETE FROM files WHERE path = ?", removed)
+        self.connection.executemany("DELETE FROM voltages WHERE path = ?", removed)
+        stats["removed"] += len(removed)
+
+        # subdirectories that disappeared
+        for (old,) in self.connection.execute("SELECT path FROM directories WHERE parent = ?", (path,)).fetchall():
+            if old not in subdirectories:
+                self._forget_directory(old, stats)
+        return subdirectories
+
+    def _forget_directory(self, path, stats):
+        for (sub,) in self.connection.execute("SELECT path FROM directories WHERE parent = ?", (path,)).fetchall():
+            self._forget_directory(sub, stats)
+        self.connection.execute("DELETE FROM voltages WHERE path IN (SELECT path FROM files WHERE directory = ?)", (path,))
+        stats["removed"] += self.connection.execute("DELETE FROM files WHERE directory = ?", (path,)).rowcount
+        self.connection.execute("DELETE FROM directories WHERE path = ?", (path,))
+
+    def query(self, sensor_id=None, temperature=None, voltage=None, xray_current=None, kind=None, ext=None,
+              root=None, tolerance=1e-6, where=None, parameters=()):
+        """
+        Cataloged files matching all given conditions.
+
+        Args:
+            sensor_id (str): Sensor ID.
+            temperature (float): Temperature in C, matched within tolerance.
+            voltage (float): Voltage in V, matched within tolerance against the file name voltage and the
+                "Test Voltages" header.
+            xray_current (float): X-ray tube current in mA, matched within tolerance.
+            kind (str): One of KINDS or "analysis".
+            ext (str): File extension, e.g. ".csv".
+            root (str): Only files below this directory.
+            tolerance (float): Tolerance of the numeric conditions.
+            where (str): Additional SQL condition on the files table, e.g. "voltage < 0".
+            parameters (tuple): Parameters of where.
+
+        Returns:
+            pandas.DataFrame: One row per file, headers parsed to dicts, sorted by path.
+        """
+        conditions, values = [], []
+        for column, value in (("sensor_id", sensor_id), ("kind", kind), ("ext", ext)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value.lower() if column == "ext" else value)
+        for column, value in (("temperature", temperature), ("xray_current", xray_current)):
+            if value is not None:
+                conditions.append(f"{column} BETWEEN ? AND ?")
+                values += [value - tolerance, value + tolerance]
+        if voltage is not None:
+            conditions.append("path IN (SELECT path FROM voltages WHERE voltage BETWEEN ? AND ?)")
+            values += [voltage - tolerance, voltage + tolerance]
+        if root is not None:
+            root = os.path.abspath(root)
+            conditions.append("(directory = ? OR substr(directory, 1, ?) = ?)")
+            values += [root, len(root) + 1, os.path.join(root, "")]
+        if where is not None:
+            conditions.append(f"({where})")
+            values += list(parameters)
+
+        sql = "SELECT * FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        table = pd.read_sql_query(sql + " ORDER BY path", self.connection, params=values)
+        table["headers"] = [json.loads(value) if isinstance(value, str) else {} for value in table["headers"]]
+        return table
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    roots = sys.argv[1:] or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TEST_DATA")]
+    with RunCatalog() as catalog:
+        for attempt in ("scan", "rescan"):
+            start = time.perf_counter()
+            stats = catalog.scan(roots)
+            print(f"{attempt}: {stats} in {time.perf_counter() - start:.3f} s")
+        start = time.perf_counter()
+        table = catalog.query(ext=".csv")
+        print(f"{len(table)} csv files in {1e3 * (time.perf_counter() - start):.1f} ms")
@@ -0,0 +1,102 @@
+"""
+Stabilized IV statistics of I-t traces.
+
+After a voltage step the current needs a few seconds to settle; the stabilized current of a
+(sensor, temperature, voltage) combination is the statistics of the samples after settle_time.
+All combinations are computed in one groupby pass over typed columns instead of one boolean
+mask scan of the whole dataset per combination.
+
+    python stabilized_iv.py combined_all_dfs.csv -o Stabilized_IV_data.csv --settle-time 3.0
+
+    big_df = load_it_data("combined_all_dfs.csv")
+    new_df = stabilized_iv(big_df, settle_time=3.0)
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+TIME_COLUMN = "Time (s)"
+CURRENT_COLUMN = "Current (A)"
+VOLTAGE_COLUMN = "Voltage_str"
+TEMPERATURE_COLUMN = "Temperature_calibrated"
+
+# Group keys used when present, in output order
+OPTIONAL_KEYS = ("Sensor ID", "Temperature")
+
+
+def load_it_data(path, sensor_id=None):
+    """
+    Read a combined I-t CSV (as written by T-dependent_IV_analysis) with typed columns only.
+
+    Args:
+        path (str): combined_all_dfs.csv style file.
+        sensor_id (str): Sensor ID for all rows, when the file has no "Sensor ID" column.
+
+    Returns:
+        pandas.DataFrame: Time, current, voltage (float, NaN for e.g. "shutoff") and temperature columns.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [TIME_COLUMN, CURRENT_COLUMN, VOLTAGE_COLUMN, TEMPERATURE_COLUMN]
+    columns += [key for key in OPTIONAL_KEYS if key in header]
+    dtypes = {TIME_COLUMN: np.float64, CURRENT_COLUMN: np.float64, TEMPERATURE_COLUMN: np.float64,
+              VOLTAGE_COLUMN: str, "Sensor ID": str, "Temperature": np.float64}
+    df = pd.read_csv(path, usecols=columns, dtype={column: dtypes[column] for column in columns})
+    df[VOLTAGE_COLUMN] = pd.to_numeric(df[VOLTAGE_COLUMN], errors="coerce").astype(np.float64)
+    if sensor_id is not None and "Sensor ID" not in df:
+        df["Sensor ID"] = sensor_id
+    return df
+
+
+def stabilized_iv(df, settle_time=3.0):
+    """
+    Stabilized current statistics per (sensor, temperature, voltage).
+
+    Args:
+        df (pandas.DataFrame): I-t samples with "Time (s)", "Current (A)", "Voltage_str" and
+            "Temperature_calibrated" columns, optionally "Sensor ID" and "Temperature".
+        settle_time (float): Samples with time > settle_time are the settled window.
+
+    Returns:
+        pandas.DataFrame: One row per combination in order of appearance: the keys, abs_voltage,
+            average_current, inverted_current (see invert_current), std_current, count and
+            settle_start (first settled sample time).
+    """
+    keys = [key for key in OPTIONAL_KEYS if key in df] + [TEMPERATURE_COLUMN, VOLTAGE_COLUMN]
+    voltage = pd.to_numeric(df[VOLTAGE_COLUMN], errors="coerce").astype(np.float64)
+    settled = df.loc[(df[TIME_COLUMN] > settle_time).to_numpy() & voltage.notna().to_numpy(),
+                     keys[:-1] + [TIME_COLUMN, CURRENT_COLUMN]].assign(**{VOLTAGE_COLUMN: voltage})
+
+    stats = settled.groupby(keys, sort=False).agg(
+        average_current=(CURRENT_COLUMN, "mean"),
+        std_current=(CURRENT_COLUMN, "std"),
+        count=(CURRENT_COLUMN, "count"),
+        settle_start=(TIME_COLUMN, "min"),
+    ).reset_index()
+
+    # same convention as invert_current: negative after inversion is set to 1e-10
+    inverted = -stats["average_current"].to_numpy()
+    inverted[inverted < 0] = 1e-10
+    stats.insert(len(keys), "abs_voltage", stats[VOLTAGE_COLUMN].abs())
+    stats.insert(len(keys) + 2, "inverted_current", inverted)
+    return stats.rename(columns={VOLTAGE_COLUMN: "voltage"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stabilized IV statistics per sensor, temperature and voltage")
+    parser.add_argument("input", help="combined I-t CSV, e.g. combined_all_dfs.csv")
+    parser.add_argument("-o", "--output", default="Stabilized_IV_data.csv", help="output CSV")
+    parser.add_argument("--settle-time", type=float, default=3.0, help="start of the settled window in s")
+    parser.add_argument("--sensor-id", default=None, help="sensor ID when the input has no 'Sensor ID' column")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df = load_it_data(args.input, args.sensor_id)
+    stats = stabilized_iv(df, args.settle_time)
+    stats.to_csv(args.output, index=False)
+    print(f"{len(stats)} combinations from {len(df)} samples in {time.perf_counter() - start:.2f} s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
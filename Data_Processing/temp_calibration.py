@@ -0,0 +1,184 @@
+"""
+Temperature calibration: set point temperature (temp_1) to calibrated sample temperature (temp_2).
+
+The table (temp_calib.csv) is loaded once; whole arrays or DataFrame columns are mapped in one
+vectorized call, either piecewise linear (np.interp) or with a monotone cubic spline (PCHIP),
+which both reproduce the table exactly at its points. The inverse mapping (calibrated to set
+point) is built on first use and cached. Temperatures outside the table follow the extrapolation
+policy.
+
+    temp_calibration = TemperatureCalibration.from_csv("temp_calib.csv")
+    df["Temperature_calibrated"] = temp_calibration(df["Temperature"])
+    set_point = temp_calibration.inverse(25.0)
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ("linear", "pchip")
+
+# error: ValueError for temperatures outside the table, clip: hold the end values,
+# linear: extend the end segments, nan: NaN outside the table
+EXTRAPOLATION_POLICIES = ("error", "clip", "linear", "nan")
+
+
+def _pchip_slopes(x, y):
+    """Fritsch-Carlson slopes at the table points, keep the spline monotone between them."""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    slopes = np.zeros_like(y)
+    if len(x) == 2:
+        slopes[:] = delta[0]
+        return slopes
+
+    # interior: weighted harmonic mean where the secants have the same sign, else 0
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+    slopes[1:-1] = np.where(same_sign, harmonic, 0.0)
+
+    # ends: shape preserving three point estimates
+    for end, (h0, h1, d0, d1) in ((0, (h[0], h[1], delta[0], delta[1])), (-1, (h[-1], h[-2], delta[-1], delta[-2]))):
+        slope = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+        if np.sign(slope) != np.sign(d0):
+            slope = 0.0
+        elif np.sign(d0) != np.sign(d1) and abs(slope) > abs(3 * d0):
+            slope = 3 * d0
+        slopes[end] = slope
+    return slopes
+
+
+class TemperatureCalibration:
+    """
+    Vectorized mapping between two temperature scales from a calibration table.
+    """
+
+    def __init__(self, source, target, method="linear", extrapolation="error"):
+        """
+        Args:
+            source (array-like): Table temperatures to map from (e.g. temp_1, set point).
+            target (array-like): Corresponding temperatures to map to (e.g. temp_2, calibrated).
+            method (str): "linear" or "pchip" (monotone cubic spline).
+            extrapolation (str): One of EXTRAPOLATION_POLICIES.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method}, use one of {METHODS}")
+        if extrapolation not in EXTRAPOLATION_POLICIES:
+            raise ValueError(f"Unknown extrapolation {extrapolation}, use one of {EXTRAPOLATION_POLICIES}")
+        source = np.asarray(source, dtype=np.float64)
+        target = np.asarray(target, dtype=np.float64)
+        if source.shape != target.shape or source.ndim != 1 or len(source) < 2:
+            raise ValueError("Calibration table needs at least two (source, target) pairs")
+        order = np.argsort(source, kind="stable")
+        self.source = source[order]
+        self.target = target[order]
+        if np.any(np.diff(self.source) <= 0):
+            raise ValueError("Calibration table has duplicate source temperatures")
+        self.method = method
+        self.extrapolation = extrapolation
+        self._slopes = _pchip_slopes(self.source, self.target) if method == "pchip" else None
+        self._inverse = None
+
+    @classmethod
+    def from_csv(cls, path, source_column="temp_1", target_column="temp_2", **options):
+        """
+        Calibration from a CSV table such as temp_calib.csv.
+
+        Args:
+            path (str): CSV file.
+            source_column (str): Column to map from.
+            target_column (str): Column to map to.
+            **options: method and extrapolation.
+
+        Returns:
+            TemperatureCalibration: The calibration.
+        """
+        table = pd.read_csv(path)
+        return cls(table[source_column], table[target_column], **options)
+
+    @property
+    def range(self):
+        """(min, max) source temperature of the table"""
+        return float(self.source[0]), float(self.source[-1])
+
+    def __call__(self, temperature):
+        """
+        Map temperatures.
+
+        Args:
+            temperature (float, array-like or pandas.Series): Source temperatures.
+
+        Returns:
+            float, numpy.ndarray or pandas.Series: Target temperatures, same type as the input.
+        """
+        values = np.asarray(temperature, dtype=np.float64)
+        if self.method == "linear":
+            mapped = np.interp(values, self.source, self.target)
+        else:
+            mapped = self._pchip(values)
+
+        below = values < self.source[0]
+        above = values > self.source[-1]
+        if np.any(below) or np.any(above):
+            mapped = self._extrapolate(values, mapped, below, above)
+
+        if isinstance(temperature, pd.Series):
+            return pd.Series(mapped, index=temperature.index, name=temperature.name)
+        return float(mapped) if mapped.ndim == 0 else mapped
+
+    def _pchip(self, values):
+        x, y, slopes = self.source, self.target, self._slopes
+        index = np.clip(np.searchsorted(x, values, side="right") - 1, 0, len(x) - 2)
+        h = x[index + 1] - x[index]
+        t = (values - x[index]) / h
+        t2, t3 = t * t, t * t * t
+        return ((2 * t3 - 3 * t2 + 1) * y[index] + (t3 - 2 * t2 + t) * h * slopes[index] +
+                (-2 * t3 + 3 * t2) * y[index + 1] + (t3 - t2) * h * slopes[index + 1])
+
+    def _extrapolate(self, values, mapped, below, above):
+        if self.extrapolation == "error":
+            outside = np.unique(values[below | above])
+            raise ValueError(f"Temperatures {outside} outside the calibration range {self.range}")
+        mapped = np.array(mapped, dtype=np.float64)
+        if self.extrapolation == "clip":
+            mapped[below] = self.target[0]
+            mapped[above] = self.target[-1]
+        elif self.extrapolation == "nan":
+            mapped[below | above] = np.nan
+        else:
+            first_slope = (self.target[1] - self.target[0]) / (self.source[1] - self.source[0])
+            last_slope = (self.target[-1] - self.target[-2]) / (self.source[-1] - self.source[-2])
+            mapped[below] = self.target[0] + first_slope * (values[below] - self.source[0])
+            mapped[above] = self.target[-1] + last_slope * (values[above] - self.source[-1])
+        return mapped
+
+    @property
+    def inverse(self):
+        """
+        The inverse mapping (target to source), built on first use and cached.
+        It interpolates the swapped table: exact at the table points, for pchip between them
+        only close to the inverse of the forward spline. Requires a strictly monotone table.
+
+        Returns:
+            TemperatureCalibration: Calibration from target to source temperatures.
+        """
+        if self._inverse is None:
+            steps = np.diff(self.target)
+            if not (np.all(steps > 0) or np.all(steps < 0)):
+                raise ValueError("Calibration table is not strictly monotone, it has no inverse")
+            self._inverse = TemperatureCalibration(self.target, self.source, self.method, self.extrapolation)
+            self._inverse._inverse = self
+        return self._inverse
+
+
+if __name__ == "__main__":
+    import time
+
+    calibration = TemperatureCalibration(np.arange(10, 71, 10), [11.2, 20.4, 29.6, 38.9, 48.1, 57.2, 66.5])
+    values = np.random.default_rng(0).uniform(10, 70, 10_000_000)
+    start = time.perf_counter()
+    mapped = calibration(values)
+    print(f"{len(values)} temperatures in {time.perf_counter() - start:.3f} s")
+    assert calibration(30) == 29.6
+    assert np.allclose(calibration.inverse(mapped), values)
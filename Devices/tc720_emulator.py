@@ -0,0 +1,384 @@
+"""
+TC720 temperature controller emulator.
+
+Speaks the TC720 ASCII protocol (stx '*', 2 command characters, 4 hex data characters,
+2 hex checksum characters, '\\r') and answers with '*', 4 hex data characters, 2 hex
+checksum characters and '^', like the real controller. Behind the protocol sits the
+first-order plate model and PID output stage from tec_autotune, driven by the written
+set point, PID gains and heat/cool multipliers.
+
+Two transports are available:
+    LoopbackSerial  - a serial.Serial stand-in, pass it to TC720control(ser=...)
+    PtySerialPort   - a pseudo terminal (POSIX only), pass its .port to TC720control
+
+With a VirtualClock the emulator time only advances when the client sleeps or waits
+for a response, so hours of annealing run in seconds:
+
+    clock = VirtualClock()
+    TC = TC720control(None, ser=LoopbackSerial(TC720Emulator(clock=clock)))
+    with clock.patch(temperature_controller):
+        TC.set_temperature(75, wait_time=3600)
+
+The wait of set_temperature runs in utils.countdown_timer, so patch() always patches
+the utils module along with the given ones.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from Devices.tec_autotune import PlantModel, TC720Pid
+
+
+class VirtualClock:
+    """
+    Simulated time source. sleep() returns immediately and advances time().
+
+    Exposes the same time()/sleep()/monotonic()/perf_counter() functions as the time
+    module, and forwards anything else to it, so it can stand in for the module.
+    """
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self._now
+
+    monotonic = time
+    perf_counter = time
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        with self._lock:
+            self._now += max(0.0, seconds)
+
+    def advance_to(self, timestamp):
+        with self._lock:
+            self._now = max(self._now, timestamp)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+    @contextmanager
+    def patch(self, *modules):
+        """
+        Make the given modules use this clock instead of the time module.
+
+        Replaces a module level 'time' (import time) and 'sleep' (from time import sleep)
+        for the duration of the with block. The utils module (countdown_timer) is
+        patched too when it is loaded, and its keep-awake keystrokes and per second
+        countdown printing are silenced.
+        """
+        utils = sys.modules.get('utils')
+        if utils is not None and utils not in modules:
+            modules += (utils,)
+        saved = []
+        for module in modules:
+            if getattr(module, 'time', None) is time:
+                saved.append((module, 'time', time))
+                module.time = self
+            if getattr(module, 'sleep', None) is time.sleep:
+                saved.append((module, 'sleep', time.sleep))
+                module.sleep = self.sleep
+        if utils is not None:
+            for name, value in (('pyautogui', _NoKeystrokes()), ('print', _silent)):
+                saved.append((utils, name, utils.__dict__.get(name, _MISSING)))
+                setattr(utils, name, value)
+        try:
+            yield self
+        finally:
+            for module, name, value in saved:
+                if value is _MISSING:
+                    delattr(module, name)
+                else:
+                    setattr(module, name, value)
+
+
+_MISSING = object()
+
+
+def _silent(*args, **kwargs):
+    pass
+
+
+class _NoKeystrokes:
+    """pyautogui stand-in that types nothing"""
+
+    def __getattr__(self, name):
+        return _silent
+
+
+def _checksum(chars):
+    return f"{sum(ord(c) for c in chars) % 256:02x}"
+
+
+def _encode(value):
+    """Signed 16-bit value to 4 lowercase hex digits."""
+    return f"{int(value) & 0xffff:04x}"
+
+
+def _decode(digits):
+    value = int(digits, 16)
+    return value - 65536 if value > 32767 else value
+
+
+class TC720Emulator:
+    """
+    Protocol handler and thermal model of a TC720 with a TEC plate.
+
+    Args:
+        plant (PlantModel): Plate model. Defaults to a plate at 23 C ambient.
+        clock: Time source, the time module (default) or a VirtualClock.
+        start_temperature (float): Initial plate temperature. Defaults to ambient.
+        noise (float): Standard deviation (C) of the temperature readings.
+        step (float): Integration step of the thermal model in seconds.
+        seed: Random seed for the reading noise.
+    """
+
+    BAD_CHECKSUM = "*XXXX60^"
+
+    # command code -> (register, scale); written values are stored as value / scale
+    WRITE_COMMANDS = {
+        '1c': ('set_point', 100),
+        '1d': ('proportional_bandwidth', 100),
+        '1e': ('integral_gain', 100),
+        '1f': ('derivative_gain', 100),
+        '34': ('heat_multiplier', 100),
+        '33': ('cool_multiplier', 100),
+        '30': ('output_enable', 1),
+    }
+
+    def __init__(self, plant=None, clock=time, start_temperature=None, noise=0.0, step=0.5, seed=None):
+        self.plant = plant if plant is not None else PlantModel(k_heat=0.5, k_cool=0.3, tau=300.0,
+                                                                ambient=23.0, dead_time=4.0)
+        self.clock = clock
+        self.noise = noise
+        self.step = step
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.temperature = self.plant.ambient if start_temperature is None else start_temperature
+        self.set_point = 25.0
+        self.output_enable = 0
+        self.pid = TC720Pid(proportional_bandwidth=5.0, integral_gain=1.0, derivative_gain=0.0,
+                            heat_multiplier=1.0, cool_multiplier=1.0)
+        self.drive = 0.0
+        self._delayed_drives = deque([0.0] * (int(round(self.plant.dead_time / step)) + 1))
+        self._model_time = clock.time()
+        self.commands = []
+
+    # ----- thermal model -----
+
+    def advance(self):
+        """Integrate the thermal model up to the current clock time."""
+        with self._lock:
+            now = self.clock.time()
+            while self._model_time < now:
+                dt = min(self.step, now - self._model_time)
+                self.pid.proportional_bandwidth = max(self.pid.proportional_bandwidth, 0.01)
+                if self.output_enable:
+                    self.drive = self.pid.update(self.set_point, self.temperature, dt)
+                else:
+                    self.drive = 0.0
+                    self.pid.reset()
+                self._delayed_drives.append(self.drive)
+                self.temperature += self.plant.rate(self.temperature, self._delayed_drives.popleft()) * dt
+                self._model_time += dt
+
+    def read_temperature(self, sensor=1):
+        self.advance()
+        temperature = self.temperature if sensor == 1 else self.plant.ambient
+        if self.noise:
+            temperature += self._random.gauss(0.0, self.noise)
+        return temperature
+
+    # ----- protocol -----
+
+    def handle(self, command):
+        """
+        Process one command string (including stx and the trailing carriage return).
+
+        Returns:
+            str: The 8 character response.
+        """
+        command = command.strip('\r')
+        if len(command) != 9 or command[0] != '*' or _checksum(command[1:7]) != command[7:9].lower():
+            return self.BAD_CHECKSUM
+
+        code, data = command[1:3].lower(), command[3:7]
+        self.commands.append(code)
+        self.advance()
+
+        if code in self.WRITE_COMMANDS:
+            register, scale = self.WRITE_COMMANDS[code]
+            try:
+                value = _decode(data)
+            except ValueError:
+                return self.BAD_CHECKSUM
+            if register == 'output_enable':
+                self.output_enable = int(value != 0)
+            elif register == 'set_point':
+                self.set_point = value / scale
+            else:
+                setattr(self.pid, register, value / scale)
+            reply = data.lower()
+        elif code == '01':
+            reply = _encode(round(self.read_temperature(1) * 100))
+        elif code == '04':
+            reply = _encode(round(self.read_temperature(2) * 100))
+        elif code == '50':
+            reply = _encode(round(self.set_point * 100))
+        elif code == '64':
+            reply = _encode(self.output_enable)
+        else:
+            return self.BAD_CHECKSUM
+
+        return f"*{reply}{_checksum(reply)}^"
+
+
+class LoopbackSerial:
+    """
+    In-process serial port connected to a TC720Emulator.
+
+    Implements the subset of serial.Serial used by TC720control. Responses become
+    readable after the configured latency; with a VirtualClock a read waiting on a
+    response advances the clock instead of sleeping.
+
+    Args:
+        emulator (TC720Emulator): The emulated controller.
+        latency (float): Seconds between the end of a command and its response.
+        timeout (float): Read timeout in seconds, like serial.Serial.
+    """
+
+    def __init__(self, emulator, latency=0.01, timeout=1):
+        self.emulator = emulator
+        self.latency = latency
+        self.timeout = timeout
+        self.is_open = True
+        self._command = ""
+        self._pending = deque()  # (ready time, byte)
+
+    @property
+    def _clock(self):
+        return self.emulator.clock
+
+    def _wait_until(self, timestamp):
+        if isinstance(self._clock, VirtualClock):
+            self._clock.advance_to(timestamp)
+        else:
+            delay = timestamp - self._clock.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def write(self, data):
+        for char in data.decode('ascii'):
+            if char == '*':
+                self._command = ""
+            self._command += char
+            if char == '\r':
+                response = self.emulator.handle(self._command)
+                ready = self._clock.time() + self.latency
+                self._pending.extend((ready, bytes([b])) for b in response.encode('ascii'))
+                self._command = ""
+        return len(data)
+
+    def read(self, size=1):
+        data = b""
+        deadline = self._clock.time() + (self.timeout if self.timeout is not None else float('inf'))
+        while len(data) < size:
+            if not self._pending:
+                if self.timeout is not None:
+                    self._wait_until(deadline)
+                break
+            ready, byte = self._pending[0]
+            if ready > deadline:
+                self._wait_until(deadline)
+                break
+            self._wait_until(ready)
+            self._pending.popleft()
+            data += byte
+        return data
+
+    @property
+    def in_waiting(self):
+        now = self._clock.time()
+        return sum(1 for ready, _ in self._pending if ready <= now)
+
+    def reset_input_buffer(self):
+        self._pending.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySerialPort:
+    """
+    Pseudo terminal backed TC720 emulator (POSIX only).
+
+    A background thread answers commands on the master side of a pty. Open .port with
+    serial.Serial (or pass it as the COM port to TC720control) to talk to the emulator.
+    """
+
+    def __init__(self, emulator, latency=0.01):
+        import pty
+        import tty
+
+        self.emulator = emulator
+        self.latency = latency
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        command = ""
+        while self._running:
+            try:
+                chunk = os.read(self._master, 64).decode('ascii', errors='replace')
+            except OSError:
+                break
+            for char in chunk:
+                if char == '*':
+                    command = ""
+                command += char
+                if char == '\r':
+                    response = self.emulator.handle(command)
+                    time.sleep(self.latency)
+                    os.write(self._master, response.encode('ascii'))
+                    command = ""
+
+    def close(self):
+        self._running = False
+        os.close(self._slave)
+        os.close(self._master)
+
+
+if __name__ == "__main__":
+    from Devices import temperature_controller
+    from Devices.temperature_controller import TC720control
+
+    # Simulated 1 hour anneal at 75C followed by a return to 25C
+    clock = VirtualClock()
+    emulator = TC720Emulator(clock=clock, noise=0.02, seed=0)
+    TC = TC720control(None, ser=LoopbackSerial(emulator))
+
+    start, virtual_start = time.time(), clock.time()
+    with clock.patch(temperature_controller):
+        for set_point, minutes in [(75, 60), (25, 15)]:
+            TC.apply_gain_schedule(set_point)
+            TC.write_set_point(set_point)
+            if TC.read_output_enable() == 0:
+                TC.write_output_enable('1')
+            for minute in range(minutes):
+                clock.sleep(60)
+                print(f"{set_point}C set point, t = {minute + 1:3d} min: {TC.read_temp1():.2f}C")
+        TC.write_output_enable('0')
+    print(f"Simulated {(clock.time() - virtual_start) / 60:.0f} min in {time.time() - start:.1f} s")
@@ -0,0 +1,444 @@
+"""
+Gain scheduling and autotuning for the TC720 temperature controller.
+
+The heat/cool multipliers and PID gains of the TC720 are stored in a small CSV
+table (TC720_gain_schedule.csv) indexed by set point temperature. Each row holds the
+settings of the band starting at its temperature, up to the next row, so TC720control
+uses the last row at or below the set point.
+
+The autotune routine steps the plate through a range of set points, fits a
+first-order thermal model of the plate to the recorded response and then
+searches for the gains that settle fastest on that model without overshoot.
+"""
+import csv
+import os
+import time
+import warnings
+import numpy as np
+
+
+DEFAULT_SCHEDULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TC720_gain_schedule.csv")
+
+SCHEDULE_COLUMNS = [
+    "temperature",
+    "heat_multiplier",
+    "cool_multiplier",
+    "proportional_bandwidth",
+    "integral_gain",
+    "derivative_gain",
+]
+
+
+class GainSchedule:
+    """Heat/cool multiplier and PID gain table indexed by set point temperature."""
+
+    def __init__(self, table):
+        """
+        Args:
+            table (dict): Column name -> sequence of values. Must contain "temperature";
+                          empty (NaN) cells mean "leave the controller setting alone".
+        """
+        order = np.argsort(np.asarray(table["temperature"], dtype=float))
+        self.table = {
+            name: np.asarray(table[name], dtype=float)[order]
+            for name in SCHEDULE_COLUMNS if name in table
+        }
+
+    @classmethod
+    def load(cls, path=DEFAULT_SCHEDULE_PATH):
+        """Load a gain schedule from a CSV file."""
+        table = {}
+        with open(path, newline='') as file:
+            for row in csv.DictReader(file):
+                for name, value in row.items():
+                    table.setdefault(name, []).append(float(value) if value.strip() else np.nan)
+        return cls(table)
+
+    def save(self, path=DEFAULT_SCHEDULE_PATH):
+        """Write the gain schedule to a CSV file."""
+        columns = [name for name in SCHEDULE_COLUMNS if name in self.table]
+        with open(path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(columns)
+            for i in range(len(self.table["temperature"])):
+                values = [self.table[name][i] for name in columns]
+                writer.writerow(["" if np.isnan(v) else f"{v:g}" for v in values])
+
+    @property
+    def min_temperature(self):
+        return float(self.table["temperature"][0])
+
+    @property
+    def max_temperature(self):
+        return float(self.table["temperature"][-1])
+
+    def lookup(self, temperature):
+        """
+        Settings of the band containing the given set point.
+
+        A row applies from its temperature up to the next row; set points below the table use
+        the first row. Columns that are empty in that band fall back to the nearest filled row
+        below, and are left out of the result if there is none.
+
+        Returns:
+            dict: Setting name -> value, rounded to the 0.01 resolution of the TC720.
+        """
+        temperatures = self.table["temperature"]
+        gains = {}
+        for name, values in self.table.items():
+            if name == "temperature":
+                continue
+            valid = ~np.isnan(values)
+            if not valid.any():
+                continue
+            band = np.searchsorted(temperatures[valid], temperature, side="right") - 1
+            gains[name] = round(float(values[valid][max(band, 0)]), 2)
+        return gains
+
+
+class PlantModel:
+    """
+    First-order thermal model of the TEC plate.
+
+        dT/dt = k * drive - (T - ambient) / tau
+
+    where drive is the TEC output fraction (positive heats, negative cools) after
+    the heat/cool multiplier has been applied.
+    """
+
+    def __init__(self, k_heat, k_cool, tau, ambient, dead_time=0.0):
+        self.k_heat = k_heat
+        self.k_cool = k_cool
+        self.tau = tau
+        self.ambient = ambient
+        self.dead_time = dead_time
+
+    def rate(self, temperature, drive):
+        """Rate of change of the plate temperature in C/s."""
+        k = self.k_heat if drive >= 0 else self.k_cool
+        return k * drive - (temperature - self.ambient) / self.tau
+
+    def steady_state_drive(self, temperature):
+        """Drive fraction needed to hold the plate at the given temperature."""
+        offset = (temperature - self.ambient) / self.tau
+        k = self.k_heat if offset >= 0 else self.k_cool
+        return offset / k
+
+    def as_dict(self):
+        return {"k_heat": self.k_heat, "k_cool": self.k_cool, "tau": self.tau,
+                "ambient": self.ambient, "dead_time": self.dead_time}
+
+
+class TC720Pid:
+    """
+    Discrete model of the TC720 PID output stage.
+
+    The proportional bandwidth is in C (full output at an error of one bandwidth), the
+    integral gain in repeats/min and the derivative gain in minutes, as on the controller.
+    The output is clipped to [-cool_multiplier, heat_multiplier].
+    """
+
+    def __init__(self, proportional_bandwidth, integral_gain, derivative_gain, heat_multiplier, cool_multiplier):
+        self.proportional_bandwidth = proportional_bandwidth
+        self.integral_gain = integral_gain
+        self.derivative_gain = derivative_gain
+        self.heat_multiplier = heat_multiplier
+        self.cool_multiplier = cool_multiplier
+        self.reset()
+
+    def reset(self, integral=0.0):
+        """Clear the controller state. integral presets the integral term (output fraction)."""
+        self._integral = integral
+        self._last_error = None
+
+    def update(self, set_point, temperature, dt):
+        """Advance the controller by dt seconds and return the output drive fraction."""
+        error = set_point - temperature
+        derivative = 0.0 if self._last_error is None or dt <= 0 else (error - self._last_error) / dt
+        self._last_error = error
+
+        p_term = error / self.proportional_bandwidth
+        d_term = self.derivative_gain * 60.0 * derivative / self.proportional_bandwidth
+        output = p_term + self._integral + d_term
+        high, low = self.heat_multiplier, -self.cool_multiplier
+
+        # Conditional integration (anti-windup): only integrate while the output is not saturated
+        if low < output < high:
+            self._integral += self.integral_gain / 60.0 * p_term * dt
+            output = p_term + self._integral + d_term
+
+        return min(max(output, low), high)
+
+
+def simulate_step(plant, pid, start, set_point, duration, dt=0.5):
+    """
+    Simulate a closed loop set point step on the plant model.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Time (s) and plate temperature (C) arrays.
+    """
+    steps = int(duration / dt) + 1
+    delay = int(round(plant.dead_time / dt))
+    times = np.arange(steps) * dt
+    temperatures = np.empty(steps)
+    temperature = start
+    # Start from equilibrium at the initial temperature
+    hold = plant.steady_state_drive(start)
+    pid.reset(min(max(hold, -pid.cool_multiplier), pid.heat_multiplier))
+    drives = [pid._integral] * (delay + 1)
+    for i in range(steps):
+        temperatures[i] = temperature
+        drives.append(pid.update(set_point, temperature, dt))
+        temperature += plant.rate(temperature, drives.pop(0)) * dt
+    return times, temperatures
+
+
+def settle_metrics(times, temperatures, set_point, tolerance=0.1):
+    """
+    Settle time and overshoot of a step response.
+
+    Args:
+        tolerance (float): Half width (C) of the band around the set point that counts as settled.
+
+    Returns:
+        (float, float): Settle time in seconds (inf if never settled) and overshoot in C.
+    """
+    start = temperatures[0]
+    direction = 1.0 if set_point >= start else -1.0
+    overshoot = max(0.0, float(np.max(direction * (temperatures - set_point))))
+
+    outside = np.nonzero(np.abs(temperatures - set_point) > tolerance)[0]
+    if len(outside) == 0:
+        return 0.0, overshoot
+    if outside[-1] == len(times) - 1:
+        return np.inf, overshoot
+    return float(times[outside[-1] + 1]), overshoot
+
+
+def fit_plant(segments, ambient):
+    """
+    Fit the first-order plant model to recorded step responses.
+
+    Only samples recorded while the controller output was saturated should be passed in,
+    so that the drive is known. The rates are taken per segment and the fit solves
+
+        dT/dt = k_heat * max(drive, 0) + k_cool * min(drive, 0) - (T - ambient) / tau
+
+    in the least-squares sense over all segments. With full-scale drive the ambient
+    temperature cannot be separated from the TEC gains, so it has to be measured.
+
+    Args:
+        segments (list): (times, temperatures, drives) array triples, one per step.
+        ambient (float): Plate temperature in C with the TEC output off.
+
+    Returns:
+        PlantModel: The fitted model (dead time is not estimated here).
+    """
+    segments = [[np.asarray(a, dtype=float) for a in seg] for seg in segments if len(seg[0]) >= 3]
+    if not segments:
+        raise ValueError("No saturated samples to fit; record longer steps")
+    rates = np.concatenate([np.gradient(temps, times) for times, temps, _ in segments])
+    temperatures = np.concatenate([temps for _, temps, _ in segments])
+    drives = np.concatenate([drives for _, _, drives in segments])
+
+    design = np.column_stack([
+        np.clip(drives, 0, None),
+        np.clip(drives, None, 0),
+        -(temperatures - ambient),
+    ])
+    (k_heat, k_cool, inv_tau), *_ = np.linalg.lstsq(design, rates, rcond=None)
+    if inv_tau <= 0:
+        raise ValueError("Plant fit did not find a positive time constant; record longer steps")
+
+    # Without a heating (or cooling) step the corresponding gain is undetermined
+    if not (drives > 0).any():
+        k_heat = k_cool
+    if not (drives < 0).any():
+        k_cool = k_heat
+    return PlantModel(k_heat=float(k_heat), k_cool=float(k_cool), tau=float(1.0 / inv_tau), ambient=float(ambient))
+
+
+def estimate_dead_time(times, temperatures, noise=0.05):
+    """
+    Time between the start of a step and the first temperature change above the noise level.
+    """
+    moved = np.nonzero(np.abs(np.asarray(temperatures) - temperatures[0]) > 3 * noise)[0]
+    if len(moved) == 0:
+        return 0.0
+    return float(times[moved[0]] - times[0])
+
+
+def saturated_segment(times, temperatures, set_point, bandwidth, dead_time=0.0):
+    """
+    Cut out the part of a step response where the controller output is saturated.
+
+    That is the initial approach, from the end of the dead time until the plate first
+    enters the proportional band. Later samples are skipped, because with a narrow band
+    the output switches faster than the plate responds.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray): Times, temperatures and drives (+1 heating, -1 cooling).
+    """
+    error = set_point - np.asarray(temperatures)
+    inside = np.nonzero(np.abs(error) <= bandwidth)[0]
+    stop = inside[0] if len(inside) else len(error)
+    keep = np.arange(stop)
+    keep = keep[np.asarray(times)[keep] - times[0] >= dead_time]
+    return times[keep], temperatures[keep], np.sign(error[keep])
+
+
+def tune_set_point(plant, temperature, step=10.0, duty_targets=(0.3, 0.45, 0.6, 0.75, 0.9),
+                   min_multiplier=0.05, tolerance=0.1, max_overshoot=0.05, duration=900.0):
+    """
+    Pick the multiplier and PID gains for one set point from the plant model.
+
+    Candidate multipliers are scaled so that holding the set point needs one of
+    duty_targets of the available output. For each, the PI gains follow the SIMC rules
+    for a first-order plus dead time process and the closed loop time constant is swept.
+    The candidate with the fastest settling response (approaching from one step below
+    and one above) whose overshoot stays within max_overshoot wins.
+
+    Returns:
+        dict: One row of the gain schedule, plus the simulated "settle_time" in seconds
+              (inf, with a warning, if no candidate settles within duration).
+    """
+    hold = plant.steady_state_drive(temperature)
+    k = plant.k_heat if hold >= 0 else plant.k_cool
+    dead_time = max(plant.dead_time, 1.0)
+
+    best = None
+    for duty in duty_targets:
+        multiplier = float(np.clip(round(abs(hold) / duty, 2), min_multiplier, 1.0))
+
+        # Process gain from controller output fraction to temperature, at this multiplier
+        process_gain = k * multiplier * plant.tau
+
+        for tau_c in dead_time * np.geomspace(0.5, 20, 24):
+            controller_gain = plant.tau / (process_gain * (tau_c + dead_time))
+            integral_time = min(plant.tau, 4 * (tau_c + dead_time))
+            row = {
+                "temperature": temperature,
+                "heat_multiplier": multiplier,
+                "cool_multiplier": multiplier,
+                "proportional_bandwidth": round(float(min(1.0 / controller_gain, 655.0)), 2),
+                "integral_gain": round(float(min(60.0 / integral_time, 655.0)), 2),
+                "derivative_gain": 0.0,
+            }
+            pid = TC720Pid(row["proportional_bandwidth"], row["integral_gain"], row["derivative_gain"],
+                           row["heat_multiplier"], row["cool_multiplier"])
+
+            settle = 0.0
+            for start in (temperature - step, temperature + step):
+                times, temps = simulate_step(plant, pid, start, temperature, duration)
+                settle_time, overshoot = settle_metrics(times, temps, temperature, tolerance)
+                if overshoot > max_overshoot:
+                    settle = np.inf
+                    break
+                settle = max(settle, settle_time)
+
+            if best is None or settle < best[0]:
+                best = (settle, row)
+
+    settle, row = best
+    if np.isinf(settle):
+        warnings.warn(f"No gains settle within {duration:g} s at {temperature}C "
+                      f"(tolerance {tolerance}C, max overshoot {max_overshoot}C)")
+    row["settle_time"] = settle
+    return row
+
+
+def record_step_response(tc, set_point, duration, sample_interval=1.0):
+    """
+    Write a set point to the controller and log the plate temperature for a while.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Time since the step (s) and plate temperature (C).
+    """
+    tc.write_set_point(set_point)
+    if tc.read_output_enable() == 0:
+        tc.write_output_enable('1')
+
+    start_time = time.time()
+    times, temperatures = [], []
+    while time.time() - start_time < duration:
+        temperatures.append(tc.read_temp1())
+        times.append(time.time() - start_time)
+        time.sleep(sample_interval)
+    return np.array(times), np.array(temperatures)
+
+
+def autotune(tc, test_temperatures, schedule_temperatures=None, step_duration=600,
+             sample_interval=1.0, test_bandwidth=0.5, ambient=None,
+             save_path=DEFAULT_SCHEDULE_PATH, **tune_kwargs):
+    """
+    Identify the plate model and build an optimised gain schedule.
+
+    Start with the plate idle at room temperature (output off): its temperature is taken
+    as the ambient temperature of the model unless one is given.
+
+    The plate is stepped through test_temperatures with both multipliers at 1.0 and a
+    narrow proportional band, so that the output is saturated (known drive) for most of
+    each step. The plant is fitted to the saturated samples, and a schedule row is tuned
+    for each of schedule_temperatures. Rows that never settle on the model are left out.
+
+    Args:
+        tc (TC720control): Connected temperature controller.
+        test_temperatures (list): Set points to step through, in order.
+        schedule_temperatures (list): Rows of the resulting table. Defaults to test_temperatures.
+        step_duration (float): Seconds to record each step.
+        sample_interval (float): Seconds between temperature readings.
+        test_bandwidth (float): Proportional bandwidth (C) used while identifying the plant.
+        ambient (float): Ambient temperature in C. Defaults to the idle plate temperature.
+        save_path (str): Where to write the schedule. None to skip saving.
+        **tune_kwargs: Forwarded to tune_set_point.
+
+    Returns:
+        (GainSchedule, PlantModel): The tuned schedule and the fitted plant.
+    """
+    if ambient is None:
+        ambient = tc.read_temp1()
+    tc.write_heat_multiplier(1.0)
+    tc.write_cool_multiplier(1.0)
+    tc.write_proportional_bandwidth(test_bandwidth)
+    tc.write_integral_gain(0)
+    tc.write_derivative_gain(0)
+
+    segments, dead_times = [], []
+    for set_point in test_temperatures:
+        print(f"Autotune step to {set_point}C")
+        times, temps = record_step_response(tc, set_point, step_duration, sample_interval)
+        dead_time = estimate_dead_time(times, temps)
+        dead_times.append(dead_time)
+        segments.append(saturated_segment(times, temps, set_point, test_bandwidth, dead_time))
+
+    plant = fit_plant(segments, ambient)
+    plant.dead_time = float(np.median(dead_times))
+    print(f"Fitted plant: {plant.as_dict()}")
+
+    rows = []
+    for temperature in (schedule_temperatures or test_temperatures):
+        row = tune_set_point(plant, temperature, **tune_kwargs)
+        if np.isinf(row["settle_time"]):
+            # Leave the row out, the band below extends over it
+            print(f"{temperature}C: never settles on the fitted plant, row skipped")
+            continue
+        rows.append(row)
+        print(f"{row['temperature']}C: settle {row['settle_time']:.0f} s, "
+              f"multiplier {row['heat_multiplier']}, P {row['proportional_bandwidth']}, I {row['integral_gain']}")
+    if not rows:
+        raise ValueError("No schedule temperature settles on the fitted plant; check the plant fit")
+
+    schedule = GainSchedule({name: [row[name] for row in rows] for name in SCHEDULE_COLUMNS})
+    if save_path is not None:
+        schedule.save(save_path)
+        print(f"Gain schedule saved to {save_path}")
+    return schedule, plant
+
+
+if __name__ == "__main__":
+    from Devices.temperature_controller import TC720control
+
+    TC = TC720control("com6")
+    schedule, plant = autotune(TC, test_temperatures=[25, 40, 55, 70, 85, 70, 55, 40, 25, 15],
+                               schedule_temperatures=[10, 20, 30, 40, 50, 60, 70, 80, 90])
+    TC.write_output_enable('0')
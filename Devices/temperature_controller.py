@@ -5,13 +5,16 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils import countdown_timer
+from Devices.tec_autotune import GainSchedule, DEFAULT_SCHEDULE_PATH
 
 class TC720control:
 
     print("TC720control class initialized version 0.0.1")
 
-    def __init__(self, COMport):
-        self.ser = serial.Serial(COMport, 230400, timeout=1)
+    def __init__(self, COMport, gain_schedule_path=DEFAULT_SCHEDULE_PATH, ser=None):
+        # ser: an already open serial port object (e.g. the loopback port of Devices.tc720_emulator)
+        self.ser = ser if ser is not None else serial.Serial(COMport, 230400, timeout=1)
+        self.gain_schedule = GainSchedule.load(gain_schedule_path)
         
         # Command lists
         self.woec   =   ['*','3','0','0','0','0','0','0','0','\r']  # Write Output Enable Command
@@ -390,46 +393,42 @@ class TC720control:
         time.sleep(0.1)
         return
     
+    def apply_gain_schedule(self, temperature):
+        """Write the heat/cool multipliers and PID gains of the gain schedule band for a set point.
+
+        Settings that are empty in the schedule table are left unchanged on the controller.
+
+        Args:
+            temperature (float): Set point temperature in Celsius to look up
+        """
+        writers = {
+            'heat_multiplier': self.write_heat_multiplier,
+            'cool_multiplier': self.write_cool_multiplier,
+            'proportional_bandwidth': self.write_proportional_bandwidth,
+            'integral_gain': self.write_integral_gain,
+            'derivative_gain': self.write_derivative_gain,
+        }
+        gains = self.gain_schedule.lookup(temperature)
+        for name, value in gains.items():
+            writers[name](value)
+        return gains
+
     def set_temperature(self, temperature, wait_time=180):
         """Set temperature setpoint and wait for stabilization.
 
         Sets the temperature controller setpoint and automatically configures appropriate 
-        heat/cool multipliers based on the target temperature. Enables output if not already
-        enabled and waits for temperature to stabilize.
+        heat/cool multipliers (and PID gains) from the gain schedule band of the target
+        temperature. Enables output if not already enabled and waits for temperature to stabilize.
 
         Args:
             temperature (float): Target temperature setpoint in Celsius
             wait_time (int, optional): Time in seconds to wait for temperature stabilization. 
                                      Defaults to 180 seconds.
         """
-        if 10 <= temperature < 20:
-            heat_multiplier = 0.75
-            cool_multiplier = 0.75
-
-        elif 20 <= temperature < 30:
-            heat_multiplier = 0.10
-            cool_multiplier = 0.10
-
-        elif 30 <= temperature < 40:
-            heat_multiplier = 0.15
-            cool_multiplier = 0.15
-
-        elif 40 <= temperature < 50:
-            heat_multiplier = 0.30
-            cool_multiplier = 0.30
-
-        elif 50 <= temperature < 60:
-            heat_multiplier = 0.75
-            cool_multiplier = 0.75
-
-        elif temperature >= 60:
-            heat_multiplier = 1.00
-            cool_multiplier = 1.00
-        else:
+        if temperature < self.gain_schedule.min_temperature:
             print("Don't be so cold... You'll get condensation")
 
-        self.write_heat_multiplier(heat_multiplier)
-        self.write_cool_multiplier(cool_multiplier)
+        self.apply_gain_schedule(temperature)
         self.write_set_point(temperature)
 
         if self.read_output_enable() == 0:
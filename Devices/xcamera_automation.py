@@ -0,0 +1,133 @@
+"""
+Direct Xeneth SDK capture backend with the CameraAutomation interface.
+
+XCameraAutomation grabs frames through xenics.xeneth.XCamera instead of scripting the
+Xeneth GUI with pyautogui, and writes the PNG files on a background thread pool so the
+measurement loop only waits for the frame itself. The save_image_png* methods keep the
+CameraAutomation call signature: save_path is remembered between calls (like the Xeneth
+save dialog) and '.png' is appended when the file name has no extension.
+
+    camera = XCameraAutomation()          # instead of CameraAutomation()
+    camera.save_image_png_typewrite(file_name="calib_parallel_off.png", save_path=str(save_path))
+    ...
+    camera.close()                        # waits for pending writes
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from loguru import logger
+from PIL import Image
+
+from xenics.xeneth import XCamera
+from xenics.xeneth.capi.enums import XFrameType, XGetFrameFlags
+from xenics.xeneth.xaccumulator import XFrameAccumulator
+
+
+class XCameraAutomation:
+    def __init__(self, url="cam://0", frame_type=XFrameType.FT_NATIVE, writer_threads=2, frame_timeout=5.0):
+        """
+        Args:
+            url (str): Xeneth camera URL, see xenics.xeneth.enumerate_devices.
+            frame_type (XFrameType): Frame type to grab. FT_NATIVE keeps the camera's own pixel format.
+            writer_threads (int): Number of threads writing PNG files.
+            frame_timeout (float): Seconds to wait for a frame before giving up.
+        """
+        logger.info(f"Initializing XCameraAutomation on {url}")
+        self.camera = XCamera()
+        if not self.camera.open(url):
+            raise ConnectionError(f"Could not open Xeneth camera at {url}")
+
+        self.buffer = self.camera.create_buffer(frame_type)
+        self.frame_timeout = frame_timeout
+        self.save_path = None
+        self._writer = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="png_writer")
+        self._pending = []
+
+        self.camera.start_capture()
+        logger.success(f"Capturing {self.buffer.width}x{self.buffer.height} frames from {self.camera.name}")
+
+    def grab_frame(self):
+        """
+        Grab the next frame from the camera.
+
+        Returns:
+            numpy.ndarray: A copy of the image data (without footer).
+        """
+        deadline = time.time() + self.frame_timeout
+        while not self.camera.get_frame(self.buffer, flags=XGetFrameFlags.XGF_Blocking):
+            if time.time() > deadline:
+                raise TimeoutError(f"No frame received within {self.frame_timeout} s")
+        return np.array(self.buffer.image_data, copy=True)
+
+    def grab_average(self, frames=None, window=None):
+        """
+        Average consecutive frames without storing them.
+
+        Args:
+            frames (int): Number of frames to average.
+            window (float): Or: seconds to average over.
+
+        Returns:
+            XAccumulatedFrame: float64 mean and variance frames and the frame count.
+        """
+        accumulator = XFrameAccumulator(self.buffer.image_data.shape, frames=frames, window=window)
+        while not accumulator.add(self.grab_frame()):
+            pass
+        result = accumulator.result()
+        logger.info(f"Averaged {result.count} frames")
+        return result
+
+    def save_image_png(self, file_name, save_path=None):
+        logger.info(f"Saving image as PNG - Filename: {file_name}, Path: {save_path}")
+
+        if save_path is not None:
+            self.save_path = save_path
+        if not os.path.splitext(file_name)[1]:
+            file_name += ".png"
+        file_path = os.path.join(self.save_path, file_name) if self.save_path else file_name
+
+        frame = self.grab_frame()
+        self._pending = [future for future in self._pending if not future.done() or future.exception()]
+        self._pending.append(self._writer.submit(_write_png, file_path, frame))
+        logger.success(f"Image captured, writing as {file_name}")
+        return frame
+
+    # The GUI backend has two ways of typing the path; here both are the same call
+    save_image_png_typewrite = save_image_png
+
+    def wait_for_writes(self):
+        """Block until all queued PNG files are written. Re-raises the first write error."""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        """Wait for pending writes, stop capturing and close the camera."""
+        try:
+            self.wait_for_writes()
+        finally:
+            self._writer.shutdown(wait=True)
+            if self.camera.is_capturing:
+                self.camera.stop_capture()
+            self.camera.close()
+            logger.info("XCameraAutomation closed")
+
+
+def _write_png(file_path, frame):
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    Image.fromarray(frame).save(file_path)
+    return file_path
+
+
+if __name__ == "__main__":
+    cam = XCameraAutomation()
+    save_path = r"C:\Code\Pockels-Gen2-Control\CAMERA_IMAGES\Test_xcamera"
+    start = time.time()
+    for i in range(10):
+        cam.save_image_png_typewrite(file_name=f"test{i}.png", save_path=save_path if i == 0 else None)
+    print(f"10 frames captured in {time.time() - start:.2f} s")
+    cam.close()
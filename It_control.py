@@ -4,19 +4,24 @@ from Devices.thorlabs_rotation_mount import RotationMount
 from Devices.camera_automation import CameraAutomation
 from Devices.LED_control import LEDController
 from utils import countdown_timer
+from calibration_cache import CalibrationCache, CalibrationConditions, CalibrationPolicy, FRAME_NAMES
 import os
 
 class PockelsProcedure():
-        
-    def __init__(self):
+    # the mount keeps its home reference while powered, home once per session
+    _mount_homed = False
+
+    def __init__(self, calibration_policy=CalibrationPolicy(), calibration_cache=None):
         super().__init__()
+        self.calibration_policy = calibration_policy
+        self.calibration_cache = calibration_cache if calibration_cache is not None else CalibrationCache()
         adapter = VISAAdapter("USB0::0x05E6::0x2470::04625649::INSTR")
         self.keithley = Keithley2470(adapter)
         self.rotation_mount = RotationMount("27267316")
         self.led = LEDController()
         self.camera = CameraAutomation()
 
-    def startup(self, sensor_id, temperature, cross_angle, parallel_angle, led_current, save_path):
+    def startup(self, sensor_id, temperature, cross_angle, parallel_angle, led_current, save_path, recalibrate=False):
         # Keithley-specific startup code
         self.keithley.reset()
         self.keithley.use_rear_terminals()
@@ -29,30 +34,43 @@ class PockelsProcedure():
 
         # Rotation mount-specific startup code
         self.rotation_mount.open_device()
-        self.rotation_mount.home_device()
+        if not PockelsProcedure._mount_homed:
+            self.rotation_mount.home_device()
+            PockelsProcedure._mount_homed = True
         self.rotation_mount.setup_conversion()
-        self.rotation_mount.move_to_position(parallel_angle)
 
         # LED-specific startup code
         self.led.set_current(led_current)
-        self.led.turn_off()
 
         save_path = os.path.join(save_path, "CAMERA_IMAGES")
         if not os.path.exists(save_path):
             os.makedirs(save_path)
+        png_paths = {name: os.path.join(save_path, f"{sensor_id}_{temperature}C_{name}.png") for name in FRAME_NAMES}
 
+        conditions = CalibrationConditions(sensor_id, temperature, led_current, cross_angle, parallel_angle)
+        calibration = None if recalibrate else self.calibration_cache.lookup(conditions, self.calibration_policy)
+        if calibration is not None:
+            # same end state as after a capture: LED on, crossed polarizers
+            self.calibration_cache.restore_pngs(calibration, png_paths)
+            self.led.turn_on()
+            self.rotation_mount.move_to_position(cross_angle)
+            return calibration
+
+        self.led.turn_off()
         self.rotation_mount.move_to_position(parallel_angle)
-        self.camera.save_image_png(file_name=f"{sensor_id}_{temperature}C_calib_parallel_off.png", save_path=save_path)
+        self.camera.save_image_png(file_name=os.path.basename(png_paths["calib_parallel_off"]), save_path=save_path)
         countdown_timer(3)
 
         self.led.turn_on()
-        self.camera.save_image_png(file_name=f"{sensor_id}_{temperature}C_calib_parallel_on.png", save_path=save_path)
+        self.camera.save_image_png(file_name=os.path.basename(png_paths["calib_parallel_on"]), save_path=save_path)
         countdown_timer(3)
 
         self.rotation_mount.move_to_position(cross_angle)
-        self.camera.save_image_png(file_name=f"{sensor_id}_{temperature}C_calib_cross_on.png", save_path=save_path)
+        self.camera.save_image_png(file_name=os.path.basename(png_paths["calib_cross_on"]), save_path=save_path)
         countdown_timer(3)
 
+        return self.calibration_cache.store_pngs(conditions, png_paths)
+
     def execute_ramp_capture(self, save_path, timestamp, sensor_id, temperature, voltages, current_range, nplc, samples):
 
         save_path = os.path.join(save_path, "CAMERA_IMAGES")
@@ -0,0 +1,250 @@
+"""
+Cache of the Pockels calibration frames (parallel off, parallel on, cross on).
+
+Every set is stored with the conditions it was captured under (sensor, temperature,
+LED current, angles, time) next to the derived arrays: the cropped float32 denominator
+(parallel_on - parallel_off) and the dead pixel mask. Acquisition asks lookup() whether
+the cached set is still valid under a CalibrationPolicy and skips the rehoming and
+recapture when it is; analysis loads the arrays as memmaps without touching the PNGs.
+
+    cache = CalibrationCache()
+    calibration = cache.lookup(conditions, CalibrationPolicy(max_age_s=8 * 3600))
+    if calibration is None:
+        ...capture the three PNGs...
+        calibration = cache.store_pngs(conditions, png_paths)
+"""
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from PIL import Image
+
+
+# Override with the CALIBRATION_CACHE environment variable
+DEFAULT_CACHE_DIR = Path(os.environ.get("CALIBRATION_CACHE", Path.home() / ".pockels" / "calibration_cache"))
+
+FRAME_NAMES = ("calib_parallel_off", "calib_parallel_on", "calib_cross_on")
+
+# png_analysis crop of the sensor area, (x, y, width, height)
+DEFAULT_ROI = (5, 190, 630, 130)
+
+
+class CalibrationConditions(NamedTuple):
+    """Conditions a calibration set was (or is to be) captured under"""
+    sensor_id: str
+    temperature: float
+    led_current: float
+    cross_angle: float
+    parallel_angle: float
+    captured: float = 0.0           # time.time() of the capture, 0 for requested conditions
+
+    def key(self):
+        """Cache directory name"""
+        return f"{self.sensor_id}_{self.temperature:g}C"
+
+
+class CalibrationPolicy(NamedTuple):
+    """When a cached calibration may be reused instead of recaptured"""
+    max_age_s: float = 12 * 3600
+    temperature_tolerance: float = 0.5
+    led_current_tolerance: float = 0.0
+    angle_tolerance: float = 0.05
+
+    def check(self, cached: CalibrationConditions, requested: CalibrationConditions, now=None) -> Tuple[bool, str]:
+        """
+        Whether cached conditions satisfy the requested ones.
+
+        Args:
+            cached (CalibrationConditions): Conditions of the stored set.
+            requested (CalibrationConditions): Conditions of the measurement.
+            now (float): Current time.time(), for tests.
+
+        Returns:
+            tuple: (valid, reason), reason explains a rejection.
+        """
+        now = time.time() if now is None else now
+        if cached.sensor_id != requested.sensor_id:
+            return False, f"sensor {cached.sensor_id} != {requested.sensor_id}"
+        age = now - cached.captured
+        if age > self.max_age_s:
+            return False, f"captured {age / 60:.0f} min ago"
+        if abs(cached.temperature - requested.temperature) > self.temperature_tolerance:
+            return False, f"temperature {cached.temperature} != {requested.temperature}"
+        if abs(cached.led_current - requested.led_current) > self.led_current_tolerance:
+            return False, f"LED current {cached.led_current} != {requested.led_current}"
+        if (abs(cached.cross_angle - requested.cross_angle) > self.angle_tolerance or
+                abs(cached.parallel_angle - requested.parallel_angle) > self.angle_tolerance):
+            return False, "angles changed"
+        return True, "valid"
+
+
+class CalibrationSet(NamedTuple):
+    """Stored calibration, arrays are cropped to roi and memory mapped"""
+    conditions: CalibrationConditions
+    roi: Tuple[int, int, int, int]
+    parallel_off: np.ndarray
+    parallel_on: np.ndarray
+    cross_on: np.ndarray
+    denominator: np.ndarray         # float32 parallel_on - parallel_off
+    dead_mask: np.ndarray           # bool, parallel_on below the dead pixel threshold
+    directory: Path
+
+    def png_path(self, name):
+        """Path of the original PNG of one of FRAME_NAMES"""
+        return self.directory / f"{name}.png"
+
+
+def _crop(image, roi):
+    x, y, width, height = roi
+    return image[y:y + height, x:x + width]
+
+
+class CalibrationCache:
+    """
+    Calibration sets on disk, one directory per sensor and temperature:
+    the original PNGs, the cropped frames and derived arrays as .npy and conditions.json.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        """
+        Args:
+            directory (str or Path): Cache directory.
+        """
+        self.directory = Path(directory)
+
+    def path(self, sensor_id, temperature):
+        return self.directory / CalibrationConditions(sensor_id, temperature, 0, 0, 0).key()
+
+    def load(self, sensor_id, temperature) -> Optional[CalibrationSet]:
+        """
+        The stored set of a sensor and temperature, regardless of its age. None if there is none.
+
+        Args:
+            sensor_id (str): Sensor id.
+            temperature (float): Set point temperature in C.
+
+        Returns:
+            CalibrationSet: The set with memory mapped arrays.
+        """
+        directory = self.path(sensor_id, temperature)
+        info_path = directory / "conditions.json"
+        if not info_path.exists():
+            return None
+        with open(info_path) as f:
+            info = json.load(f)
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r")
+                  for name in ("parallel_off", "parallel_on", "cross_on", "denominator", "dead_mask")}
+        return CalibrationSet(CalibrationConditions(**info["conditions"]), tuple(info["roi"]),
+                              directory=directory, **arrays)
+
+    def lookup(self, conditions: CalibrationConditions, policy: CalibrationPolicy = CalibrationPolicy()) -> Optional[CalibrationSet]:
+        """
+        The stored set if it is valid for conditions under policy, otherwise None.
+
+        Args:
+            conditions (CalibrationConditions): Requested conditions.
+            policy (CalibrationPolicy): Reuse policy.
+
+        Returns:
+            CalibrationSet: The valid set or None.
+        """
+        calibration = self.load(conditions.sensor_id, conditions.temperature)
+        if calibration is None:
+            logger.info(f"No cached calibration for {conditions.key()}")
+            return None
+        valid, reason = policy.check(calibration.conditions, conditions)
+        if not valid:
+            logger.info(f"Cached calibration for {conditions.key()} is outdated: {reason}")
+            return None
+        logger.success(f"Using cached calibration for {conditions.key()}")
+        return calibration
+
+    def store(self, conditions: CalibrationConditions, parallel_off, parallel_on, cross_on,
+              roi=DEFAULT_ROI, dead_pixel_threshold=100, png_paths=None) -> CalibrationSet:
+        """
+        Store full frame calibration images and their derived arrays.
+
+        conditions.json is removed first and written last, so an interrupted store leaves
+        an incomplete set that load ignores, never arrays and PNGs of two different captures.
+
+        Args:
+            conditions (CalibrationConditions): Capture conditions, captured is set to now if 0.
+            parallel_off (numpy.ndarray): Parallel polarizers, LED off.
+            parallel_on (numpy.ndarray): Parallel polarizers, LED on.
+            cross_on (numpy.ndarray): Crossed polarizers, LED on.
+            roi (tuple): (x, y, width, height) crop of the stored arrays, None keeps the full frames.
+            dead_pixel_threshold (float): Pixels of parallel_on below this are dead, as png_analysis.find_dead_pixels.
+            png_paths (dict): Original PNG for each of FRAME_NAMES, copied into the set.
+
+        Returns:
+            CalibrationSet: The stored set.
+        """
+        if not conditions.captured:
+            conditions = conditions._replace(captured=time.time())
+        frames = [np.asarray(frame) for frame in (parallel_off, parallel_on, cross_on)]
+        if frames[0].ndim == 3:
+            # RGB(A) PNG exports, as plot_image_colormap
+            frames = [frame[..., :3].mean(axis=2) for frame in frames]
+        if roi is None:
+            roi = (0, 0, frames[0].shape[1], frames[0].shape[0])
+        parallel_off, parallel_on, cross_on = (_crop(frame, roi) for frame in frames)
+
+        arrays = {
+            "parallel_off": parallel_off,
+            "parallel_on": parallel_on,
+            "cross_on": cross_on,
+            "denominator": parallel_on.astype(np.float32) - parallel_off.astype(np.float32),
+            # the three frames are different illuminations, not repeats, so there is no temporal
+            # statistic to test; a pixel dark under full transmission is dead
+            "dead_mask": parallel_on < dead_pixel_threshold,
+        }
+        directory = self.path(conditions.sensor_id, conditions.temperature)
+        directory.mkdir(parents=True, exist_ok=True)
+        # a set without conditions.json is incomplete and ignored by load
+        (directory / "conditions.json").unlink(missing_ok=True)
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+        if png_paths is not None:
+            for name in FRAME_NAMES:
+                shutil.copyfile(png_paths[name], directory / f"{name}.png")
+        with open(directory / "conditions.json.tmp", "w") as f:
+            json.dump({"conditions": conditions._asdict(), "roi": list(roi)}, f, indent=4)
+        os.replace(directory / "conditions.json.tmp", directory / "conditions.json")
+        logger.info(f"Stored calibration {conditions.key()} in {directory}")
+        return self.load(conditions.sensor_id, conditions.temperature)
+
+    def store_pngs(self, conditions: CalibrationConditions, png_paths, **store_options) -> Optional[CalibrationSet]:
+        """
+        Store a set from the captured PNGs, which are copied into the cache.
+
+        Args:
+            conditions (CalibrationConditions): Capture conditions.
+            png_paths (dict): Path of the PNG for each of FRAME_NAMES.
+            **store_options: Passed to store.
+
+        Returns:
+            CalibrationSet: The stored set, None if a PNG is missing (e.g. the camera software did not save it).
+        """
+        missing = [str(png_paths[name]) for name in FRAME_NAMES if not os.path.exists(png_paths[name])]
+        if missing:
+            logger.warning(f"Calibration not cached, missing images: {missing}")
+            return None
+        frames = [np.array(Image.open(png_paths[name])) for name in FRAME_NAMES]
+        return self.store(conditions, *frames, png_paths=png_paths, **store_options)
+
+    def restore_pngs(self, calibration: CalibrationSet, png_paths):
+        """
+        Copy the cached PNGs to where a fresh capture would have saved them, for the analysis scripts.
+
+        Args:
+            calibration (CalibrationSet): The cached set.
+            png_paths (dict): Target path for each of FRAME_NAMES.
+        """
+        for name in FRAME_NAMES:
+            if os.path.abspath(calibration.png_path(name)) != os.path.abspath(png_paths[name]):
+                shutil.copyfile(calibration.png_path(name), png_paths[name])
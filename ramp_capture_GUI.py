@@ -63,35 +63,10 @@ def run_experiment(sensor_id, temperatures, voltages, current_range, nplc, sampl
             "LED Current": led_current,
             }
 
-        if 10 <= set_point < 20:
-            heat_multiplier = 0.75
-            cool_multiplier = 0.75
-
-        elif 20 <= set_point < 30:
-            heat_multiplier = 0.10
-            cool_multiplier = 0.10
-
-        elif 30 <= set_point < 40:
-            heat_multiplier = 0.15
-            cool_multiplier = 0.15
-
-        elif 40 <= set_point < 50:
-            heat_multiplier = 0.30
-            cool_multiplier = 0.30
-
-        elif 50 <= set_point < 60:
-            heat_multiplier = 0.75
-            cool_multiplier = 0.75
-
-        elif set_point >= 60:
-            heat_multiplier = 1.00
-            cool_multiplier = 1.00
-
-        else:
+        if set_point < temp_ctrl.gain_schedule.min_temperature:
             print("Don't be so cold... You'll get condensation")
 
-        temp_ctrl.write_heat_multiplier(heat_multiplier)
-        temp_ctrl.write_cool_multiplier(cool_multiplier)
+        temp_ctrl.apply_gain_schedule(set_point)
         temp_ctrl.write_set_point(set_point)
 
         if temp_ctrl.read_output_enable() == 0:
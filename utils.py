@@ -1,10 +1,17 @@
 from loguru import logger
-import pyautogui
 import time
 import numpy as np
 
+try:
+    import pyautogui
+except Exception:
+    # not installed, or no display to connect to (headless CI); the keep-awake keystrokes are skipped
+    pyautogui = None
+
 
 def dont_sleep():
+    if pyautogui is None:
+        return
     pyautogui.press("win")
     pyautogui.typewrite("Don't Sleep!", interval=0.05)
     pyautogui.press("esc")
@@ -22,9 +29,7 @@ def countdown_timer(seconds, action_interval=300):
             minutes = seconds // 60
             # seconds_remaining = seconds % 60
             print(f"{minutes} minutes remaining")
-            pyautogui.press("win")
-            pyautogui.typewrite("Don't Sleep!", interval=0.05)
-            pyautogui.press("esc")
+            dont_sleep()
 
 def voltages_log_space(start_voltage:int, 
                        stop_voltage:int, 
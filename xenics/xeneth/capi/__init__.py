@@ -1,7 +1,12 @@
 """
 capi.py: This file contains the C API for xeneth.dll.
+
+The backend is selected with the XENETH_BACKEND environment variable:
+    dll         xeneth.dll / xeneth64.dll (default on Windows)
+    simulated   pure Python simulated cameras, see simulated.py (default elsewhere)
 """
 
+import os
 from sys import platform
 import ctypes
 import ctypes.util
@@ -10,9 +15,11 @@ import ctypes.util
 # pylint: disable=protected-access,broad-exception-raised,global-statement,invalid-name
 
 xenethdll = None
-if platform != 'win32':
-    raise SystemError("This module currently only works on the Windows platform")
-
+backend = os.environ.get('XENETH_BACKEND', 'dll' if platform == 'win32' else 'simulated').lower()
+if backend not in ('dll', 'simulated'):
+    raise SystemError(f"Unknown XENETH_BACKEND '{backend}', use 'dll' or 'simulated'")
+if backend == 'dll' and platform != 'win32':
+    raise SystemError("The dll backend currently only works on the Windows platform, use XENETH_BACKEND=simulated")
 
 
 def _load_library():
@@ -55,4 +62,14 @@ def _load_library():
     # inject '_path' attribute to xenethdll
     xenethdll._path = ctypes.util.find_library(xenethdll._name)
 
-_load_library()
+
+def _load_simulated():
+    global xenethdll
+    from xenics.xeneth.capi.simulated import SimulatedLibrary
+    xenethdll = SimulatedLibrary()
+
+
+if backend == 'simulated':
+    _load_simulated()
+else:
+    _load_library()
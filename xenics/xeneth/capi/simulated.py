@@ -0,0 +1,732 @@
+"""
+simulated.py
+
+Pure Python stand-in for xeneth.dll.
+
+SimulatedLibrary exposes the C API functions used by functions.py with the same call
+conventions (ctypes byref out-parameters, string buffers, raw frame pointers), backed by
+simulated cameras producing synthetic frames:
+
+    - configurable size, bit depth and frame rate
+    - a Pockels-like pattern: a sample band whose crossed-polarizer transmission
+      sin^2(pi/2 * E/E_pi) follows the bias (the 'SimulatedBias' property) with a
+      space-charge tilted field profile
+    - gaussian read noise and a fixed set of dead (zero) and hot (saturated) pixels
+    - per frame footers (XPFF_GENERIC with an ONCA F040 hardware footer)
+    - a readout window (OffsetX, OffsetY, Width, Height properties)
+
+Camera parameters are given in the URL query, e.g.
+
+    cam.open("sim://0?width=320&height=256&bits=14&fps=50&noise=4&dead=0.001&seed=1")
+
+Any other URL opens a camera with the default parameters, so code written for "cam://0"
+runs unchanged. Select this backend with XENETH_BACKEND=simulated (the default on
+platforms other than Windows).
+"""
+
+import ctypes
+import json
+import math
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+
+from xenics.xeneth.capi.enums import XFrameType, XGetFrameFlags, XPropType
+from xenics.xeneth.capi.errors import XErrorCodes
+from xenics.xeneth.capi.structs import XPFF, XPFF_F040, XPFF_GENERIC
+
+# pylint: disable=invalid-name,protected-access
+
+__all__ = ['SimulatedLibrary', 'SimulatedCamera', 'DEFAULT_PARAMETERS']
+
+DEFAULT_PARAMETERS = {
+    'width': 640,
+    'height': 512,
+    'bits': 14,
+    'fps': 50.0,
+    'noise': 8.0,           # read noise, ADU rms
+    'dead': 0.0005,         # fraction of dead pixels (half of them stuck at 0, half saturated)
+    'offset': 1200.0,       # dark level, ADU
+    'signal': 6000.0,       # full transmission level of the sample band, ADU
+    'v_pi': 1500.0,         # half wave voltage, V
+    'space_charge': 0.6,    # field tilt across the sample band (0 = uniform field)
+    'seed': 0,
+    'serial': '51A0001',    # SerialNumber property
+}
+
+_FOOTER_PID = 0xF040
+_FRAME_TIMEOUT = 5.0
+_WINDOW_PROPERTIES = ('OffsetX', 'OffsetY', 'Width', 'Height')
+
+
+def _value(arg):
+    """Python value of a ctypes scalar or plain argument."""
+    return arg.value if hasattr(arg, 'value') and not isinstance(arg, (bytes, str)) else arg
+
+
+def _text(arg) -> str:
+    arg = _value(arg)
+    if arg is None:
+        return ''
+    return arg.decode() if isinstance(arg, bytes) else str(arg)
+
+
+def _set_out(ref, value) -> None:
+    """Stores value in a byref()/pointer out-parameter or a ctypes scalar."""
+    target = getattr(ref, '_obj', None)
+    if target is None:
+        target = ref.contents if hasattr(ref, 'contents') else ref
+    target.value = value
+
+
+def _set_string(buf, text: str, max_len) -> int:
+    """Copies text into a string buffer, E_MISMATCHED if it does not fit."""
+    data = text.encode()
+    if len(data) >= int(_value(max_len)):
+        return XErrorCodes.E_MISMATCHED
+    buf.value = data
+    return XErrorCodes.I_OK
+
+
+class _Property(object):
+    def __init__(self, name, proptype, category, value, unit='', low=None, high=None, choices=None):
+        self.name = name
+        self.type = proptype
+        self.category = category
+        self.value = value
+        self.unit = unit
+        self.low = low
+        self.high = high
+        self.choices = choices  # list of (value, ui name)
+
+
+class SimulatedCamera(object):
+    """
+    One simulated camera: properties, capture timing and frame synthesis.
+    """
+
+    def __init__(self, url: str = '', **parameters):
+        params = dict(DEFAULT_PARAMETERS)
+        for key, value in parse_qsl(urlparse(url).query):
+            if key in params:
+                params[key] = type(params[key])(float(value)) if not isinstance(params[key], str) else value
+        params.update(parameters)
+        self.params = params
+
+        self.url = url
+        self.sensor_width = int(params['width'])
+        self.sensor_height = int(params['height'])
+        self.bits = int(params['bits'])
+        self.max_value = (1 << self.bits) - 1
+        self.native_type = XFrameType.FT_8_BPP_GRAY if self.bits <= 8 else XFrameType.FT_16_BPP_GRAY
+
+        self.capturing = False
+        self.colour_mode = 0
+        self.frame_count = 0
+        self._lock = threading.Lock()
+        self._start = None
+        self._last_index = -1
+        self._rng = np.random.default_rng(int(params['seed']))
+
+        self.properties = {}
+        for prop in self._default_properties():
+            self.properties[prop.name] = prop
+
+        self._build_scene()
+
+    # ----- properties -----
+
+    def _default_properties(self):
+        rw, ro = XPropType.XType_Base_RW, XPropType.XType_Base_Readable
+        return [
+            _Property('IntegrationTime', XPropType.XType_Base_Number | rw, 'Beginner/Camera/Integration time',
+                      1000.0, 'us', 1.0, 1e6),
+            _Property('FrameRate', XPropType.XType_Base_Number | rw, 'Beginner/Camera/Frame rate',
+                      float(self.params['fps']), 'Hz', 1.0, 1000.0),
+            _Property('TriggerMode', XPropType.XType_Base_Enum | rw, 'Advanced/Trigger/Mode',
+                      'FreeRunning', choices=[('FreeRunning', 'Free running'), ('External', 'External trigger')]),
+            _Property('AutoGain', XPropType.XType_Base_Bool | rw, 'Beginner/Image/Auto gain', 0),
+            _Property('CameraName', XPropType.XType_Base_String | ro, 'Beginner/Info/Camera name',
+                      'Simulated Xeneth camera'),
+            _Property('FirmwareVersion', XPropType.XType_Base_String | ro, 'Beginner/Info/Firmware', 'sim-1.0'),
+            _Property('SerialNumber', XPropType.XType_Base_String | ro, 'Beginner/Info/Serial number',
+                      self.params['serial']),
+            _Property('SimulatedBias', XPropType.XType_Base_Number | rw, 'Simulation/Bias voltage',
+                      0.0, 'V', -2000.0, 2000.0),
+            _Property('SimulatedNoise', XPropType.XType_Base_Number | rw, 'Simulation/Read noise',
+                      float(self.params['noise']), 'ADU', 0.0, 1000.0),
+            _Property('ResetFrameCounter', XPropType.XType_Base_Action | XPropType.XType_Base_Writeable,
+                      'Advanced/Acquisition/Reset frame counter', 0),
+            _Property('OffsetX', XPropType.XType_Base_Number | rw, 'Advanced/Window/Offset X',
+                      0.0, 'px', 0.0, self.sensor_width - 1),
+            _Property('OffsetY', XPropType.XType_Base_Number | rw, 'Advanced/Window/Offset Y',
+                      0.0, 'px', 0.0, self.sensor_height - 1),
+            _Property('Width', XPropType.XType_Base_Number | rw, 'Advanced/Window/Width',
+                      float(self.sensor_width), 'px', 1.0, self.sensor_width),
+            _Property('Height', XPropType.XType_Base_Number | rw, 'Advanced/Window/Height',
+                      float(self.sensor_height), 'px', 1.0, self.sensor_height),
+        ]
+
+    @property
+    def window(self):
+        """(x, y, width, height) of the readout window"""
+        return tuple(int(self.properties[name].value) for name in _WINDOW_PROPERTIES)
+
+    @property
+    def width(self) -> int:
+        return self.window[2]
+
+    @property
+    def height(self) -> int:
+        return self.window[3]
+
+    def set_property(self, name: str, value) -> int:
+        prop = self.properties.get(name)
+        if prop is None:
+            return XErrorCodes.E_NOT_SUPPORTED
+        if not prop.type & XPropType.XType_Base_Writeable:
+            return XErrorCodes.E_NOT_SUPPORTED
+
+        base = prop.type & XPropType.XType_Base_Mask
+        try:
+            if base == XPropType.XType_Base_Number:
+                value = float(value)
+                if not prop.low <= value <= prop.high:
+                    return XErrorCodes.E_OUT_OF_RANGE
+            elif base == XPropType.XType_Base_Enum:
+                value = _text(value)
+                if value not in [choice for choice, _ in prop.choices]:
+                    return XErrorCodes.E_OUT_OF_RANGE
+            elif base in (XPropType.XType_Base_Bool, XPropType.XType_Base_Action):
+                value = int(value)
+            else:
+                value = _text(value)
+        except (TypeError, ValueError):
+            return XErrorCodes.E_OUT_OF_RANGE
+
+        if name in _WINDOW_PROPERTIES:
+            if self.capturing:
+                return XErrorCodes.E_NOT_SUPPORTED
+            window = dict(zip(_WINDOW_PROPERTIES, self.window))
+            window[name] = value
+            if window['OffsetX'] + window['Width'] > self.sensor_width or \
+                    window['OffsetY'] + window['Height'] > self.sensor_height:
+                return XErrorCodes.E_OUT_OF_RANGE
+
+        with self._lock:
+            if name == 'ResetFrameCounter':
+                self._start, self._last_index = None, -1
+                if self.capturing:
+                    self._start = time.time()
+                return XErrorCodes.I_OK
+            if name == 'FrameRate' and self.capturing:
+                # keep the frame counter continuous across the rate change
+                index = self._current_index(time.time())
+                self._start = time.time() - (index + 1) / value
+            prop.value = value
+        return XErrorCodes.I_OK
+
+    # ----- capture -----
+
+    @property
+    def frame_rate(self) -> float:
+        return float(self.properties['FrameRate'].value)
+
+    def start(self) -> None:
+        with self._lock:
+            self.capturing = True
+            self._start = time.time()
+            self._last_index = -1
+
+    def stop(self) -> None:
+        with self._lock:
+            self.capturing = False
+
+    def _current_index(self, now: float) -> int:
+        return int(math.floor((now - self._start) * self.frame_rate))
+
+    def next_frame(self, blocking: bool):
+        """
+        Index and capture time of the next frame, None if there is none (non-blocking) or on timeout.
+        Frames the caller was too slow for are skipped, like a real frame grabber ring.
+        """
+        deadline = time.time() + _FRAME_TIMEOUT
+        while True:
+            with self._lock:
+                if not self.capturing:
+                    return None
+                now = time.time()
+                index = self._current_index(now)
+                if index > self._last_index:
+                    self._last_index = index
+                    self.frame_count += 1
+                    return index, self._start + index / self.frame_rate
+                wait = self._start + (self._last_index + 1) / self.frame_rate - now
+            if not blocking or now >= deadline:
+                return None
+            time.sleep(max(0.0, min(wait, deadline - now)))
+
+    # ----- frame synthesis -----
+
+    def _build_scene(self):
+        h, w = self.sensor_height, self.sensor_width
+        y = np.arange(h, dtype=np.float64)[:, None]
+
+        # sample band between the electrodes, cf. the crop used in png_analysis
+        top, bottom = int(0.37 * h), int(0.62 * h)
+        band = np.zeros((h, 1))
+        band[top:bottom] = 1.0
+        depth = np.clip((y - top) / max(bottom - top - 1, 1), 0.0, 1.0)
+
+        # field profile across the band: tilted by space charge, normalized to mean 1
+        tilt = self.params['space_charge']
+        self._profile = (1.0 + tilt * (depth - 0.5)) * band
+        self._band = band
+
+        # mild vignetting so frames are not perfectly flat
+        x = np.linspace(-1.0, 1.0, w)[None, :]
+        yy = np.linspace(-1.0, 1.0, h)[:, None]
+        self._illumination = 1.0 - 0.15 * (x ** 2 + yy ** 2)
+
+        rng = np.random.default_rng(int(self.params['seed']) + 1)
+        dead = rng.random((h, w)) < self.params['dead']
+        hot = dead & (rng.random((h, w)) < 0.5)
+        self._dead = dead & ~hot
+        self._hot = hot
+
+    def render(self, index: int) -> np.ndarray:
+        """
+        Synthesizes frame number index as a float image in ADU.
+        """
+        bias = float(self.properties['SimulatedBias'].value)
+        tint = float(self.properties['IntegrationTime'].value)
+        noise = float(self.properties['SimulatedNoise'].value)
+
+        transmission = np.sin(0.5 * np.pi * bias * self._profile / self.params['v_pi']) ** 2
+        exposure = tint / 1000.0
+        image = self.params['offset'] + exposure * self.params['signal'] * self._illumination * \
+            (0.02 + transmission * self._band)
+        if noise:
+            image = image + self._rng.normal(0.0, noise, image.shape)
+
+        image[self._dead] = 0
+        image[self._hot] = self.max_value
+        x, y, width, height = self.window
+        return np.clip(image[y:y + height, x:x + width], 0, self.max_value)
+
+    def footer(self, index: int, soc: float) -> bytes:
+        footer = XPFF_GENERIC()
+        footer._len = ctypes.sizeof(XPFF) + ctypes.sizeof(XPFF_F040)
+        footer._ver = 0xAA00
+        footer._soc = int(soc * 1e6)
+        footer._tft = int(time.time() * 1e6)
+        footer._tfc = index & 0xFFFFFFFF
+        footer._hfl = ctypes.sizeof(XPFF_F040)
+        onca = footer._common._onca
+        onca._tint = int(self.properties['IntegrationTime'].value)
+        onca._timelo = footer._soc & 0xFFFFFFFF
+        onca._timehi = footer._soc >> 32
+        onca._temp_die = 300
+        onca._temp_case = 298
+        # the pid shares its bytes with the status field, write it last
+        footer._common._pid = _FOOTER_PID
+        return bytes(footer)[:footer._len]
+
+    @property
+    def footer_length(self) -> int:
+        return ctypes.sizeof(XPFF) + ctypes.sizeof(XPFF_F040)
+
+    def convert(self, image: np.ndarray, frame_type: XFrameType) -> np.ndarray:
+        if frame_type == XFrameType.FT_NATIVE:
+            frame_type = self.native_type
+        if frame_type == XFrameType.FT_8_BPP_GRAY:
+            return (image * (255.0 / self.max_value)).astype(np.uint8)
+        if frame_type == XFrameType.FT_16_BPP_GRAY:
+            return image.astype(np.uint16)
+        if frame_type == XFrameType.FT_32_BPP_GRAY:
+            return image.astype(np.uint32)
+        gray = (image * (255.0 / self.max_value)).astype(np.uint8)
+        if frame_type in (XFrameType.FT_32_BPP_RGB, XFrameType.FT_32_BPP_BGR):
+            return np.repeat(gray[:, :, None], 3, axis=2)
+        if frame_type in (XFrameType.FT_32_BPP_RGBA, XFrameType.FT_32_BPP_BGRA):
+            alpha = np.full(gray.shape + (1,), 255, dtype=np.uint8)
+            return np.concatenate((np.repeat(gray[:, :, None], 3, axis=2), alpha), axis=2)
+        return None
+
+    # ----- settings -----
+
+    def save_settings(self, filename: str) -> int:
+        values = {name: prop.value for name, prop in self.properties.items()
+                  if prop.type & XPropType.XType_Base_Writeable
+                  and prop.type & XPropType.XType_Base_Mask != XPropType.XType_Base_Action}
+        try:
+            with open(filename, 'w') as f:
+                json.dump(values, f, indent=2)
+        except OSError:
+            return XErrorCodes.E_SAVE_ERROR
+        return XErrorCodes.I_OK
+
+    def load_settings(self, filename: str) -> int:
+        try:
+            with open(filename) as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            return XErrorCodes.E_NOT_FOUND
+        for name, value in values.items():
+            err = self.set_property(name, value)
+            if err != XErrorCodes.I_OK:
+                return err
+        return XErrorCodes.I_OK
+
+
+class _CFunction(object):
+    """
+    Callable with settable argtypes/restype, like a function of a ctypes.CDLL.
+    """
+
+    def __init__(self, name, func):
+        self.__name__ = name
+        self._func = func
+        self.argtypes = None
+        self.restype = None
+
+    def __call__(self, *args):
+        return self._func(*args)
+
+
+class SimulatedLibrary(object):
+    """
+    Simulated xeneth.dll. Attribute access returns the C API functions by name.
+    Functions without a simulation (image filters, blitting) report E_NOT_SUPPORTED.
+    """
+
+    _name = 'simulated'
+    _path = None
+    _bitness_32 = False
+    _bitness_64 = True
+
+    def __init__(self):
+        self._cameras = {}
+        self._next_handle = 1
+        self._functions = {}
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name not in self._functions:
+            impl = getattr(_SimulatedApi, name, None)
+            if impl is None:
+                impl = _not_supported
+            self._functions[name] = _CFunction(name, impl.__get__(self))
+        return self._functions[name]
+
+    def camera(self, handle) -> SimulatedCamera:
+        """The simulated camera behind a handle, None for an invalid handle."""
+        return self._cameras.get(int(_value(handle)))
+
+
+def _not_supported(self, *args):  # pylint: disable=unused-argument
+    return XErrorCodes.E_NOT_SUPPORTED
+
+
+class _SimulatedApi(object):
+    """
+    Implementations of the C API functions, bound to a SimulatedLibrary.
+    """
+
+    # pylint: disable=no-self-argument,unused-argument
+
+    # ----- errors -----
+
+    def XC_ErrorToString(lib, error, buf, max_len):
+        try:
+            text = XErrorCodes(_value(error)).name
+        except ValueError:
+            text = f"Unknown error {_value(error)}"
+        _set_string(buf, text, max_len)
+        return len(text)
+
+    # ----- discovery -----
+
+    def XCD_EnumerateDevices(lib, devices, count, flags):
+        if devices is None:
+            _set_out(count, 1)
+            return XErrorCodes.I_OK
+        if int(_value(count)) < 1:
+            return XErrorCodes.I_OK
+        device = devices[0]
+        device._size = ctypes.sizeof(device)
+        device._name = b'Simulated Xeneth camera'
+        device._transport = b'Simulated'
+        device._url = b'sim://0'
+        device._address = b'localhost'
+        device._serial = 0x51A0001
+        device._pid = _FOOTER_PID
+        device._state = 0
+        return XErrorCodes.I_OK
+
+    def XCD_GetPropertyCount(lib):
+        return 0
+
+    # ----- camera -----
+
+    def XC_OpenCamera(lib, name, status_callback, user):
+        handle = lib._next_handle
+        lib._next_handle += 1
+        lib._cameras[handle] = SimulatedCamera(_text(name))
+        return handle
+
+    def XC_CloseCamera(lib, handle):
+        lib._cameras.pop(int(_value(handle)), None)
+
+    def XC_CameraToHandle(lib, camera):
+        return camera
+
+    def XC_IsInitialised(lib, handle):
+        return lib.camera(handle) is not None
+
+    def XC_IsCapturing(lib, handle):
+        camera = lib.camera(handle)
+        return bool(camera and camera.capturing)
+
+    def XC_StartCapture(lib, handle):
+        camera = lib.camera(handle)
+        if camera is None:
+            return XErrorCodes.E_INVALID_HANDLE
+        camera.start()
+        return XErrorCodes.I_OK
+
+    def XC_StopCapture(lib, handle):
+        camera = lib.camera(handle)
+        if camera is None:
+            return XErrorCodes.E_INVALID_HANDLE
+        camera.stop()
+        return XErrorCodes.I_OK
+
+    def XC_GetWidth(lib, handle):
+        camera = lib.camera(handle)
+        return camera.width if camera else 0
+
+    def XC_GetHeight(lib, handle):
+        camera = lib.camera(handle)
+        return camera.height if camera else 0
+
+    def XC_GetMaxWidth(lib, handle):
+        camera = lib.camera(handle)
+        return camera.sensor_width if camera else 0
+
+    def XC_GetMaxHeight(lib, handle):
+        camera = lib.camera(handle)
+        return camera.sensor_height if camera else 0
+
+    def XC_GetFrameSize(lib, handle):
+        camera = lib.camera(handle)
+        if camera is None:
+            return 0
+        return camera.width * camera.height * (1 if camera.native_type == XFrameType.FT_8_BPP_GRAY else 2)
+
+    def XC_GetFrameType(lib, handle):
+        camera = lib.camera(handle)
+        return camera.native_type.value if camera else XFrameType.FT_UNKNOWN.value
+
+    def XC_GetMaxValue(lib, handle):
+        camera = lib.camera(handle)
+        return camera.max_value if camera else 0
+
+    def XC_GetBitSize(lib, handle):
+        camera = lib.camera(handle)
+        return camera.bits if camera else 0
+
+    def XC_GetFrameCount(lib, handle):
+        camera = lib.camera(handle)
+        return camera.frame_count if camera else 0
+
+    def XC_GetFrameRate(lib, handle):
+        camera = lib.camera(handle)
+        return camera.frame_rate if camera else 0.0
+
+    def XC_GetColourMode(lib, handle):
+        camera = lib.camera(handle)
+        return camera.colour_mode if camera else 0
+
+    def XC_SetColourMode(lib, handle, mode):
+        camera = lib.camera(handle)
+        if camera:
+            camera.colour_mode = int(_value(mode))
+
+    def XC_GetFrameFooterLength(lib, handle):
+        camera = lib.camera(handle)
+        return camera.footer_length if camera else 0
+
+    def XC_GetFrame(lib, handle, frame_type, flags, buffer, size):
+        camera = lib.camera(handle)
+        if camera is None:
+            return XErrorCodes.E_INVALID_HANDLE
+        flags = int(_value(flags))
+
+        frame = camera.next_frame(blocking=bool(flags & XGetFrameFlags.XGF_Blocking))
+        if frame is None:
+            return XErrorCodes.E_TIMEOUT if flags & XGetFrameFlags.XGF_Blocking and camera.capturing \
+                else XErrorCodes.E_NO_FRAME
+        index, soc = frame
+
+        data = camera.convert(camera.render(index), XFrameType(int(_value(frame_type))))
+        if data is None:
+            return XErrorCodes.E_NO_CONVERSION
+        size = int(_value(size))
+        if data.nbytes != size:
+            return XErrorCodes.E_MISMATCHED
+
+        address = ctypes.cast(buffer, ctypes.c_void_p).value
+        ctypes.memmove(address, data.ctypes.data, size)
+        if flags & XGetFrameFlags.XGF_FetchPFF:
+            # the footer goes right after the image, the buffer is sized by GetFrameFooterLength
+            footer = camera.footer(index, soc)
+            ctypes.memmove(address + size, footer, len(footer))
+        return XErrorCodes.I_OK
+
+    def XC_Blit(lib, *args):
+        return None
+
+    def XC_GetFilterFrame(lib, handle):
+        return None
+
+    # ----- settings and paths -----
+
+    def XC_LoadSettings(lib, handle, filename):
+        camera = lib.camera(handle)
+        return camera.load_settings(_text(filename)) if camera else XErrorCodes.E_INVALID_HANDLE
+
+    def XC_SaveSettings(lib, handle, filename):
+        camera = lib.camera(handle)
+        return camera.save_settings(_text(filename)) if camera else XErrorCodes.E_INVALID_HANDLE
+
+    def XC_GetPath(lib, handle, path_id, buf, max_len):
+        return _set_string(buf, tempfile.gettempdir(), max_len)
+
+    # ----- properties -----
+
+    def _prop(lib, handle, name):
+        camera = lib.camera(handle)
+        if camera is None:
+            return None, XErrorCodes.E_INVALID_HANDLE
+        prop = camera.properties.get(_text(name))
+        if prop is None:
+            return None, XErrorCodes.E_NOT_SUPPORTED
+        return prop, XErrorCodes.I_OK
+
+    def XC_GetPropertyCount(lib, handle):
+        camera = lib.camera(handle)
+        return len(camera.properties) if camera else 0
+
+    def XC_GetPropertyName(lib, handle, index, buf, max_len):
+        camera = lib.camera(handle)
+        if camera is None:
+            return XErrorCodes.E_INVALID_HANDLE
+        names = list(camera.properties)
+        index = int(_value(index))
+        if not 0 <= index < len(names):
+            return XErrorCodes.E_OUT_OF_RANGE
+        return _set_string(buf, names[index], max_len)
+
+    def XC_GetPropertyType(lib, handle, name, out):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is not None:
+            _set_out(out, int(prop.type))
+        return err
+
+    def XC_GetPropertyCategory(lib, handle, name, buf, max_len):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        return _set_string(buf, prop.category, max_len) if prop is not None else err
+
+    def XC_GetPropertyUnit(lib, handle, name, buf, max_len):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        return _set_string(buf, prop.unit, max_len) if prop is not None else err
+
+    def XC_GetPropertyRange(lib, handle, name, buf, max_len):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is None:
+            return err
+        if prop.choices is not None:
+            return _set_string(buf, ",".join(f"{value}={ui}" for value, ui in prop.choices), max_len)
+        if prop.low is not None:
+            return _set_string(buf, f"{prop.low}>{prop.high}", max_len)
+        return _set_string(buf, "", max_len)
+
+    XC_GetPropertyRangeE = XC_GetPropertyRange
+
+    def XC_GetPropertyRangeF(lib, handle, name, low, high):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is None:
+            return err
+        if prop.low is None:
+            return XErrorCodes.E_NOT_SUPPORTED
+        _set_out(low, float(prop.low))
+        _set_out(high, float(prop.high))
+        return XErrorCodes.I_OK
+
+    def XC_GetPropertyRangeL(lib, handle, name, low, high):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is None:
+            return err
+        if prop.low is None:
+            return XErrorCodes.E_NOT_SUPPORTED
+        _set_out(low, int(prop.low))
+        _set_out(high, int(prop.high))
+        return XErrorCodes.I_OK
+
+    def XC_GetPropertyValue(lib, handle, name, buf, max_len):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is None:
+            return err
+        value = prop.value
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return _set_string(buf, str(value), max_len)
+
+    XC_GetPropertyValueE = XC_GetPropertyValue
+
+    def XC_GetPropertyValueF(lib, handle, name, out):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is None:
+            return err
+        try:
+            _set_out(out, float(prop.value))
+        except (TypeError, ValueError):
+            return XErrorCodes.E_NOT_SUPPORTED
+        return XErrorCodes.I_OK
+
+    def XC_GetPropertyValueL(lib, handle, name, out):
+        prop, err = _SimulatedApi._prop(lib, handle, name)
+        if prop is None:
+            return err
+        try:
+            _set_out(out, int(prop.value))
+        except (TypeError, ValueError):
+            return XErrorCodes.E_NOT_SUPPORTED
+        return XErrorCodes.I_OK
+
+    def XC_GetPropertyBlob(lib, handle, name, buf, size):
+        return XErrorCodes.E_NOT_SUPPORTED
+
+    def XC_SetPropertyValue(lib, handle, name, value, unit):
+        camera = lib.camera(handle)
+        return camera.set_property(_text(name), _text(value)) if camera else XErrorCodes.E_INVALID_HANDLE
+
+    def XC_SetPropertyValueE(lib, handle, name, value):
+        camera = lib.camera(handle)
+        return camera.set_property(_text(name), _text(value)) if camera else XErrorCodes.E_INVALID_HANDLE
+
+    def XC_SetPropertyValueF(lib, handle, name, value, unit):
+        camera = lib.camera(handle)
+        return camera.set_property(_text(name), float(_value(value))) if camera else XErrorCodes.E_INVALID_HANDLE
+
+    def XC_SetPropertyValueL(lib, handle, name, value, unit):
+        camera = lib.camera(handle)
+        return camera.set_property(_text(name), int(_value(value))) if camera else XErrorCodes.E_INVALID_HANDLE
+
+    def XC_SetPropertyBlob(lib, handle, name, value, size):
+        return XErrorCodes.E_NOT_SUPPORTED
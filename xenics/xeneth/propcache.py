@@ -0,0 +1,103 @@
+"""
+propcache.py
+
+Persistent cache of camera property metadata.
+
+Walking the property system of a camera (name, type and category per property, plus the
+range of every enum) takes thousands of C calls. The metadata only changes with the
+camera model and firmware, so XCamera stores it here, keyed by a camera signature, and
+reuses it on the next open.
+
+The cache is a JSON file:
+
+    {"<camera key>": {"names": [...], "props": {"<name>": {"type": 1, "category": "...", "range": [[...], [...]]}}}}
+
+Entries for a property are filled in as they are resolved, so a partial entry is normal.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from xenics.xeneth.util import _log as logger
+
+__all__ = ['PropertyMetadataCache', 'DEFAULT_CACHE_PATH']
+
+# Override with the XENETH_PROPERTY_CACHE environment variable
+DEFAULT_CACHE_PATH = Path(os.environ.get('XENETH_PROPERTY_CACHE',
+                                         Path.home() / '.xeneth' / 'property_cache.json'))
+
+
+class PropertyMetadataCache(object):
+    """
+    Property metadata per camera key, loaded from and saved to a JSON file.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        """
+        :param path: Cache file location.
+        """
+        self.path = Path(path)
+        self._entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self) -> None:
+        """
+        (Re)reads the cache file. A missing or unreadable file gives an empty cache.
+        """
+        try:
+            with open(self.path) as f:
+                self._entries = json.load(f)
+        except FileNotFoundError:
+            self._entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable property cache %s: %s", self.path, e)
+            self._entries = {}
+        self._dirty = False
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        The entry for a camera key, None if the camera was not seen before.
+        The returned dict is live: changes are saved with the next save() after mark_dirty().
+        """
+        return self._entries.get(key)
+
+    def put(self, key: str, names: list) -> dict:
+        """
+        Creates a new entry for a camera key with its property names.
+        """
+        entry = {'names': list(names), 'props': {}}
+        self._entries[key] = entry
+        self._dirty = True
+        return entry
+
+    def remove(self, key: str) -> None:
+        """
+        Drops a camera entry, e.g. when it turned out to be stale.
+        """
+        if self._entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def mark_dirty(self) -> None:
+        """
+        Flags that an entry was changed in place.
+        """
+        self._dirty = True
+
+    def save(self) -> None:
+        """
+        Writes the cache file if anything changed. Errors are logged, the cache is only an optimization.
+        """
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.path.with_suffix('.tmp')
+            with open(temp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning("Could not write property cache %s: %s", self.path, e)
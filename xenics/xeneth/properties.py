@@ -28,15 +28,52 @@ class Properties():
     """
     An object of this class will hold all properties in its __dict__
     Note that directly using 'object' is not possible; it does not have a __dict__ !!!
+
+    Properties can also be registered lazily with a factory: the property object is only
+    created (and its metadata read from the camera) on first access.
     """
+
+    # the lazy registry is kept in slots, outside __dict__ which is the property namespace
+    __slots__ = ('__dict__', '_pending', '_factory')
+
+    def __init__(self):
+        self._pending = {}
+        self._factory = None
+
+    def set_lazy(self, names: dict, factory):
+        """
+        Registers properties to be created on first access.
+
+        :param names: attribute name -> SDK property name
+        :param factory: callable(SDK property name) returning the property object, or None if unsupported
+        """
+        self._pending = dict(names)
+        self._factory = factory
+
+    def _resolve(self, key):
+        name = self._pending.pop(key)
+        prop = self._factory(name)
+        if prop is None:
+            return None
+        setattr(self, key, prop)
+        return prop
+
     def __getattr__(self, key):
-        """Catch any not defined Property """
+        """Create a lazily registered property, catch any not defined Property """
+        if key in ('_pending', '_factory'):
+            raise AttributeError(key)
+        if key in self._pending:
+            prop = self._resolve(key)
+            if prop is not None:
+                return prop
         raise XCameraInvalidPropertyException(key)
 
     def __iter__(self):
         """
         Iterate over all properties
         """
+        for key in list(self._pending):
+            self._resolve(key)
         for each in self.__dict__.values():
             yield each
 
@@ -49,6 +86,9 @@ class Properties():
         if name.endswith('(0)'):
             name = name[:-3]
 
+        if name not in self.__dict__ and name in self._pending:
+            return getattr(self, name)
+
         return self.__dict__[name]
 
     @property
@@ -56,7 +96,7 @@ class Properties():
         """
         Returns a list of all property names
         """
-        return list(self.__dict__.keys())
+        return list(self.__dict__.keys()) + list(self._pending)
 
 
 
@@ -272,12 +312,39 @@ class StringProp(PropertyIface):
 class EnumProp(PropertyIface):
     """Enumeration property"""
 
-    def __init__(self, handle, name, proptype, category):
+    def __init__(self, handle, name, proptype, category, enum_range=None):
         """Initialise the enum property.
-        This will also read the possible values for the enum and provide this in the range member.
+        The possible values for the enum are read on first use of the range member, unless given.
+
+        :param enum_range: (programming names, ui names) from the property metadata cache
         """
         super().__init__(handle, name, proptype, category)
 
+        self._range = None
+        self._range_ui = None
+        if enum_range is not None:
+            self._range, self._range_ui = list(enum_range[0]), list(enum_range[1])
+
+    @property
+    def range(self):
+        """List of programming names"""
+        if self._range is None:
+            self._read_range()
+        return self._range
+
+    @property
+    def range_ui(self):
+        """List of ui names"""
+        if self._range_ui is None:
+            self._read_range()
+        return self._range_ui
+
+    @property
+    def range_loaded(self) -> bool:
+        """Whether the range is known without a camera call"""
+        return self._range is not None
+
+    def _read_range(self):
         # First try to get the values using a buffer of 512, which should fit most of the time.
         # If the buffer is too small, we get return value E_MISMATCHED
         # As long as we get E_MISMATCHED, try doubling the buffer size.
@@ -300,11 +367,11 @@ class EnumProp(PropertyIface):
 
 
         enum_list = buf.value.decode().split(",")
-        self.range = []
-        self.range_ui = []
+        self._range = []
+        self._range_ui = []
         for i in enum_list:
-            self.range.append(i.split("=")[0])
-            self.range_ui.append(i.split("=")[1])
+            self._range.append(i.split("=")[0])
+            self._range_ui.append(i.split("=")[1])
 
 
     def _get(self):
@@ -0,0 +1,149 @@
+"""
+xaccumulator.py
+
+Running mean and variance of camera frames.
+
+XFrameAccumulator keeps float64 sums in place (Welford's algorithm) over a fixed number of
+frames or a time window, so a measurement step produces one mean frame, one variance frame
+and a frame count instead of N stored frames.
+"""
+
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from xenics.xeneth.errors import XenethException
+
+__all__ = ['XAccumulatedFrame', 'XFrameAccumulator']
+
+
+class XAccumulatedFrame(NamedTuple):
+    """
+    Result of an accumulation.
+    """
+    mean: np.ndarray
+    variance: np.ndarray
+    count: int
+
+
+class XFrameAccumulator(object):
+    """
+    Accumulates frames until `frames` frames were added or `window` seconds passed since the first frame.
+
+    add and add_frame are thread safe, so add_frame can be used as the process callback of
+    XCaptureEngine. Frames arriving after the accumulation completed are ignored until reset.
+    """
+
+    def __init__(self, frame_shape: tuple, frames: Optional[int] = None, window: Optional[float] = None,
+                 clock=time.monotonic):
+        """
+        :param frame_shape: Shape of a single frame.
+        :param frames: Number of frames per accumulation.
+        :param window: Accumulation time in seconds, counted from the first frame.
+        :param clock: Time source for the window.
+        """
+        if frames is None and window is None:
+            raise XenethException("Either frames or window must be given")
+
+        self.frames = frames
+        self.window = window
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._complete = threading.Event()
+
+        self._mean = np.zeros(frame_shape, dtype=np.float64)
+        self._m2 = np.zeros(frame_shape, dtype=np.float64)
+        self._delta = np.empty(frame_shape, dtype=np.float64)
+        self._scratch = np.empty(frame_shape, dtype=np.float64)
+        self._count = 0
+        self._start = None
+
+    def reset(self, frames: Optional[int] = None, window: Optional[float] = None) -> None:
+        """
+        Starts a new accumulation, optionally with a different frame count or window.
+        """
+        with self._lock:
+            if frames is not None or window is not None:
+                self.frames = frames
+                self.window = window
+            self._mean.fill(0.0)
+            self._m2.fill(0.0)
+            self._count = 0
+            self._start = None
+            self._complete.clear()
+
+    @property
+    def count(self) -> int:
+        """
+        Number of frames accumulated so far
+        """
+        return self._count
+
+    @property
+    def complete(self) -> bool:
+        """
+        Whether the frame count or time window was reached
+        """
+        return self._complete.is_set()
+
+    def add(self, frame: np.ndarray) -> bool:
+        """
+        Adds a frame.
+
+        :param frame: Image data with the accumulator's frame shape.
+        :return: True if the accumulation is complete.
+        """
+        with self._lock:
+            if self._complete.is_set():
+                return True
+
+            now = self._clock()
+            if self._start is None:
+                self._start = now
+            elif self.window is not None and now - self._start >= self.window:
+                self._complete.set()
+                return True
+
+            # Welford update, all in the preallocated float64 arrays
+            self._count += 1
+            np.subtract(frame, self._mean, out=self._delta)
+            np.divide(self._delta, self._count, out=self._scratch)
+            self._mean += self._scratch
+            np.subtract(frame, self._mean, out=self._scratch)
+            self._delta *= self._scratch
+            self._m2 += self._delta
+
+            if self.frames is not None and self._count >= self.frames:
+                self._complete.set()
+            return self._complete.is_set()
+
+    def add_frame(self, frame) -> bool:
+        """
+        Adds the image data of a XFrameBuffer or XPooledFrame.
+        """
+        return self.add(frame.image_data)
+
+    def result(self) -> XAccumulatedFrame:
+        """
+        Copies of the current mean and (sample) variance. The variance is zero with fewer than two frames.
+        """
+        with self._lock:
+            mean = self._mean.copy()
+            if self._count > 1:
+                variance = self._m2 / (self._count - 1)
+            else:
+                variance = np.zeros_like(self._m2)
+            return XAccumulatedFrame(mean, variance, self._count)
+
+    def wait(self, timeout: Optional[float] = None) -> XAccumulatedFrame:
+        """
+        Waits until the accumulation is complete and returns the result.
+
+        A time window accumulation only completes when a frame arrives after the window; if no
+        frame arrives, the frames accumulated so far are returned after the timeout.
+        """
+        if not self._complete.wait(timeout) and self._count == 0:
+            raise TimeoutError(f"No frames accumulated within {timeout} s")
+        return self.result()
@@ -4,6 +4,9 @@ xcamera.py
 XenEth camera class
 """
 
+import math
+import time
+from pathlib import Path
 from typing import Any, Union, Tuple
 
 from xenics.xeneth.capi.errors import XErrorCodes
@@ -26,11 +29,17 @@ from xenics.xeneth.capi.util import (
     _create_property_unit_buffer)
 
 from xenics.xeneth.xframebuffer import XFrameBuffer
+from xenics.xeneth.xframes import XFrameStream
+from xenics.xeneth.xroi import XROI
+from xenics.xeneth.propcache import DEFAULT_CACHE_PATH, PropertyMetadataCache
 
 
 # only export XCamera class
 __all__ = ['XCamera']
 
+# Seconds between polls of get_frame with a timeout
+_FRAME_POLL_INTERVAL = 0.001
+
 class XCamera(object):
     """
     Represents a XenICs camera.
@@ -47,7 +56,10 @@ class XCamera(object):
     }
 
 
-    def __init__(self) -> None:
+    def __init__(self, property_cache: Union[str, Path, None] = DEFAULT_CACHE_PATH) -> None:
+        """
+        :param property_cache: Path of the property metadata cache file, None to always query the camera.
+        """
         self._name = None
         self._handle = 0
         self._status_cb = ctypes.cast(None, XStatus)
@@ -56,30 +68,116 @@ class XCamera(object):
 
         self._native_frame_type = XFrameType.FT_UNKNOWN
 
+        self._property_cache = PropertyMetadataCache(property_cache) if property_cache is not None else None
+        self._property_cache_key = None
+        self._property_meta = {}
+
+        # last known property values, written or read through this object (see apply/snapshot)
+        self._known_values = {}
+
+    # Model, serial number and firmware properties that are part of the cache key when the camera has them.
+    # Extend for cameras that report their identity under other names.
+    _signature_properties = ('_CAM_PID', '_CAM_SER', 'CameraName', 'ModelName', 'SerialNumber', 'FirmwareVersion')
+
+    def _read_identity_value(self, property_name: str) -> Union[str, None]:
+        """
+        Reads a property value as string before the property objects exist, None if the camera has no such property.
+        """
+        buf = _create_property_string_value_buffer()
+        if XC_GetPropertyValue(self.handle, property_name.encode(), buf, len(buf)) != XErrorCodes.I_OK:
+            return None
+        return buf.value.decode()
+
+    def _camera_signature(self, numprops: int) -> str:
+        """
+        Key for the property metadata cache.
+
+        Made of the model, serial number and firmware version properties the camera reports (see
+        _signature_properties), the sensor geometry and format, and the size and ends of the
+        property table, so a different camera or firmware never gets the metadata of another one.
+        """
+        first = self.get_property_name(0) if numprops else ''
+        last = self.get_property_name(numprops - 1) if numprops else ''
+        identity = [f"{name}={value}" for name in self._signature_properties
+                    for value in [self._read_identity_value(name)] if value is not None]
+        return "_".join(identity + [
+            f"{self.max_width}x{self.max_height}_{self.bitsize}bit_{self._native_frame_type.name}"
+            f"_ftr{self.frame_footer_length}_{numprops}_{first}_{last}"])
+
     def _populate_props(self):
         """
-        Retrieve the properties of the camera and make them available as attributes of the props member object
+        Retrieve the property names of the camera and make them available as attributes of the props member object.
+        Type, category and enum range of a property are read on first access, or taken from the metadata cache.
         """
 
         numprops = self.get_property_count()
+        entry = None
+
+        if self._property_cache is not None:
+            self._property_cache_key = self._camera_signature(numprops)
+            entry = self._property_cache.get(self._property_cache_key)
+
+        if entry is None:
+            names = [self.get_property_name(i) for i in range(numprops)]
+            if self._property_cache is not None:
+                entry = self._property_cache.put(self._property_cache_key, names)
+                self._property_cache.save()
+            else:
+                entry = {'names': names, 'props': {}}
+        else:
+            logger.debug("Property metadata of %s taken from cache", self._name)
+
+        self._property_meta = entry['props']
+        self._known_values = {}
+        self.props = Properties()
 
-        for i in range(numprops):
+        # Handle the special case where properties end in '(0)', simply strip those 3 characters from the name used as attribute
+        self.props.set_lazy({(propname[:-3] if propname.endswith('(0)') else propname): propname
+                             for propname in entry['names']},
+                            self._create_property)
 
-            propname  = self.get_property_name(i)
-            proptype = self.get_property_type(propname)
-            propcategory = self.get_property_category(propname)
+    def _create_property(self, propname: str):
+        """
+        Creates the property object for an SDK property name, None if its type is not supported.
+        """
+        meta = self._property_meta.setdefault(propname, {})
+
+        if 'type' not in meta:
+            meta['type'] = self.get_property_type(propname).value
+            meta['category'] = self.get_property_category(propname)
+            self._mark_property_cache_dirty()
 
-            propclass = self._property_types.get(proptype.value & 0xff)
+        proptype = XPropType(meta['type'])
+        propclass = self._property_types.get(proptype.value & 0xff)
+        if propclass is None:
+            return None
+        if propclass is EnumProp:
+            return EnumProp(self.handle, propname, proptype, meta['category'], meta.get('range'))
+        return propclass(self.handle, propname, proptype, meta['category'])
 
-            if propclass:
-                prop = propclass(self.handle, propname, proptype, propcategory)
+    def _mark_property_cache_dirty(self):
+        if self._property_cache is not None:
+            self._property_cache.mark_dirty()
 
-                # Handle the special case where properties end in '(0)', simply strip those 3 characters from the name used as attribute
-                if propname.endswith('(0)'):
-                    propname = propname[:-3]
+    def _store_property_cache(self):
+        """
+        Adds the enum ranges read during this session to the cache and writes it.
+        """
+        if self._property_cache is None:
+            return
+        for prop in self.props.__dict__.values():
+            if isinstance(prop, EnumProp) and prop.range_loaded and 'range' not in self._property_meta.get(prop.name, {}):
+                self._property_meta.setdefault(prop.name, {})['range'] = [prop.range, prop.range_ui]
+                self._property_cache.mark_dirty()
+        self._property_cache.save()
 
-                # self._properties.append(prop)
-                setattr(self.props, propname, prop)  # .decode bytes->str
+    def clear_property_cache(self) -> None:
+        """
+        Removes the cached property metadata of this camera, e.g. after a firmware update that kept the signature.
+        """
+        if self._property_cache is not None and self._property_cache_key is not None:
+            self._property_cache.remove(self._property_cache_key)
+            self._property_cache.save()
 
     #region Properties
 
@@ -237,6 +335,7 @@ class XCamera(object):
         """
         Closes the camera.
         """
+        self._store_property_cache()
         XC_CloseCamera(self._handle)
 
         # reset handles and pointers
@@ -270,15 +369,27 @@ class XCamera(object):
         return XFrameBuffer(self.width, self.height, frame_type, self.frame_footer_length)
 
 
-    def get_frame(self, frame_buffer: XFrameBuffer, flags: XGetFrameFlags = 0) -> bool:
+    def get_frame(self, frame_buffer: XFrameBuffer, flags: XGetFrameFlags = 0, timeout: float = None) -> bool:
         """
         Gets a frame from the camera. The frame type is determined by the frame_buffer parameter.
 
         :param frame_buffer: The frame buffer to put the frame in. This buffer should be created using the create_buffer method. 
         :param flags: The frame flags.
+        :param timeout: Max seconds to wait for a frame with XGF_Blocking. The SDK call has no timeout
+                        argument and blocks up to its own time-out, so with a timeout the camera is polled
+                        without XGF_Blocking until the deadline instead. None blocks in the SDK call.
 
         :return: True if a frame is available, False otherwise.
         """
+        if timeout is not None and flags & XGetFrameFlags.XGF_Blocking:
+            deadline = time.monotonic() + timeout
+            flags &= ~XGetFrameFlags.XGF_Blocking
+            while not self.get_frame(frame_buffer, flags):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(_FRAME_POLL_INTERVAL, remaining))
+            return True
 
         buf = frame_buffer.data.ctypes.data_as(ctypes.POINTER(ctypes.c_char))
 
@@ -295,6 +406,23 @@ class XCamera(object):
         # other error code, raise exception
         raise XenethAPIException(err)
 
+    def frames(self, count: int = None, timeout: float = None, pool_size: int = 4,
+               frame_type: XFrameType = XFrameType.FT_NATIVE, roi: XROI = None) -> XFrameStream:
+        """
+        Iterates over the next frames, with `for` or `async for`.
+
+        Frames are pooled buffers, release each frame (frame.release() or `with frame:`) when done with it.
+        Close the stream when done (`with cam.frames(...) as stream:`), which stops capture if the stream started it.
+
+        :param count: Number of frames, None for an endless stream.
+        :param timeout: Max seconds to wait for each frame, TimeoutError when exceeded.
+        :param pool_size: Number of frame buffers, the max number of frames held at once.
+        :param frame_type: The frame type to use.
+        :param roi: Region of interest and binning, see xroi.py.
+        :return: The frame stream.
+        """
+        return XFrameStream(self, count, timeout, pool_size, frame_type, roi=roi)
+
     def get_path(self, path_id: XDirectories) -> str:
         """
         Gets the path specified by the path_id.
@@ -335,6 +463,9 @@ class XCamera(object):
         """
         handle_c_call(lambda: XC_LoadSettings(self._handle, filename.encode()))
 
+        # every property may have changed
+        self._known_values = {}
+
 
     def save_settings(self, filename: str) -> None:
         """
@@ -425,7 +556,10 @@ class XCamera(object):
 
         :return: The current value of the property.
         """
-        return self.props[property_name].get()
+        prop = self.props[property_name]
+        value = prop.get()
+        self._known_values[prop.name] = value
+        return value
 
     def set_property_value(self, property_name: str, value: Any) -> None:
         """
@@ -434,7 +568,122 @@ class XCamera(object):
         :param property_name: The name of the property for which the value is to be set.
         :param value: The new value for the property.
         """
-        self.props[property_name].set(value)
+        prop = self.props[property_name]
+        self._known_values.pop(prop.name, None)
+        prop.set(value)
+        self._known_values[prop.name] = value
+
+    #region Batched settings
+
+    # Apply order by property name keywords: modes and formats first, then geometry, then timing, then the rest.
+    # Frame rate and integration time are ordered at apply time, see _apply_rank.
+    _apply_groups = (
+        ('mode', 'format', 'trigger', 'source'),
+        ('width', 'height', 'offset', 'roi', 'binning', 'window'),
+        ('framerate', 'frame rate', 'frameperiod', 'period'),
+        ('integration', 'exposure'),
+    )
+
+    def _apply_rank(self, prop: PropertyIface, value: Any) -> int:
+        name = prop.name.lower()
+        rank = len(self._apply_groups)
+        for i, keywords in enumerate(self._apply_groups):
+            if any(keyword in name for keyword in keywords):
+                rank = i
+                break
+
+        # A higher frame rate may not leave room for the current integration time, and a longer
+        # integration time may not fit the current frame period: when the frame rate goes up,
+        # write the integration time first.
+        if rank == 2 and 'rate' in name:
+            known = self._known_values.get(prop.name)
+            if known is not None and _as_float(value) > _as_float(known):
+                rank = 3.5
+        return rank
+
+    def apply(self, settings: dict, force: bool = False, verify: bool = False) -> dict:
+        """
+        Writes several properties, skipping the ones that already have the value.
+
+        Properties are written in a dependency-safe order (modes, geometry, frame rate and
+        integration time, rest) regardless of the order of the dict. Values are only known
+        when they were written or read through apply, snapshot, get_property_value or
+        set_property_value; unknown properties are always written. The known values are
+        trusted without camera calls: they are dropped on open, load_settings and
+        forget_values, and replaced by explicit writes through set_property_value. Call
+        forget_values after writing through props directly, or pass verify=True to read back
+        every matching property before skipping it (one C call per property).
+
+        :param settings: Property name -> value.
+        :param force: Write all properties, even unchanged ones.
+        :param verify: Read back properties whose known value matches and write them if the
+                       camera has another value, e.g. one it adjusted or one changed elsewhere.
+
+        :return: The properties that were actually written, name -> value.
+        """
+        pending = []
+        for name, value in settings.items():
+            prop = self.props[name]
+            if not force and prop.name in self._known_values and _same_value(self._known_values[prop.name], value):
+                if not verify:
+                    continue
+                self._known_values[prop.name] = prop.get()
+                if _same_value(self._known_values[prop.name], value):
+                    continue
+            pending.append((prop, value))
+
+        # sorted is stable, equal ranks keep the order of the dict
+        pending.sort(key=lambda item: self._apply_rank(*item))
+
+        written = {}
+        for prop, value in pending:
+            self._known_values.pop(prop.name, None)
+            prop.set(value)
+            self._known_values[prop.name] = value
+            written[prop.name] = value
+
+        if written:
+            logger.debug("Applied %s", written)
+        return written
+
+    def snapshot(self, names=None, refresh: bool = True) -> dict:
+        """
+        Reads a set of properties into a flat dict, e.g. to attach to frames as metadata.
+
+        :param names: Property names, by default all properties with a known value.
+        :param refresh: Read the values from the camera. With False, the last known values are
+                        returned without camera calls and unknown properties are read.
+
+        :return: Property name -> value.
+        """
+        if names is None:
+            names = list(self._known_values)
+
+        values = {}
+        for name in names:
+            prop = self.props[name]
+            if refresh or prop.name not in self._known_values:
+                self._known_values[prop.name] = prop.get()
+            values[name] = self._known_values[prop.name]
+        return values
+
+    def forget_values(self) -> None:
+        """
+        Drops all last known values, e.g. after changing properties outside this object.
+        """
+        self._known_values = {}
+
+    def restore(self, filename: str, settings: dict = None) -> dict:
+        """
+        Restores a full camera state from a settings file (save_settings), then applies the given
+        settings on top. Faster than apply for many properties.
+
+        :return: The properties written after loading the file.
+        """
+        self.load_settings(filename)
+        return self.apply(settings or {}, force=True)
+
+    #endregion Batched settings
 
 
     def get_property_range(self, property_name: str) -> Union[Tuple[int, int],Tuple[float, float],Tuple[str, str]]:
@@ -640,4 +889,28 @@ class XCamera(object):
         return value.value.decode()
     
 
-    
\ No newline at end of file
+    
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+# Relative tolerance of float property comparisons: the camera may hold a written value in single
+# precision (about 7 significant digits), so a value read back can differ from the one written by that much.
+_FLOAT_REL_TOL = 1e-6
+
+
+def _same_value(a, b) -> bool:
+    """
+    Compares property values, floats with a relative tolerance of _FLOAT_REL_TOL.
+    """
+    if isinstance(a, float) or isinstance(b, float):
+        try:
+            return math.isclose(float(a), float(b), rel_tol=_FLOAT_REL_TOL, abs_tol=1e-12)
+        except (TypeError, ValueError):
+            return False
+    return a == b
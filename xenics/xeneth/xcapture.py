@@ -0,0 +1,463 @@
+"""
+xcapture.py
+
+Continuous frame capture with a pool of preallocated frame buffers.
+
+A grabber thread fills pooled XFrameBuffers with XCamera.get_frame and hands them through
+bounded queues to processing and writer threads. Buffers go back to the pool once the
+writer (or the last stage) is done with them, so no frame memory is allocated while
+capturing.
+"""
+
+import json
+import queue
+import threading
+from typing import Callable, Optional
+
+import numpy as np
+
+from xenics.xeneth.capi.enums import XFrameType, XGetFrameFlags
+from xenics.xeneth.capi.errors import XErrorCodes
+from xenics.xeneth.errors import XenethAPIException, XenethException
+from xenics.xeneth.util import _log as logger
+from xenics.xeneth.xfooter import XPFF_DTYPE
+from xenics.xeneth.xframebuffer import XFrameBuffer
+from xenics.xeneth.xmonitor import XFrameMonitor
+from xenics.xeneth.xroi import XROI, bin_frame, binned_dtype, configure_roi, reset_window, restore_window
+
+__all__ = ['XPooledFrame', 'XFrameBufferPool', 'XCaptureEngine']
+
+
+class XPooledFrame(object):
+    """
+    A frame buffer owned by a XFrameBufferPool, plus the capture metadata of the frame it currently holds.
+
+    With a software ROI image_data is the ROI only: a view on the buffer, or the binned
+    frame computed by captured() on the grabber thread.
+    """
+
+    def __init__(self, pool: "XFrameBufferPool", buffer: XFrameBuffer, roi: Optional[XROI] = None):
+        self._pool = pool
+        self.buffer = buffer
+        self.index = -1
+        self.roi = pool.roi_metadata
+
+        self._roi = roi
+        self._binned = None
+        if roi is not None and roi.binning > 1:
+            self._binned = np.zeros(roi.shape, dtype=binned_dtype(buffer.image_data.dtype))
+
+        # zero-copy view on the software footer, valid when fetched with XGF_FetchPFF
+        raw = buffer.data.reshape(-1).view(np.uint8)
+        if raw.size >= buffer.size + XPFF_DTYPE.itemsize:
+            self._footer = raw[buffer.size:buffer.size + XPFF_DTYPE.itemsize].view(XPFF_DTYPE)
+        else:
+            self._footer = None
+
+    @property
+    def image_data(self) -> np.ndarray:
+        """
+        The image data (of the ROI) of the frame, a view on the pooled buffer, copy it to keep it after release
+        """
+        if self._binned is not None:
+            return self._binned
+        if self._roi is not None:
+            return self.buffer.image_data[self._roi.slices]
+        return self.buffer.image_data
+
+    def captured(self) -> None:
+        """
+        Called after a frame was read into the buffer, bins the ROI if binning is configured.
+        """
+        if self._binned is not None:
+            bin_frame(self.buffer.image_data, self._roi, self._binned)
+
+    @property
+    def soc(self) -> Optional[int]:
+        """
+        Time of start of capture from the frame footer (us since epoch), None if the camera has no footer
+        """
+        return int(self._footer['soc'][0]) if self._footer is not None else None
+
+    @property
+    def tfc(self) -> Optional[int]:
+        """
+        Frame counter from the frame footer, None if the camera has no footer
+        """
+        return int(self._footer['tfc'][0]) if self._footer is not None else None
+
+    def release(self) -> None:
+        """
+        Returns the buffer to its pool. The frame must not be used afterwards.
+        """
+        self._pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class XFrameBufferPool(object):
+    """
+    Fixed set of preallocated frame buffers.
+    """
+
+    def __init__(self, camera, size: int, frame_type: XFrameType = XFrameType.FT_NATIVE,
+                 roi: Optional[XROI] = None, hardware_roi: bool = True):
+        """
+        :param camera: The (opened) XCamera to create buffers for.
+        :param size: Number of buffers.
+        :param frame_type: Frame type of the buffers.
+        :param roi: Region of interest (sensor coordinates) and binning, see configure_roi.
+                    None reads out the full sensor, resetting a window left on the camera.
+        :param hardware_roi: Use the camera windowing properties for the ROI when available.
+        """
+        self._camera = camera
+        self._roi = roi
+        self._hardware_roi = hardware_roi
+        self._window_restored = False
+        if roi is None and hardware_roi and reset_window(camera):
+            logger.info("Camera window reset to the full sensor")
+        self.roi_configuration = configure_roi(camera, roi, hardware_roi) if roi is not None else None
+        self.roi_metadata = self.roi_configuration.metadata() if roi is not None else None
+        software_roi = self.roi_configuration.software if roi is not None else None
+
+        self._frames = [XPooledFrame(self, camera.create_buffer(frame_type), software_roi) for _ in range(size)]
+        self._free = queue.SimpleQueue()
+        for frame in self._frames:
+            self._free.put(frame)
+
+    @property
+    def size(self) -> int:
+        """
+        Total number of buffers in the pool
+        """
+        return len(self._frames)
+
+    @property
+    def available(self) -> int:
+        """
+        Number of buffers currently free
+        """
+        return self._free.qsize()
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[XPooledFrame]:
+        """
+        Takes a free buffer from the pool.
+
+        :param timeout: Seconds to wait for a free buffer. 0 returns immediately, None waits forever.
+        :return: The frame, or None if no buffer became available.
+        """
+        try:
+            if timeout == 0:
+                return self._free.get_nowait()
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, frame: XPooledFrame) -> None:
+        """
+        Returns a buffer to the pool.
+        """
+        self._free.put(frame)
+
+    def restore_window(self) -> None:
+        """
+        Puts back the camera window the ROI replaced, once capture is stopped. See apply_window.
+        """
+        if self.roi_configuration is not None and restore_window(self._camera, self.roi_configuration):
+            self._window_restored = True
+
+    def apply_window(self) -> None:
+        """
+        Sets the ROI window again after restore_window, before capturing into the buffers again.
+        """
+        if not self._window_restored:
+            return
+        configuration = configure_roi(self._camera, self._roi, self._hardware_roi)
+        if configuration.window != self.roi_configuration.window:
+            raise XenethException(f"Camera window {configuration.window} differs from the buffer window "
+                                  f"{self.roi_configuration.window}")
+        self.roi_configuration = configuration
+        self._window_restored = False
+
+
+class XCaptureEngine(object):
+    """
+    Grabber thread plus processing and writer consumer threads.
+
+    Frames flow grabber -> process (optional, N threads) -> write (optional, 1 thread) and
+    are returned to the pool after the last stage. When all buffers are in use the engine
+    either waits (drop_when_full=False) or keeps draining the camera into a scratch
+    buffer and counts the frame as dropped (drop_when_full=True, the default).
+
+    Frames lost before reaching the engine are counted from gaps in the footer frame counter
+    by the XFrameMonitor, which also tracks the inter-frame interval distribution.
+    """
+
+    def __init__(self, camera,
+                 process: Callable[[XPooledFrame], None] = None,
+                 write: Callable[[XPooledFrame], None] = None,
+                 pool_size: int = 16,
+                 processing_threads: int = 1,
+                 frame_type: XFrameType = XFrameType.FT_NATIVE,
+                 drop_when_full: bool = True,
+                 monitor: Optional[XFrameMonitor] = None,
+                 summary_path: Optional[str] = None,
+                 roi: Optional[XROI] = None,
+                 hardware_roi: bool = True):
+        """
+        :param camera: An opened XCamera.
+        :param process: Called for each frame on a processing thread.
+        :param write: Called for each frame on the writer thread, after process.
+        :param pool_size: Number of preallocated frame buffers.
+        :param processing_threads: Number of processing threads.
+        :param frame_type: Frame type to capture.
+        :param drop_when_full: Drop frames instead of stalling the grabber when the pool is exhausted.
+        :param monitor: Frame counter/timing monitor, a new XFrameMonitor if not given.
+        :param summary_path: If given, the run summary is written to this JSON file on stop.
+        :param roi: Region of interest and binning; the stages only see the ROI, see xroi.py.
+        :param hardware_roi: Use the camera windowing properties for the ROI when available.
+        """
+        self._camera = camera
+        self._process = process
+        self._write = write
+        self._processing_threads = processing_threads if process is not None else 0
+        self._drop_when_full = drop_when_full
+        self.monitor = monitor if monitor is not None else XFrameMonitor()
+        self.summary_path = summary_path
+
+        self.pool = XFrameBufferPool(camera, pool_size, frame_type, roi, hardware_roi)
+        self._scratch = XPooledFrame(self.pool, camera.create_buffer(frame_type))
+
+        # bounded by the pool size: a queue can never hold more frames than exist
+        self._process_queue = queue.Queue(maxsize=pool_size)
+        self._write_queue = queue.Queue(maxsize=pool_size)
+
+        self._stop = threading.Event()
+        self._threads = []
+        self._started_capture = False
+        self._error = None
+        self._lock = threading.Lock()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.frames_done = 0
+        self.monitor.reset()
+
+    #region Statistics
+
+    @property
+    def frames_lost(self) -> int:
+        """
+        Frames missing from the footer frame counter sequence
+        """
+        return self.monitor.lost
+
+    @property
+    def statistics(self) -> dict:
+        """
+        Counters of the current/last run.
+
+        frames_captured: frames taken from the camera into a pool buffer
+        frames_dropped:  frames read from the camera but discarded because no buffer was free
+        frames_lost:     frames missing from the footer frame counter sequence (lost before the engine)
+        frames_done:     frames that went through all stages
+        frame_rate:      effective frame rate from the footer timestamps (Hz)
+        """
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'frames_lost': self.frames_lost,
+            'frames_done': self.frames_done,
+            'buffers_free': self.pool.available,
+            'frame_rate': self.monitor.frame_rate,
+        }
+
+    def summary(self) -> dict:
+        """
+        Monitor summary (gaps, interval distribution) plus the engine counters.
+        """
+        summary = self.monitor.summary()
+        summary['engine'] = self.statistics
+        summary['roi'] = self.pool.roi_metadata
+        return summary
+
+    #endregion Statistics
+
+    def start(self) -> None:
+        """
+        Starts camera capture (if needed) and the engine threads.
+        Capture started here is stopped again by stop().
+        """
+        if self._threads:
+            raise RuntimeError("Capture engine is already running")
+        self.pool.apply_window()
+
+        self._reset_counters()
+        self._stop.clear()
+        self._error = None
+
+        if not self._camera.is_capturing:
+            self._camera.start_capture()
+            self._started_capture = True
+
+        self._threads = [threading.Thread(target=self._grab_loop, name="xcapture-grabber", daemon=True)]
+        for i in range(self._processing_threads):
+            self._threads.append(threading.Thread(target=self._process_loop, name=f"xcapture-process-{i}", daemon=True))
+        if self._write is not None:
+            self._threads.append(threading.Thread(target=self._write_loop, name="xcapture-writer", daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops grabbing, lets the consumers finish the queued frames and joins all threads,
+        then stops camera capture if start() started it and restores the camera window of the ROI.
+        Re-raises an exception that occurred on one of the engine threads.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        if self._started_capture and self._camera.is_capturing:
+            self._camera.stop_capture()
+        self._started_capture = False
+        self.pool.restore_window()
+
+        if self.summary_path is not None:
+            with open(self.summary_path, 'w') as f:
+                json.dump(self.summary(), f, indent=2)
+
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _fail(self, error: Exception) -> None:
+        logger.error("Capture engine thread failed: %s", error)
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _grab(self, frame: XPooledFrame) -> bool:
+        flags = XGetFrameFlags.XGF_Blocking | XGetFrameFlags.XGF_FetchPFF
+        try:
+            return self._camera.get_frame(frame.buffer, flags)
+        except XenethAPIException as e:
+            if e.error_code == XErrorCodes.E_TIMEOUT:
+                return False
+            raise
+
+    def _grab_loop(self) -> None:
+        # frames are passed on to the first stage that exists
+        if self._processing_threads:
+            output = self._process_queue
+        elif self._write is not None:
+            output = self._write_queue
+        else:
+            output = None
+
+        try:
+            index = 0
+            while not self._stop.is_set():
+                frame = self.pool.acquire(timeout=0 if self._drop_when_full else 0.1)
+                if frame is None:
+                    if not self._drop_when_full:
+                        continue
+                    # keep the camera drained and the frame counter tracked
+                    if self._grab(self._scratch):
+                        self.monitor.update(self._scratch.tfc, self._scratch.soc)
+                        self.frames_dropped += 1
+                    continue
+
+                if not self._grab(frame):
+                    frame.release()
+                    continue
+                frame.captured()
+
+                self.monitor.update(frame.tfc, frame.soc)
+                frame.index = index
+                index += 1
+                self.frames_captured += 1
+
+                if output is None:
+                    self.frames_done += 1
+                    frame.release()
+                else:
+                    output.put(frame)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._fail(e)
+        finally:
+            if output is not None:
+                for _ in range(max(self._processing_threads, 1)):
+                    output.put(None)
+
+    def _process_loop(self) -> None:
+        output = self._write_queue if self._write is not None else None
+        try:
+            while True:
+                frame = self._process_queue.get()
+                if frame is None:
+                    break
+                try:
+                    self._process(frame)
+                except Exception:
+                    frame.release()
+                    raise
+                if output is None:
+                    self._done(frame)
+                else:
+                    output.put(frame)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._fail(e)
+            self._drain(self._process_queue)
+        finally:
+            if output is not None:
+                output.put(None)
+
+    def _write_loop(self) -> None:
+        # one end marker per upstream thread
+        remaining = max(self._processing_threads, 1)
+        try:
+            while remaining:
+                frame = self._write_queue.get()
+                if frame is None:
+                    remaining -= 1
+                    continue
+                try:
+                    self._write(frame)
+                finally:
+                    self._done(frame)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self._fail(e)
+            self._drain(self._write_queue, remaining)
+
+    def _done(self, frame: XPooledFrame) -> None:
+        with self._lock:
+            self.frames_done += 1
+        frame.release()
+
+    @staticmethod
+    def _drain(frame_queue: queue.Queue, end_markers: int = 1) -> None:
+        """
+        Releases the frames left in a queue after a consumer failed, so upstream threads don't block.
+        """
+        while end_markers:
+            frame = frame_queue.get()
+            if frame is None:
+                end_markers -= 1
+            else:
+                frame.release()
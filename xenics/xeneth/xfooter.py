@@ -3,7 +3,10 @@ xfooters.py
 Footer classes
 """
 
+import numpy as np
+
 from xenics.xeneth.capi.structs import XPFF_GENERIC
+from xenics.xeneth.errors import XenethException
 
 class PFFGeneric():
     """
@@ -98,3 +101,139 @@ class PFFGeneric():
         Camera hardware footer
         """
         return self._camera_footer
+
+
+# region Batch decoding
+
+# numpy mirrors of the footer structures in capi/structs.py (packed, little endian).
+# Viewing the footer bytes of many frames with these dtypes decodes them without copying.
+
+XPFF_F040_DTYPE = np.dtype([
+    ('status', '<u2'),
+    ('tint', '<u4'),
+    ('timelo', '<u4'),
+    ('timehi', '<u4'),
+    ('temp_die', '<u2'),
+    ('temp_case', '<u2'),
+])
+
+XPFF_F003_DTYPE = np.dtype([
+    ('status', '<u2'),
+    ('tint', '<u4'),
+    ('timelo', '<u4'),
+    ('timehi', '<u4'),
+    ('temp_die', '<u2'),
+    ('reserved1', '<u2'),
+    ('tag', '<u2'),
+    ('image_offset', '<u4'),
+    ('image_gain', '<u2'),
+    ('frame_cnt', '<u2'),
+    ('reserved2', '<u2'),
+])
+
+XPFF_F090_DTYPE = np.dtype([
+    ('status', '<u2'),
+    ('timelo', '<u4'),
+    ('timehi', '<u4'),
+    ('counter', '<u4'),
+    ('sample_counter', '<u4'),
+    ('offset_x', '<u2'),
+    ('offset_y', '<u2'),
+    ('reserved', '<u4', (10,)),
+])
+
+XPFF_F086_DTYPE = np.dtype([
+    ('status', '<u2'),
+    ('timelo', '<u4'),
+    ('timehi', '<u4'),
+    ('frame_counter', '<u4'),
+    ('reserved', '<u4', (12,)),
+])
+
+# union of the hardware footers, all starting at the same offset
+XPFF_COMMON_DTYPE = np.dtype({
+    'names': ['pid', 'onca', 'gobi', 'tigris', 'manx'],
+    'formats': ['<u2', XPFF_F040_DTYPE, XPFF_F003_DTYPE, XPFF_F090_DTYPE, XPFF_F086_DTYPE],
+    'offsets': [0, 0, 0, 0, 0],
+    'itemsize': max(d.itemsize for d in (XPFF_F040_DTYPE, XPFF_F003_DTYPE, XPFF_F090_DTYPE, XPFF_F086_DTYPE)),
+})
+
+XPFF_DTYPE = np.dtype([
+    ('len', '<u2'),
+    ('ver', '<u2'),
+    ('soc', '<i8'),
+    ('tft', '<i8'),
+    ('tfc', '<u4'),
+    ('fltref', '<u4'),
+    ('hfl', '<u4'),
+])
+
+XPFF_GENERIC_DTYPE = np.dtype(XPFF_DTYPE.descr + [('common', XPFF_COMMON_DTYPE)])
+
+# pid -> (union member, {status bit name: (shift, width)})
+_HARDWARE_FOOTERS = {
+    0xF040: ('onca', {'trig_ext': (0, 1), 'trig_cl': (1, 1), 'trig_soft': (2, 1),
+                      'linecam_fixedSH': (8, 1), 'linecam_SHBfirst': (9, 1), 'filterwheel': (13, 3)}),
+    0xF003: ('gobi', {'trig_ext': (0, 1)}),
+    0xF090: ('tigris', {}),
+    0xF086: ('manx', {'first_line_index': (0, 1)}),
+}
+
+
+def footer_records(frames: np.ndarray, image_size: int) -> np.ndarray:
+    """
+    Views the footers of a stack of frame buffers as XPFF_GENERIC_DTYPE records.
+
+    :param frames: Array of N full frame buffers (XFrameBuffer.data layout, image plus footer rows),
+                   e.g. a stack of buffer.data copies or a np.memmap of raw frames.
+    :param image_size: Size of the image part of a frame in bytes (XFrameBuffer.size).
+    :return: Record array of shape (N,), a view on frames when frames is C contiguous.
+    """
+    frames = np.asarray(frames)
+    raw = frames.reshape(len(frames), -1).view(np.uint8)
+    if raw.shape[1] < image_size + XPFF_DTYPE.itemsize:
+        raise XenethException(f"Frames of {raw.shape[1]} bytes have no footer after {image_size} image bytes")
+
+    # the hardware footer may be shorter than the largest union member
+    end = min(raw.shape[1], image_size + XPFF_GENERIC_DTYPE.itemsize)
+    if end - image_size < XPFF_GENERIC_DTYPE.itemsize:
+        padded = np.zeros((len(raw), XPFF_GENERIC_DTYPE.itemsize), dtype=np.uint8)
+        padded[:, :end - image_size] = raw[:, image_size:end]
+        return padded.view(XPFF_GENERIC_DTYPE)[:, 0]
+    return raw[:, image_size:end].view(XPFF_GENERIC_DTYPE)[:, 0]
+
+
+def decode_footers(frames: np.ndarray, image_size: int) -> dict:
+    """
+    Decodes the footers of a stack of frame buffers into columns.
+
+    Returns the software footer fields (len, ver, soc, tft, tfc, fltref, hfl), the hardware
+    footer pid and, when all frames have the same known pid, the fields of that hardware
+    footer with the status bits split into separate columns and 'time' = timehi << 32 | timelo.
+
+    :param frames: Array of N full frame buffers, see footer_records.
+    :param image_size: Size of the image part of a frame in bytes (XFrameBuffer.size).
+    :return: Dict of column name to array of length N.
+    """
+    records = footer_records(frames, image_size)
+    columns = {name: records[name] for name in XPFF_DTYPE.names}
+    columns['pid'] = pid = records['common']['pid']
+
+    if len(pid) == 0 or not np.all(pid == pid[0]) or int(pid[0]) not in _HARDWARE_FOOTERS:
+        return columns
+
+    member, status_bits = _HARDWARE_FOOTERS[int(pid[0])]
+    hardware = records['common'][member]
+    for name in hardware.dtype.names:
+        if not name.startswith('reserved'):
+            columns[name] = hardware[name]
+
+    status = hardware['status']
+    for name, (shift, width) in status_bits.items():
+        bits = (status >> shift) & ((1 << width) - 1)
+        columns[name] = bits.astype(bool) if width == 1 else bits
+
+    columns['time'] = (hardware['timehi'].astype(np.uint64) << np.uint64(32)) | hardware['timelo']
+    return columns
+
+# endregion Batch decoding
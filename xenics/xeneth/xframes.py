@@ -0,0 +1,194 @@
+"""
+xframes.py
+
+Frame iterators for XCamera.
+
+XFrameStream hands out pooled frames one by one, as a regular iterator
+
+    with cam.frames(count=100, timeout=2.0) as stream:
+        for frame in stream:
+            process(frame.image_data)
+            frame.release()
+
+or as an async iterator that can run next to other asyncio instrument tasks
+
+    async with cam.frames(count=100, timeout=2.0) as stream:
+        async for frame in stream:
+            with frame:
+                process(frame.image_data)
+
+Use the stream as a context manager (or call close()), so capture is stopped right away
+when the loop is left early by break or an exception, not when the iterator is collected.
+
+The blocking XGF_Blocking get_frame calls of the async iterator run on a dedicated executor
+thread, so the event loop stays responsive and the loop's default executor is not occupied.
+"""
+
+import asyncio
+import concurrent.futures
+import time
+from typing import Optional
+
+from xenics.xeneth.capi.enums import XFrameType, XGetFrameFlags
+from xenics.xeneth.capi.errors import XErrorCodes
+from xenics.xeneth.errors import XenethAPIException, XenethException
+from xenics.xeneth.xcapture import XFrameBufferPool, XPooledFrame
+from xenics.xeneth.xroi import XROI
+
+__all__ = ['XFrameStream']
+
+
+class XFrameStream(object):
+    """
+    Iterable (sync and async) over the next frames of a camera.
+
+    Every frame is an XPooledFrame that must be released (frame.release() or `with frame:`)
+    before its buffer can be reused; holding on to all pool_size frames raises an XenethException
+    instead of deadlocking. Capture is started if needed and stopped again when the stream
+    ends, if the stream started it.
+    """
+
+    def __init__(self, camera, count: Optional[int] = None, timeout: Optional[float] = None,
+                 pool_size: int = 4, frame_type: XFrameType = XFrameType.FT_NATIVE,
+                 flags: XGetFrameFlags = XGetFrameFlags.XGF_FetchPFF,
+                 roi: Optional[XROI] = None, hardware_roi: bool = True):
+        """
+        :param camera: An opened XCamera.
+        :param count: Number of frames to deliver, None for an endless stream.
+        :param timeout: Max seconds to wait for each frame, TimeoutError when exceeded. None waits forever.
+        :param pool_size: Number of preallocated frame buffers.
+        :param frame_type: Frame type to capture.
+        :param flags: Additional get_frame flags, XGF_Blocking is always added.
+        :param roi: Region of interest and binning, frames only expose the ROI, see xroi.py.
+        :param hardware_roi: Use the camera windowing properties for the ROI when available.
+        """
+        self._camera = camera
+        self.count = count
+        self.timeout = timeout
+        self._flags = flags | XGetFrameFlags.XGF_Blocking
+        self.pool = XFrameBufferPool(camera, pool_size, frame_type, roi, hardware_roi)
+        self.frames_delivered = 0
+
+        self._started_capture = False
+        self._executor = None
+        self._closed = False
+
+    def _start(self) -> None:
+        if self._closed:
+            raise XenethException("Frame stream is closed")
+        if not self._camera.is_capturing:
+            self._camera.start_capture()
+            self._started_capture = True
+
+    def close(self) -> None:
+        """
+        Ends the stream: stops capture if the stream started it, restores the camera window of the ROI
+        and shuts down the executor thread.
+        Frames still held by the caller stay valid until released.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._started_capture and self._camera.is_capturing:
+            self._camera.stop_capture()
+        self._started_capture = False
+        self.pool.restore_window()
+
+    @property
+    def _done(self) -> bool:
+        return self._closed or (self.count is not None and self.frames_delivered >= self.count)
+
+    def _acquire(self) -> XPooledFrame:
+        frame = self.pool.acquire(timeout=0)
+        if frame is None:
+            raise XenethException(f"All {self.pool.size} pooled frames are in use, release frames before requesting more")
+        return frame
+
+    def _grab(self, frame: XPooledFrame) -> None:
+        """
+        Fills frame with the next camera frame, retrying blocking calls that return without a frame until the timeout.
+        The remaining time is passed to get_frame, so a frame that never comes raises after timeout seconds.
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                if self._camera.get_frame(frame.buffer, self._flags, timeout=remaining):
+                    frame.captured()
+                    frame.index = self.frames_delivered
+                    self.frames_delivered += 1
+                    return
+            except XenethAPIException as e:
+                if e.error_code != XErrorCodes.E_TIMEOUT:
+                    raise
+            if self._closed:
+                raise XenethException("Frame stream was closed while waiting for a frame")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"No frame within {self.timeout} s")
+
+    def _next(self) -> XPooledFrame:
+        frame = self._acquire()
+        try:
+            self._grab(frame)
+        except BaseException:
+            frame.release()
+            raise
+        return frame
+
+    #region Sync iteration
+
+    def __iter__(self):
+        self._start()
+        try:
+            while not self._done:
+                yield self._next()
+        finally:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #endregion Sync iteration
+
+    #region Async iteration
+
+    async def _anext(self) -> XPooledFrame:
+        frame = self._acquire()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._grab, frame)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the executor thread may still be writing into the buffer, release it when done
+            future.add_done_callback(lambda _: frame.release())
+            raise
+        except BaseException:
+            frame.release()
+            raise
+        return frame
+
+    async def _aiterate(self):
+        self._start()
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="xframes")
+        try:
+            while not self._done:
+                yield await self._anext()
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def __aiter__(self):
+        return self._aiterate()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    #endregion Async iteration
@@ -0,0 +1,267 @@
+"""
+xframestack.py
+
+Frame stack container: a raw file with the frames back to back plus a JSON index.
+
+    <name>.raw   frames of identical shape and dtype, C order, no header
+    <name>.json  shape, dtype, frame count and per frame metadata columns
+
+The raw file is preallocated in chunks while writing and trimmed to the frame count on close.
+Readers map it with np.memmap, so any frame range can be sliced without decoding or copying.
+"""
+
+import json
+import os
+from typing import Optional, Union
+
+import numpy as np
+
+from xenics.xeneth.errors import XenethException
+from xenics.xeneth.util import _log as logger
+
+__all__ = ['XFrameStackWriter', 'XFrameStack', 'METADATA_FIELDS']
+
+FORMAT_VERSION = 1
+
+# Standard per frame metadata columns and their dtype. Integer columns use -1 for missing values, float columns NaN.
+METADATA_FIELDS = {
+    'soc': np.int64,            # footer time of start of capture (us)
+    'tfc': np.int64,            # footer frame counter
+    'voltage': np.float64,      # applied bias (V)
+    'temperature': np.float64,  # sample temperature (C)
+    'angle': np.float64,        # polarizer angle (deg)
+}
+
+
+def _paths(path: str):
+    base, ext = os.path.splitext(path)
+    if ext not in ('.raw', '.json'):
+        base = path
+    return base + '.raw', base + '.json'
+
+
+def _missing(field: str):
+    return -1 if np.issubdtype(METADATA_FIELDS.get(field, np.float64), np.integer) else None
+
+
+class XFrameStackWriter(object):
+    """
+    Appends frames to a frame stack on disk.
+
+    Metadata given to set_context is stamped on every following frame (e.g. the bias and
+    temperature of the current measurement step), metadata given to append only on that frame.
+    """
+
+    def __init__(self, path: str, frame_shape: tuple, dtype, chunk_frames: int = 256,
+                 attributes: Optional[dict] = None):
+        """
+        :param path: File name without extension (or with .raw/.json).
+        :param frame_shape: Shape of a single frame, e.g. buffer.image_data.shape.
+        :param dtype: Pixel dtype, e.g. buffer.image_data.dtype.
+        :param chunk_frames: Number of frames the raw file grows by when it is full.
+        :param attributes: Free form attributes stored in the index (camera, settings, ...).
+        """
+        self.raw_path, self.index_path = _paths(path)
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk_frames = chunk_frames
+        self.attributes = dict(attributes or {})
+
+        self._frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self._count = 0
+        self._capacity = 0
+        self._map = None
+        self._context = {}
+        self._metadata = {field: [] for field in METADATA_FIELDS}
+
+        directory = os.path.dirname(self.raw_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        open(self.raw_path, 'wb').close()
+        self._grow(chunk_frames)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def closed(self) -> bool:
+        return self._map is None and self._capacity == 0
+
+    def _grow(self, frames: int) -> None:
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        self._capacity += frames
+        os.truncate(self.raw_path, self._capacity * self._frame_bytes)
+        self._map = np.memmap(self.raw_path, dtype=self.dtype, mode='r+',
+                              shape=(self._capacity,) + self.frame_shape)
+
+    def set_context(self, **metadata) -> None:
+        """
+        Sets metadata stamped on all following frames. None removes a field from the context.
+        """
+        for key, value in metadata.items():
+            if value is None:
+                self._context.pop(key, None)
+            else:
+                self._context[key] = value
+
+    def append(self, frame: np.ndarray, **metadata) -> int:
+        """
+        Copies one frame into the stack.
+
+        :param frame: The image data, shape frame_shape.
+        :param metadata: Per frame metadata (soc, tfc, voltage, temperature, angle or any other json value).
+        :return: Index of the frame in the stack.
+        """
+        if self._map is None:
+            raise XenethException(f"Frame stack {self.raw_path} is closed")
+        if frame.shape != self.frame_shape:
+            raise XenethException(f"Frame shape {frame.shape} does not match stack shape {self.frame_shape}")
+
+        if self._count == self._capacity:
+            self._grow(self.chunk_frames)
+
+        index = self._count
+        self._map[index] = frame
+
+        values = dict(self._context)
+        values.update(metadata)
+        _append_metadata(self._metadata, values, index)
+
+        self._count += 1
+        return index
+
+    def append_frame(self, frame, **metadata) -> int:
+        """
+        Appends a XFrameBuffer or XPooledFrame, taking soc and tfc from its footer and the
+        ROI coordinates of a pooled frame into the attributes.
+        Can be passed directly as the write callback of XCaptureEngine.
+        """
+        if getattr(frame, 'roi', None) is not None:
+            self.attributes.setdefault('roi', frame.roi)
+        if hasattr(frame, 'tfc'):
+            metadata.setdefault('soc', frame.soc)
+            metadata.setdefault('tfc', frame.tfc)
+        elif frame.footer_length:
+            footer = frame.extract_footer()
+            metadata.setdefault('soc', footer.soc)
+            metadata.setdefault('tfc', footer.tfc)
+        return self.append(frame.image_data, **metadata)
+
+    def flush(self) -> None:
+        """
+        Flushes the frames and rewrites the index, so readers see all frames appended so far.
+        """
+        if self._map is not None:
+            self._map.flush()
+        self._write_index()
+
+    def _write_index(self) -> None:
+        index = {
+            'version': FORMAT_VERSION,
+            'shape': list(self.frame_shape),
+            'dtype': self.dtype.str,
+            'count': self._count,
+            'attributes': self.attributes,
+            'metadata': self._metadata,
+        }
+        # write next to the index and swap, a reader never sees a partial file
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, self.index_path)
+
+    def close(self) -> None:
+        """
+        Writes the index and trims the preallocated space.
+        """
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map = None
+        os.truncate(self.raw_path, self._count * self._frame_bytes)
+        self._capacity = 0
+        self._write_index()
+        logger.info("Frame stack %s closed with %d frames", self.raw_path, self._count)
+
+
+def _append_metadata(columns: dict, values: dict, index: int) -> None:
+    for field in values.keys() - columns.keys():
+        columns[field] = [_missing(field)] * index
+    for field, column in columns.items():
+        value = values.get(field)
+        column.append(_missing(field) if value is None else _json_value(value))
+
+
+def _load_metadata(columns: dict) -> dict:
+    metadata = {}
+    for field, column in columns.items():
+        if field in METADATA_FIELDS:
+            dtype = METADATA_FIELDS[field]
+            missing = -1 if np.issubdtype(dtype, np.integer) else np.nan
+            metadata[field] = np.array([missing if v is None else v for v in column], dtype=dtype)
+        else:
+            metadata[field] = np.asarray(column)
+    return metadata
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class XFrameStack(object):
+    """
+    Read access to a frame stack written by XFrameStackWriter.
+
+    Frames are a read-only np.memmap, indexing or slicing the stack does not copy.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: File name without extension (or with .raw/.json).
+        """
+        self.raw_path, self.index_path = _paths(path)
+        with open(self.index_path) as f:
+            index = json.load(f)
+
+        if index.get('version', 0) > FORMAT_VERSION:
+            raise XenethException(f"Unsupported frame stack version {index['version']} in {self.index_path}")
+
+        self.frame_shape = tuple(index['shape'])
+        self.dtype = np.dtype(index['dtype'])
+        self.attributes = index.get('attributes', {})
+        count = index['count']
+
+        if count:
+            self.frames = np.memmap(self.raw_path, dtype=self.dtype, mode='r', shape=(count,) + self.frame_shape)
+        else:
+            self.frames = np.empty((0,) + self.frame_shape, dtype=self.dtype)
+
+        self.metadata = _load_metadata(index['metadata'])
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, item: Union[int, slice, np.ndarray]) -> np.ndarray:
+        return self.frames[item]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def select(self, **criteria) -> np.ndarray:
+        """
+        Indices of the frames whose metadata equals all given values, e.g. select(voltage=100, angle=45).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for field, value in criteria.items():
+            mask &= self.metadata[field] == value
+        return np.flatnonzero(mask)
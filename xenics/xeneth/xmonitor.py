@@ -0,0 +1,205 @@
+"""
+xmonitor.py
+
+Dropped frame and timing jitter detection from the per frame footer.
+
+XFrameMonitor follows the footer frame counter (tfc) and time of start of capture (soc)
+frame by frame. Gaps in the counter are recorded as lost frames, and the soc differences
+give the inter-frame interval distribution and effective frame rate. The counter wraps at
+2**32; a repeated counter is a duplicate frame and a counter that goes back (e.g. the camera
+restarted acquisition) is a reset, neither counts as lost frames.
+"""
+
+import json
+import threading
+from typing import Optional
+
+import numpy as np
+
+__all__ = ['XFrameMonitor']
+
+_TFC_MODULO = 1 << 32
+# A step of more than half the counter range is a step back (reset), not a wrap
+_TFC_MAX_STEP = _TFC_MODULO // 2
+
+
+class XFrameMonitor(object):
+    """
+    Tracks frame counter gaps and inter-frame intervals.
+
+    Feed it frame by frame with update (e.g. from the capture grabber thread) or a whole
+    recording at once with update_many (e.g. decode_footers columns).
+    """
+
+    def __init__(self, late_factor: float = 1.5, max_gap_events: int = 1000):
+        """
+        :param late_factor: An interval longer than late_factor times the median interval counts as late.
+        :param max_gap_events: Number of gap events kept in detail, later gaps are only counted.
+        """
+        self.late_factor = late_factor
+        self.max_gap_events = max_gap_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears all counters.
+        """
+        with self._lock:
+            self.frames = 0
+            self.lost = 0
+            self.gaps = []
+            self.gap_count = 0
+            self.duplicates = 0
+            self.resets = 0
+            self._last_tfc = None
+            self._first_soc = None
+            self._last_soc = None
+            self._intervals = np.empty(1024, dtype=np.int64)
+            self._interval_count = 0
+
+    def _record_gap(self, frame: int, previous_tfc: int, tfc: int, missing: int) -> None:
+        self.lost += missing
+        self.gap_count += 1
+        if len(self.gaps) < self.max_gap_events:
+            self.gaps.append({'frame': frame, 'previous_tfc': previous_tfc, 'tfc': tfc, 'missing': missing})
+
+    def _reserve(self, needed: int) -> None:
+        if needed > len(self._intervals):
+            grown = np.empty(max(needed, 2 * len(self._intervals)), dtype=np.int64)
+            grown[:self._interval_count] = self._intervals[:self._interval_count]
+            self._intervals = grown
+
+    def _append_intervals(self, intervals: np.ndarray) -> None:
+        needed = self._interval_count + len(intervals)
+        self._reserve(needed)
+        self._intervals[self._interval_count:needed] = intervals
+        self._interval_count = needed
+
+    def update(self, tfc: Optional[int], soc: Optional[int] = None) -> int:
+        """
+        Registers one frame.
+
+        :param tfc: Footer frame counter, None if unknown.
+        :param soc: Footer time of start of capture in us, None if unknown.
+        :return: Number of frames missing before this one.
+        """
+        missing = 0
+        with self._lock:
+            if tfc is not None:
+                if self._last_tfc is not None:
+                    step = (tfc - self._last_tfc) % _TFC_MODULO
+                    if step == 0:
+                        self.duplicates += 1
+                    elif step > _TFC_MAX_STEP:
+                        self.resets += 1
+                    elif step > 1:
+                        missing = step - 1
+                        self._record_gap(self.frames, self._last_tfc, tfc, missing)
+                self._last_tfc = tfc
+
+            if soc is not None:
+                if self._first_soc is None:
+                    self._first_soc = soc
+                else:
+                    self._reserve(self._interval_count + 1)
+                    self._intervals[self._interval_count] = soc - self._last_soc
+                    self._interval_count += 1
+                self._last_soc = soc
+
+            self.frames += 1
+        return missing
+
+    def update_many(self, tfc: np.ndarray, soc: Optional[np.ndarray] = None) -> int:
+        """
+        Registers a sequence of frames.
+
+        :param tfc: Footer frame counters.
+        :param soc: Footer times of start of capture in us, same length as tfc.
+        :return: Number of frames missing in the sequence.
+        """
+        tfc = np.asarray(tfc, dtype=np.int64)
+        with self._lock:
+            lost_before = self.lost
+            if len(tfc):
+                previous = np.empty_like(tfc)
+                previous[1:] = tfc[:-1]
+                previous[0] = tfc[0] - 1 if self._last_tfc is None else self._last_tfc
+                step = (tfc - previous) % _TFC_MODULO
+                self.duplicates += int(np.count_nonzero(step == 0))
+                self.resets += int(np.count_nonzero(step > _TFC_MAX_STEP))
+                missing = np.where((step == 0) | (step > _TFC_MAX_STEP), 0, step - 1)
+                for i in np.flatnonzero(missing):
+                    self._record_gap(self.frames + int(i), int(previous[i]), int(tfc[i]), int(missing[i]))
+                self._last_tfc = int(tfc[-1])
+
+            if soc is not None and len(soc):
+                soc = np.asarray(soc, dtype=np.int64)
+                if self._first_soc is None:
+                    self._first_soc = int(soc[0])
+                else:
+                    soc = np.concatenate(([self._last_soc], soc))
+                self._append_intervals(np.diff(soc))
+                self._last_soc = int(soc[-1])
+
+            self.frames += len(tfc)
+            return self.lost - lost_before
+
+    @property
+    def intervals(self) -> np.ndarray:
+        """
+        Inter-frame intervals in us (a copy)
+        """
+        with self._lock:
+            return self._intervals[:self._interval_count].copy()
+
+    @property
+    def frame_rate(self) -> float:
+        """
+        Effective frame rate in Hz from the first and last soc, NaN with fewer than two timestamps
+        """
+        with self._lock:
+            if self._interval_count == 0 or self._last_soc == self._first_soc:
+                return float('nan')
+            return self._interval_count / ((self._last_soc - self._first_soc) * 1e-6)
+
+    def summary(self) -> dict:
+        """
+        Frame counts, gap events and the interval distribution.
+        """
+        intervals = self.intervals
+        summary = {
+            'frames': self.frames,
+            'lost': self.lost,
+            'gap_count': self.gap_count,
+            'duplicates': self.duplicates,
+            'resets': self.resets,
+            'gaps': list(self.gaps),
+            'effective_frame_rate': None,
+            'interval_us': None,
+        }
+
+        if len(intervals):
+            median = float(np.median(intervals))
+            p1, p99 = np.percentile(intervals, [1, 99])
+            summary['effective_frame_rate'] = self.frame_rate
+            summary['interval_us'] = {
+                'mean': float(intervals.mean()),
+                'std': float(intervals.std()),
+                'min': int(intervals.min()),
+                'p1': float(p1),
+                'median': median,
+                'p99': float(p99),
+                'max': int(intervals.max()),
+                'late': int(np.count_nonzero(intervals > self.late_factor * median)),
+            }
+        return summary
+
+    def write_summary(self, path: str) -> dict:
+        """
+        Writes the summary as JSON, e.g. next to the recording it belongs to.
+        """
+        summary = self.summary()
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        return summary
@@ -0,0 +1,219 @@
+"""
+xroi.py
+
+Region of interest and binning on the capture path.
+
+configure_roi first tries the camera's windowing properties, so only the ROI is read out
+and transferred. Whatever the hardware window cannot do (no windowing properties, window
+step constraints, the camera is capturing) is left to software: pooled frames then expose
+the ROI as a zero-copy slice of the full buffer, and N x N binning sums into a preallocated
+buffer on the grabber thread. Downstream stages only see frame.image_data of the ROI.
+
+A hardware window stays on the camera only while it is used: XCaptureEngine.stop() and
+XFrameStream.close() put the previous window back (restore_window), and capturing without
+a ROI first resets a window left over from elsewhere to the full sensor (reset_window).
+
+    roi = XROI(x=5, y=190, width=630, height=130, binning=2)
+    with XCaptureEngine(cam, write=writer.append_frame, roi=roi):
+        ...
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from xenics.xeneth.errors import XenethAPIException, XenethException
+from xenics.xeneth.util import _log as logger
+
+__all__ = ['XROI', 'XROIConfiguration', 'configure_roi', 'restore_window', 'reset_window', 'WINDOW_PROPERTY_SETS']
+
+# (x offset, y offset, width, height) property names, the first set the camera has is used
+WINDOW_PROPERTY_SETS = [
+    ('OffsetX', 'OffsetY', 'Width', 'Height'),
+    ('WindowX', 'WindowY', 'WindowWidth', 'WindowHeight'),
+]
+
+
+class XROI(NamedTuple):
+    """
+    Region of interest in sensor pixel coordinates, with optional N x N binning.
+    Pixels that do not fill a whole bin at the right and bottom edge are dropped.
+    """
+    x: int
+    y: int
+    width: int
+    height: int
+    binning: int = 1
+
+    @classmethod
+    def from_ranges(cls, range_x: Tuple[int, int], range_y: Tuple[int, int], binning: int = 1) -> "XROI":
+        """
+        ROI from (start, stop) ranges, e.g. XROI.from_ranges((5, 635), (190, 320)) as crop_range_x/y in png_analysis.
+        """
+        return cls(range_x[0], range_y[0], range_x[1] - range_x[0], range_y[1] - range_y[0], binning)
+
+    @property
+    def slices(self) -> Tuple[slice, slice]:
+        """(rows, columns) slices of the ROI, trimmed to whole bins"""
+        height = self.height - self.height % self.binning
+        width = self.width - self.width % self.binning
+        return slice(self.y, self.y + height), slice(self.x, self.x + width)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Shape of the (binned) ROI image"""
+        return self.height // self.binning, self.width // self.binning
+
+    def offset(self, x: int, y: int) -> "XROI":
+        """The same ROI relative to a window starting at sensor pixel (x, y)"""
+        return self._replace(x=self.x - x, y=self.y - y)
+
+
+class XROIConfiguration(NamedTuple):
+    """
+    Result of configure_roi: the camera window and what is left for the software.
+    """
+    roi: XROI                       # requested ROI, sensor coordinates
+    window: XROI                    # camera readout window, sensor coordinates
+    software: Optional[XROI]        # ROI relative to the frame buffer, None if the buffer is the ROI
+    hardware: bool                  # whether the camera windowing properties were used
+    previous: Optional[XROI] = None  # camera window before configure_roi changed it, None if it was not changed
+
+    def metadata(self) -> dict:
+        """
+        ROI coordinates for stored frames.
+        """
+        return {
+            'x': self.roi.x,
+            'y': self.roi.y,
+            'width': self.roi.width,
+            'height': self.roi.height,
+            'binning': self.roi.binning,
+            'shape': list(self.roi.shape),
+            'hardware_window': list(self.window[:4]) if self.hardware else None,
+        }
+
+
+def _window_properties(camera) -> Optional[tuple]:
+    for names in WINDOW_PROPERTY_SETS:
+        if all(camera.has_property(name) for name in names):
+            return names
+    return None
+
+
+def _read_window(camera, names) -> XROI:
+    return XROI(*(int(float(camera.get_property_value(name))) for name in names))
+
+
+def _write_window(camera, names, window: XROI) -> None:
+    x_name, y_name, width_name, height_name = names
+    # offsets first to 0, so every intermediate window is valid
+    camera.set_property_value(x_name, 0)
+    camera.set_property_value(y_name, 0)
+    camera.set_property_value(width_name, window.width)
+    camera.set_property_value(height_name, window.height)
+    camera.set_property_value(x_name, window.x)
+    camera.set_property_value(y_name, window.y)
+
+
+def configure_roi(camera, roi: XROI, hardware: bool = True) -> XROIConfiguration:
+    """
+    Sets up the camera readout for a ROI.
+
+    Uses the windowing properties when the camera has them and is not capturing, then reads
+    the window back: any remaining offset (e.g. due to window step constraints) and the
+    binning are done in software. Call before creating frame buffers, a hardware window
+    changes the frame size.
+
+    :param camera: An opened XCamera.
+    :param roi: The ROI in sensor coordinates.
+    :param hardware: Try the camera windowing properties.
+    :return: The configuration, pass its software ROI to the frame buffer pool.
+    """
+    if roi.binning < 1 or roi.width < roi.binning or roi.height < roi.binning:
+        raise XenethException(f"Invalid ROI {roi}")
+    if roi.x < 0 or roi.y < 0 or roi.x + roi.width > camera.max_width or roi.y + roi.height > camera.max_height:
+        raise XenethException(f"ROI {roi} exceeds the {camera.max_width}x{camera.max_height} sensor")
+
+    names = _window_properties(camera)
+    use_window = hardware and names is not None
+    if use_window and camera.is_capturing:
+        logger.warning("Camera is capturing, ROI %s is applied in software", roi)
+        use_window = False
+
+    previous = None
+    if use_window:
+        previous = _read_window(camera, names)
+        try:
+            _write_window(camera, names, roi)
+        except XenethAPIException as e:
+            logger.warning("Camera window for ROI %s not accepted (%s), applying it in software", roi, e)
+            _write_window(camera, names, XROI(0, 0, camera.max_width, camera.max_height))
+            use_window = False
+
+    # the current window also matters when it is not changed here
+    window = _read_window(camera, names) if names is not None else XROI(0, 0, camera.width, camera.height)
+
+    inside = (window.x <= roi.x and window.y <= roi.y and
+              roi.x + roi.width <= window.x + window.width and roi.y + roi.height <= window.y + window.height)
+    if not inside:
+        raise XenethException(f"Camera window {window} does not contain ROI {roi}")
+
+    software = roi.offset(window.x, window.y)
+    if software == XROI(0, 0, window.width, window.height):
+        software = None
+    if previous == window:
+        previous = None
+    return XROIConfiguration(roi, window, software, use_window, previous)
+
+
+def restore_window(camera, configuration: XROIConfiguration) -> bool:
+    """
+    Puts back the camera window that configure_roi replaced. Call after capture stopped.
+
+    :param camera: The camera passed to configure_roi.
+    :param configuration: The result of configure_roi.
+    :return: Whether the window was restored.
+    """
+    if configuration.previous is None:
+        return False
+    if camera.is_capturing:
+        logger.warning("Camera is capturing, window %s is not restored", configuration.previous)
+        return False
+    _write_window(camera, _window_properties(camera), configuration.previous)
+    return True
+
+
+def reset_window(camera) -> bool:
+    """
+    Sets the camera window to the full sensor, e.g. before capturing without a ROI. Does nothing
+    when the camera has no windowing properties, is capturing or already reads out the full sensor.
+
+    :param camera: An opened XCamera.
+    :return: Whether the window was changed.
+    """
+    names = _window_properties(camera)
+    if names is None or camera.is_capturing:
+        return False
+    full = XROI(0, 0, camera.max_width, camera.max_height)
+    if _read_window(camera, names) == full:
+        return False
+    _write_window(camera, names, full)
+    return True
+
+
+def bin_frame(image: np.ndarray, roi: XROI, out: np.ndarray) -> np.ndarray:
+    """
+    Sums the N x N bins of the ROI of image into out (shape roi.shape).
+    """
+    n = roi.binning
+    view = image[roi.slices]
+    rows, cols = roi.shape
+    view.reshape(rows, n, cols, n).sum(axis=(1, 3), dtype=out.dtype, out=out)
+    return out
+
+
+def binned_dtype(dtype) -> np.dtype:
+    """Pixel dtype of binned frames: integer pixels are summed as uint32, floats keep their dtype"""
+    dtype = np.dtype(dtype)
+    return np.dtype(np.uint32) if np.issubdtype(dtype, np.integer) else dtype